@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+# Times the LaTeX log parser on large logs. Without arguments, a log
+# like the one of a long book (nested chapter files, thousands of
+# badboxes and warnings, a few errors) is generated. Run from the
+# source folder:
+# python3 scripts/benchmark_log_parser.py [size in MB | file.log ...]
+# The items found are checked against expected ones for the logs in
+# tests/latex_log_parser/, see tests/check_latex_log_parser.py.
+
+import sys
+import os.path
+import tempfile
+import time
+
+sys.dont_write_bytecode = True
+
+src_path = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, src_path)
+from setzer.document.latex.build_system.latex_log_parser.latex_log_parser import LaTeXLogParser
+
+
+def generate_log(size):
+    ''' returns the text of a log of about size bytes. '''
+
+    preamble = '''This is pdfTeX, Version 3.14159265-2.6-1.40.21 (TeX Live 2020) (preloaded format=pdflatex)
+entering extended mode
+**/tmp/book/book.tex
+(/tmp/book/book.tex
+LaTeX2e <2020-02-02> patch level 2
+(/usr/share/texlive/texmf-dist/tex/latex/base/book.cls
+Document Class: book 2019/12/20 v1.4l Standard LaTeX document class
+(/usr/share/texlive/texmf-dist/tex/latex/base/bk10.clo
+File: bk10.clo 2019/12/20 v1.4l Standard LaTeX file (size option)
+))
+'''
+    section = '''Overfull \\hbox (12.34pt too wide) in paragraph at lines {line}--{line_end}
+[]\\OT1/cmr/m/n/10 Some text that is a bit too wide for the line and sticks out (into
+the margin) |
+ []
+
+Underfull \\hbox (badness 10000) in paragraph at lines {line}--{line_end}
+
+ []
+
+LaTeX Warning: Reference `sec:{number}' on page {number} undefined on input li
+ne {line}.
+
+Package hyperref Warning: Token not allowed in a PDF string (PDFDocEncoding):
+(hyperref)                removing `math shift' on input line {line}.
+
+[{number}] (/tmp/book/figures/figure{number}.pdf)
+'''
+    error = '''! Undefined control sequence.
+l.{line} \\foo
+             (text
+'''
+    parts = [preamble]
+    length = len(preamble)
+    chapter = 0
+    while length < size:
+        chapter += 1
+        chapter_text = '(./chapters/chapter' + str(chapter) + '.tex\nChapter ' + str(chapter) + '.\n'
+        for number in range(200):
+            chapter_text += section.format(line=number * 10, line_end=number * 10 + 3, number=number)
+        if chapter % 10 == 0:
+            chapter_text += error.format(line=chapter)
+        chapter_text += ')\n'
+        parts.append(chapter_text)
+        length += len(chapter_text)
+    parts.append(') \nOutput written on book.pdf (2000 pages, 4000000 bytes).\n')
+    return ''.join(parts)
+
+
+def benchmark(tex_filename, log_filename):
+    parser = LaTeXLogParser()
+    start_time = time.time()
+    log_items = parser.parse_build_log(tex_filename, log_filename)
+    seconds = time.time() - start_time
+
+    counts = {'error': 0, 'warning': 0, 'badbox': 0}
+    for items in log_items.values():
+        for item_type in counts:
+            counts[item_type] += len(items[item_type])
+    size = os.path.getsize(log_filename) / 1000000
+    print(os.path.basename(log_filename) + ': ' + '{:.1f}'.format(size) + ' MB in ' + '{:.2f}'.format(seconds) + ' s (' + '{:.1f}'.format(size / seconds) + ' MB/s)')
+    print('    ' + str(len(log_items)) + ' files, errors: ' + str(counts['error']) + ', warnings: ' + str(counts['warning']) + ', badboxes: ' + str(counts['badbox']))
+
+
+arguments = sys.argv[1:]
+if len(arguments) > 0 and arguments[0].endswith('.log'):
+    for log_filename in arguments:
+        benchmark(os.path.splitext(os.path.abspath(log_filename))[0] + '.tex', log_filename)
+else:
+    sizes = [float(arguments[0])] if len(arguments) > 0 else [1, 10, 40]
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            log_filename = os.path.join(folder, 'book-' + str(size) + 'mb.log')
+            with open(log_filename, 'w') as f:
+                f.write(generate_log(int(size * 1000000)))
+            benchmark('/tmp/book/book.tex', log_filename)
+
+
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+# Compares loading the autocomplete command database from the XML files
+# with loading it from the compiled cache. Run from the source folder:
+# python3 scripts/benchmark_startup.py
+
+import sys
+import os.path
+import tempfile
+import time
+
+sys.dont_write_bytecode = True
+
+src_path = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, src_path)
+from setzer.app.autocomplete_provider.commands_cache import CommandsCache
+
+resources_path = os.path.join(src_path, 'data', 'resources')
+runs = 20
+
+with tempfile.TemporaryDirectory() as config_folder:
+    commands_cache = CommandsCache(resources_path, config_folder)
+
+    start_time = time.time()
+    for i in range(runs):
+        commands_cache.compile()
+    xml_time = (time.time() - start_time) / runs
+
+    commands_cache.get_data()
+    start_time = time.time()
+    for i in range(runs):
+        commands_cache.load(commands_cache.get_fingerprint())
+    cache_time = (time.time() - start_time) / runs
+
+print('parse XML files: ' + '{:.1f}'.format(xml_time * 1000) + ' ms')
+print('load compiled cache: ' + '{:.1f}'.format(cache_time * 1000) + ' ms')
+print('speedup: ' + '{:.1f}'.format(xml_time / cache_time) + 'x')
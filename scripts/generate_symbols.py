@@ -23,8 +23,22 @@ from gi.repository import Poppler
 import xml.etree.ElementTree as ET
 import subprocess, os, os.path
 import re
+import sys
+
+# Renders the sidebar symbols to svg with xelatex, then packs the svgs of
+# each folder into one sprite atlas (folder-atlas.svg). With --atlas-only,
+# only the atlases are made, from the svgs already there.
+# Run from the scripts folder.
 
 width_regex = re.compile('exported to ([0-9]+) x ([0-9]+) pixels')
+svg_tag_regex = re.compile(r'<svg[^>]*>')
+view_box_regex = re.compile(r'viewBox="([^"]*)"')
+
+symbols_path = '../data/resources/symbols'
+
+# width the atlases are packed to, and space between symbols, in pixels
+atlas_width = 512
+atlas_spacing = 2
 
 folders = [
             'arrows',
@@ -58,10 +72,59 @@ def generate_tex(border_h, border_v):
         tex_file += '\\end{document}\n'
 
         return tex_file
-    
 
-for folder in folders:
-    tree = ET.parse('../setzer/resources/symbols/' + folder + '.xml')
+
+# packs the symbols of folder into rows of the atlas, at the pixel size the
+# sidebar shows them (1.5 times the original size, square). Positions and
+# sizes are whole pixels at scale 1, so they stay exact at every integer
+# scale factor. They're written to the folder's xml as the atlas index.
+def generate_atlas(folder):
+    tree = ET.parse(os.path.join(symbols_path, folder + '.xml'))
+    root = tree.getroot()
+
+    sprites = list()
+    x, y, row_height = 0, 0, 0
+    for number, child in enumerate(root):
+        attrib = child.attrib
+        size = int(max(int(attrib.get('original_width', 10)), int(attrib.get('original_height', 10))) * 1.5)
+        if x > 0 and x + size > atlas_width:
+            x, y, row_height = 0, y + row_height + atlas_spacing, 0
+
+        with open(os.path.join(symbols_path, folder, 'sidebar-' + attrib['file'].rsplit('.')[0] + '-symbolic.svg'), 'r') as f:
+            svg = f.read()
+        svg_tag = svg_tag_regex.search(svg)
+        view_box = view_box_regex.search(svg_tag.group(0)).group(1)
+        content = svg[svg_tag.end():svg.rindex('</svg>')]
+
+        # ids of the symbol files clash, every symbol gets its own prefix
+        prefix = 's' + str(number) + '-'
+        content = content.replace('id="', 'id="' + prefix).replace('href="#', 'href="#' + prefix).replace('url(#', 'url(#' + prefix)
+        sprites.append('<svg x="' + str(x) + '" y="' + str(y) + '" width="' + str(size) + '" height="' + str(size) + '" viewBox="' + view_box + '">' + content + '</svg>\n')
+
+        child.set('atlas_x', str(x))
+        child.set('atlas_y', str(y))
+        child.set('atlas_size', str(size))
+        x += size + atlas_spacing
+        row_height = max(row_height, size)
+    height = y + row_height
+
+    with open(os.path.join(symbols_path, folder + '-atlas.svg'), 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="' + str(atlas_width) + '" height="' + str(height) + '" viewBox="0 0 ' + str(atlas_width) + ' ' + str(height) + '" version="1.1">\n')
+        f.write(''.join(sprites))
+        f.write('</svg>\n')
+
+    root.set('atlas_width', str(atlas_width))
+    root.set('atlas_height', str(height))
+    for element in root.iter():
+        attributes = sorted(element.attrib.items())
+        element.attrib.clear()
+        element.attrib.update(attributes)
+    tree.write(os.path.join(symbols_path, folder + '.xml'))
+
+
+for folder in ([] if '--atlas-only' in sys.argv else folders):
+    tree = ET.parse(os.path.join(symbols_path, folder + '.xml'))
     root = tree.getroot()
 
     for child in root:
@@ -97,17 +160,17 @@ for folder in folders:
         process.kill()
 
         # make svg
-        try: os.mkdir('../setzer/resources/symbols')
+        try: os.mkdir(symbols_path)
         except FileExistsError: pass
-        try: os.mkdir('../setzer/resources/symbols/' + folder)
+        try: os.mkdir(os.path.join(symbols_path, folder))
         except FileExistsError: pass
 
-        arguments = ['pdf2svg', 'temp.pdf', '../setzer/resources/symbols/' + folder + '/sidebar-' + attrib['file'][:-4] + '-symbolic.svg']
+        arguments = ['pdf2svg', 'temp.pdf', os.path.join(symbols_path, folder, 'sidebar-' + attrib['file'][:-4] + '-symbolic.svg')]
         process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         process.wait()
 
         # get image size
-        arguments = ['inkscape', '--export-png=temp.png', '../setzer/resources/symbols/' + folder + '/sidebar-' + attrib['file'][:-4] + '-symbolic.svg']
+        arguments = ['inkscape', '--export-png=temp.png', os.path.join(symbols_path, folder, 'sidebar-' + attrib['file'][:-4] + '-symbolic.svg')]
         process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         process.wait()
         output = process.communicate()
@@ -117,7 +180,7 @@ for folder in folders:
         process.kill()
         child.set('original_width', width_match.group(1))
         child.set('original_height', width_match.group(2))
-        tree.write('../setzer/resources/symbols/' + folder + '.xml')
+        tree.write(os.path.join(symbols_path, folder + '.xml'))
 
         # delete helper files
         os.remove('temp.tex')
@@ -126,4 +189,6 @@ for folder in folders:
         os.remove('temp.pdf')
         os.remove('temp.png')
 
+for folder in folders:
+    generate_atlas(folder)
 
@@ -18,29 +18,52 @@
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import GObject
+from gi.repository import Gio
 
+import _thread as thread, queue
+import os
 import os.path
 import re
-import time
-import xml.etree.ElementTree as ET
+import stat
 
+from setzer.app.autocomplete_provider.commands_cache import CommandsCache
+from setzer.app.autocomplete_provider.included_files_cache import IncludedFilesCache
+from setzer.helpers.bibtex_entry_table import BibTeXEntryTable, parse_entries
+from setzer.helpers.prefix_index import PrefixIndex
+from setzer.helpers.symbol_set import SymbolSet
 import setzer.helpers.timer as timer
 
 
 class AutocompleteProvider(object):
 
-    def __init__(self, resources_path, workspace, latex_parser_regex, bibtex_parser_regex, packages_dict):
+    def __init__(self, resources_path, cache_folder, workspace, latex_parser_regex, get_packages_dict):
         self.workspace = workspace
         self.resources_path = resources_path
+        self.cache_folder = cache_folder
         self.latex_parser_regex = latex_parser_regex
-        self.bibtex_parser_regex = bibtex_parser_regex
-        self.packages_dict = packages_dict
+        self.get_packages_dict = get_packages_dict
 
-        self.static_proposals = dict()
-        self.static_begin_end_proposals = dict()
+        # loaded on first use
+        self.static_proposals = None
+        self.static_begin_end_proposals = None
+        self.packages_index = None
         self.dynamic_word_beginnings = list()
-        self.begin_end_commands = dict()
-        self.included_files_labels = dict()
+
+        # sources are open documents and the pathnames of included files
+        self.labels = SymbolSet(indexed=True)
+        self.bibitems = SymbolSet(indexed=True)
+        self.bibentries = BibTeXEntryTable()
+        self.documents_by_content = dict()
+
+        # pathname -> (file monitor, parse function), main thread only
+        self.included_files = dict()
+
+        # included files are read on a thread of their own,
+        # the following are only touched from there.
+        self.included_files_cache = IncludedFilesCache(cache_folder)
+        self.included_files_stats = dict()
+        self.included_files_queue = queue.Queue()
+        thread.start_new_thread(self.included_files_loop, ())
 
         self.ref_types = dict()
         self.ref_types['references'] = list()
@@ -69,10 +92,11 @@ class AutocompleteProvider(object):
         self.last_dynamic_proposals = list()
 
         self.generate_dynamic_word_beginnings()
-        self.generate_static_proposals()
-        self.generate_static_begin_end_proposals()
-        self.parse_included_files()
-        GObject.timeout_add(2000, self.parse_included_files)
+        for document in self.workspace.open_documents:
+            self.add_document(document)
+        self.workspace.connect('new_document', self.on_new_document)
+        self.workspace.connect('document_removed', self.on_document_removed)
+        self.update_included_files()
 
     def get_items_for_completion_window(self, current_word, last_tabbed_command):
         items = list()
@@ -98,22 +122,23 @@ class AutocompleteProvider(object):
         return items
 
     def get_begin_end_items(self, word, last_tabbed_command):
-        try: items_all = self.static_begin_end_proposals[word.lower()]
-        except KeyError: items = list()
-        else:
-            items = list()
-            for item in items_all:
-                if last_tabbed_command != None and last_tabbed_command == item['command']:
-                    items.insert(0, item)
-                else:
-                    items.append(item)
+        items = list()
+        if len(word) < 1: return items
+
+        for rank, item in self.get_static_begin_end_proposals().get_top(word.lower(), 20, self.get_rank):
+            if last_tabbed_command != None and last_tabbed_command == item['command']:
+                items.insert(0, item)
+            else:
+                items.append(item)
         return items
 
     #@timer.timer
     def get_items(self, word):
         items = list()
-        try: static_items = self.static_proposals[word.lower()]
-        except KeyError: static_items = list()
+        if len(word) < 2:
+            static_items = list()
+        else:
+            static_items = [item for rank, item in self.get_static_proposals().get_top(word.lower(), 20, self.get_rank)]
         dynamic_items = self.get_dynamic_items(word)
         add_dynamic = True
         for item in static_items:
@@ -154,119 +179,128 @@ class AutocompleteProvider(object):
         ref_types = self.ref_types['references']
 
         dynamic_items = list()
-        labels = self.get_labels_for_dynamic_items()
-
         for ref_type in ref_types:
             if len(dynamic_items) >= 20: break
-            self.append_to_dynamic_items(word, dynamic_items, ref_type, labels, 'label')
+            prefix = self.get_label_prefix(word, ref_type[0] + '{')
+            if prefix != None:
+                self.append_to_dynamic_items(dynamic_items, ref_type, self.get_labels_for_dynamic_items(prefix), 'label')
         return dynamic_items
 
     def get_dynamic_bibliography_commands(self, word):
         ref_types = self.ref_types['citations']
 
         dynamic_items = list()
-        labels = self.get_bibitems_for_dynamic_items()
+        for ref_type in ref_types:
+            if len(dynamic_items) >= 20: break
+            prefix = self.get_label_prefix(word, ref_type[0] + '{')
+            if prefix != None:
+                self.append_to_dynamic_items(dynamic_items, ref_type, self.get_bibitems_for_dynamic_items(prefix), 'keylist')
 
+        # then entries with words in key, author, title or year starting with the fragments typed
         for ref_type in ref_types:
             if len(dynamic_items) >= 20: break
-            self.append_to_dynamic_items(word, dynamic_items, ref_type, labels, 'keylist')
+            prefix = self.get_label_prefix(word, ref_type[0] + '{')
+            if prefix != None and '}' not in prefix:
+                fragments = re.findall(r'\w+', prefix)
+                keys = (entry[0] for entry in self.bibentries.get_entries_matching(fragments))
+                self.append_to_dynamic_items(dynamic_items, ref_type, keys, 'keylist')
         return dynamic_items
 
     def get_dynamic_usepackage_commands(self, word):
         dynamic_items = list()
-        for package in self.packages_dict.values():
-            if len(dynamic_items) >= 20: break
+        prefix = self.get_label_prefix(word, '\\usepackage{')
+        if prefix == None: return dynamic_items
 
-            description = ''
+        packages = [item for item in self.get_packages_index().get_values(prefix.split('}')[0]) if (item[1]['command'] + '}').startswith(prefix)]
+        for rank, package in sorted(packages, key=self.get_rank)[:20]:
             command = {'command': '\\usepackage' + '{' + package['command'] + '}', 'description': package['description'], 'dotlabels': ''}
-            if command['command'][:len(word)] == word.lower():
-                if command['command'] not in [item['command'] for item in dynamic_items]:
-                    dynamic_items.append(command)
+            if command['command'] not in [item['command'] for item in dynamic_items]:
+                dynamic_items.append(command)
         return dynamic_items
 
-    #@timer.timer
-    def get_bibitems_for_dynamic_items(self):
-        bibitems_first = set()
-        bibitems_second = set()
-        bibitems_rest = set()
-
-        pathnames_done = set()
-        if self.workspace.active_document != None:
-            pathnames_done = pathnames_done | {self.workspace.active_document.get_filename()}
-            bibitems_first = bibitems_first | self.workspace.active_document.get_bibitems()
-
-            included_files = self.workspace.active_document.get_included_files()
-            for pathname in included_files:
-                if pathname not in pathnames_done:
-                    pathnames_done = pathnames_done | {pathname}
-                    if pathname in self.included_files_labels:
-                        labels_dict = self.included_files_labels[pathname]['labels']
-                        if 'bibitems' in labels_dict:
-                            bibitems_second = bibitems_second | labels_dict['bibitems']
-                    else:
-                        document_object = self.workspace.get_document_by_filename(pathname)
-                        if document_object:
-                            bibitems_second = bibitems_second | document_object.get_bibitems()
-
-        for document in self.workspace.open_documents:
-            pathnames = {document.get_filename()} | document.get_included_files()
-            for pathname in pathnames:
-                if pathname not in pathnames_done:
-                    pathnames_done = pathnames_done | {pathname}
-                    if pathname in self.included_files_labels:
-                        labels_dict = self.included_files_labels[pathname]['labels']
-                        if 'bibitems' in labels_dict:
-                            bibitems_rest = bibitems_rest | labels_dict['bibitems']
-                    else:
-                        document_object = self.workspace.get_document_by_filename(pathname)
-                        if document_object:
-                            bibitems_rest = bibitems_rest | document_object.get_bibitems()
-
-        bibitems = ['•'] + list(bibitems_first) + list(bibitems_second) + list(bibitems_rest)
-        return bibitems
-
-    def get_labels_for_dynamic_items(self):
-        labels_first = set()
-        labels_second = set()
-        labels_rest = set()
-
-        pathnames_done = set()
+    def get_label_prefix(self, word, command_beginning):
+        ''' the prefix label + '}' has to start with, so that
+            command_beginning + label + '}' starts with word.
+            None if there is no such label. '''
+
+        word = word.lower()
+        if len(word) <= len(command_beginning):
+            return '' if command_beginning.startswith(word) else None
+        if not word.startswith(command_beginning): return None
+        return word[len(command_beginning):]
+
+    def on_new_document(self, workspace, document):
+        self.add_document(document)
+        self.update_included_files()
+
+    def on_document_removed(self, workspace, document):
+        self.labels.remove_source(document)
+        self.bibitems.remove_source(document)
+        self.bibentries.remove_source(document)
+        document.content.disconnect('symbols_changed', self.on_symbols_changed)
+        document.disconnect('filename_change', self.on_filename_change)
+        del(self.documents_by_content[document.content])
+        self.update_included_files()
+
+    def add_document(self, document):
+        self.labels.replace_source(document, document.get_labels())
+        self.bibitems.replace_source(document, document.get_bibitems())
+        self.bibentries.replace_source(document, document.get_bibentries())
+        self.documents_by_content[document.content] = document
+        document.content.connect('symbols_changed', self.on_symbols_changed)
+        document.connect('filename_change', self.on_filename_change)
+
+    def on_symbols_changed(self, content, symbols_delta):
+        document = self.documents_by_content[content]
+        if 'labels' in symbols_delta:
+            self.labels.update_source(document, symbols_delta['labels']['added'], symbols_delta['labels']['removed'])
+        if 'bibitems' in symbols_delta:
+            self.bibitems.update_source(document, symbols_delta['bibitems']['added'], symbols_delta['bibitems']['removed'])
+        if 'bibentries' in symbols_delta:
+            self.bibentries.update_source(document, symbols_delta['bibentries']['added'], symbols_delta['bibentries']['removed'])
+        if 'included_latex_files' in symbols_delta or 'bibliographies' in symbols_delta:
+            self.update_included_files()
+
+    def on_filename_change(self, document, filename=None):
+        self.update_included_files()
+
+    def get_bibitems_for_dynamic_items(self, prefix):
+        return self.get_symbols_for_dynamic_items(self.bibitems, prefix)
+
+    def get_labels_for_dynamic_items(self, prefix):
+        return self.get_symbols_for_dynamic_items(self.labels, prefix)
+
+    def get_symbols_for_dynamic_items(self, symbol_set, prefix):
+        ''' yields the symbols where symbol + '}' starts with prefix: the
+            ones of the active document first, then those of the files it
+            includes, then all others, each in alphabetical order. Callers
+            usually stop after a few matches, so nothing is computed up front. '''
+
+        if ('•}').startswith(prefix):
+            yield '•'
+
+        # labels can't contain '}', so only the part before it is looked up.
+        index_prefix = prefix.split('}')[0]
+        sources_done = list()
         if self.workspace.active_document != None:
-            pathnames_done = pathnames_done | {self.workspace.active_document.get_filename()}
-            labels_first = labels_first | self.workspace.active_document.get_labels()
-
-            included_files = self.workspace.active_document.get_included_files()
-            for pathname in included_files:
-                if pathname not in pathnames_done:
-                    pathnames_done = pathnames_done | {pathname}
-                    if pathname in self.included_files_labels:
-                        labels_dict = self.included_files_labels[pathname]['labels']
-                        if 'labels' in labels_dict:
-                            labels_second = labels_second | labels_dict['labels']
-                    else:
-                        document_object = self.workspace.get_document_by_filename(pathname)
-                        if document_object:
-                            labels_second = labels_second | document_object.get_labels()
-
-        for document in self.workspace.open_documents:
-            pathnames = {document.get_filename()} | document.get_included_files()
-            for pathname in pathnames:
-                if pathname not in pathnames_done:
-                    pathnames_done = pathnames_done | {pathname}
-                    if pathname in self.included_files_labels:
-                        labels_dict = self.included_files_labels[pathname]['labels']
-                        if 'labels' in labels_dict:
-                            labels_rest = labels_rest | labels_dict['labels']
-                    else:
-                        document_object = self.workspace.get_document_by_filename(pathname)
-                        if document_object:
-                            labels_rest = labels_rest | document_object.get_labels()
-
-        labels = ['•'] + list(labels_first) + list(labels_second) + list(labels_rest)
-        return labels
-
-    def append_to_dynamic_items(self, word, items, ref_type, labels, parlabel):
-        for label in iter(labels):
+            sources = [self.workspace.active_document]
+            for pathname in self.workspace.active_document.get_included_files():
+                document = self.workspace.get_document_by_filename(pathname)
+                sources.append(document if document != None else pathname)
+
+            for source in sources:
+                if source in sources_done: continue
+                for symbol in symbol_set.get_symbols_with_prefix(index_prefix, source):
+                    if (symbol + '}').startswith(prefix) and not any(symbol_set.source_contains(source_done, symbol) for source_done in sources_done):
+                        yield symbol
+                sources_done.append(source)
+
+        for symbol in symbol_set.get_symbols_with_prefix(index_prefix):
+            if (symbol + '}').startswith(prefix) and not any(symbol_set.source_contains(source_done, symbol) for source_done in sources_done):
+                yield symbol
+
+    def append_to_dynamic_items(self, items, ref_type, labels, parlabel):
+        for label in labels:
             if len(items) >= 20: break
 
             if label == '•':
@@ -274,59 +308,116 @@ class AutocompleteProvider(object):
                 dotlabels = parlabel
             else:
                 description = ref_type[1].format(label=label)
+                if parlabel == 'keylist':
+                    description += self.get_bibentry_description(label)
                 dotlabels = ''
             command = {'command': ref_type[0] + '{' + label + '}', 'description': description, 'dotlabels': dotlabels}
-            if command['command'][:len(word)] == word.lower():
-                if command['command'] not in [item['command'] for item in items]:
-                    items.append(command)
+            if command['command'] not in [item['command'] for item in items]:
+                items.append(command)
+
+    def get_bibentry_description(self, key):
+        ''' author, year and title of the entry for key, as a second line. '''
+
+        entry = self.bibentries.get_entry(key)
+        if entry == None: return ''
 
-    def parse_included_files(self):
-        current_includes = set()
+        key, entry_type, author, title, year = entry
+        description = author
+        if year != '':
+            description += ' (' + year + ')' if description != '' else year
+        if title != '':
+            description += ': ' + title if description != '' else title
+        return '\n' + description if description != '' else ''
+
+    def update_included_files(self):
+        ''' watch the files included by open documents, unless they are
+            open themselves. Called when includes or open documents change. '''
+
+        included_files = dict()
         open_docs_pathnames = self.workspace.get_open_documents_filenames()
         for document in self.workspace.open_latex_documents:
-            current_includes = current_includes | document.get_included_files()
             for pathname in document.get_bibliography_files():
                 if pathname not in open_docs_pathnames:
-                    if os.path.isfile(pathname):
-                        if pathname not in self.included_files_labels:
-                            self.included_files_labels[pathname] = self.parse_bibtex_file(pathname)
-                        else:
-                            last_parse_time = self.included_files_labels[pathname]['last_parse_time']
-                            if last_parse_time < os.path.getmtime(pathname):
-                                self.included_files_labels[pathname] = self.parse_bibtex_file(pathname)
+                    included_files[pathname] = self.parse_bibtex_file
             for pathname in document.get_included_latex_files():
                 if pathname not in open_docs_pathnames:
-                    if os.path.isfile(pathname):
-                        if pathname not in self.included_files_labels:
-                            self.included_files_labels[pathname] = self.parse_latex_file(pathname)
-                        else:
-                            last_parse_time = self.included_files_labels[pathname]['last_parse_time']
-                            if last_parse_time < os.path.getmtime(pathname):
-                                self.included_files_labels[pathname] = self.parse_latex_file(pathname)
-        for pathname in list(self.included_files_labels):
-            if pathname not in current_includes or pathname in open_docs_pathnames:
-                del(self.included_files_labels[pathname])
-        return True
-
-    def parse_latex_file(self, pathname):
-        with open(pathname, 'r') as f:
-            text = f.read()
+                    included_files[pathname] = self.parse_latex_file
+
+        for pathname in list(self.included_files):
+            if pathname not in included_files:
+                self.included_files[pathname][0].cancel()
+                del(self.included_files[pathname])
+                self.labels.remove_source(pathname)
+                self.bibitems.remove_source(pathname)
+                self.bibentries.remove_source(pathname)
+                self.included_files_queue.put((pathname, None))
+
+        for pathname, parse_function in included_files.items():
+            if pathname not in self.included_files:
+                monitor = Gio.File.new_for_path(pathname).monitor_file(Gio.FileMonitorFlags.WATCH_MOVES, None)
+                monitor.connect('changed', self.on_included_file_changed, pathname)
+                self.included_files[pathname] = (monitor, parse_function)
+                self.included_files_queue.put((pathname, parse_function))
+
+    def on_included_file_changed(self, monitor, file, other_file, event_type, pathname):
+        if event_type in [Gio.FileMonitorEvent.CHANGED, Gio.FileMonitorEvent.ATTRIBUTE_CHANGED, Gio.FileMonitorEvent.PRE_UNMOUNT]: return
+        if pathname not in self.included_files: return
+
+        self.included_files_queue.put((pathname, self.included_files[pathname][1]))
+
+    def included_files_loop(self):
+        ''' jobs are (pathname, parse_function), parse_function None for
+            files that are no longer included. '''
+
+        while True:
+            pathname, parse_function = self.included_files_queue.get(block=True)
+            if parse_function == None:
+                if pathname in self.included_files_stats:
+                    del(self.included_files_stats[pathname])
+            else:
+                self.read_included_file(pathname, parse_function)
+            if self.included_files_queue.empty():
+                self.included_files_cache.save()
+
+    def read_included_file(self, pathname, parse_function):
+        try: stat_result = os.stat(pathname)
+        except OSError: stat_result = None
+        if stat_result == None or not stat.S_ISREG(stat_result.st_mode):
+            if stat_result == None:
+                self.included_files_cache.remove(pathname)
+            if pathname in self.included_files_stats:
+                del(self.included_files_stats[pathname])
+                GObject.idle_add(self.set_included_file_symbols, pathname, set(), set(), set())
+            return
+
+        file_stats = (stat_result.st_size, stat_result.st_mtime_ns)
+        if self.included_files_stats.get(pathname) == file_stats: return
+
+        try: labels, bibitems, bibentries = self.included_files_cache.get_symbols(pathname, stat_result, parse_function)
+        except IOError: return
+        self.included_files_stats[pathname] = file_stats
+        GObject.idle_add(self.set_included_file_symbols, pathname, labels, bibitems, bibentries)
+
+    def set_included_file_symbols(self, pathname, labels, bibitems, bibentries):
+        if pathname in self.included_files:
+            self.labels.replace_source(pathname, labels)
+            self.bibitems.replace_source(pathname, bibitems)
+            self.bibentries.replace_source(pathname, bibentries)
+        return False
+
+    def parse_latex_file(self, text):
         labels = set()
         bibitems = set()
         for match in self.latex_parser_regex.finditer(text):
             if match.group(1) == 'label':
-                labels = labels | {match.group(2).strip()}
+                labels.add(match.group(2).strip())
             elif match.group(5) == 'bibitem':
-                bibitems = bibitems | {match.group(6).strip()}
-        return {'last_parse_time': time.time(), 'labels': {'labels': labels, 'bibitems': bibitems}}
+                bibitems.add(match.group(6).strip())
+        return (labels, bibitems, set())
 
-    def parse_bibtex_file(self, pathname):
-        with open(pathname, 'r') as f:
-            text = f.read()
-        bibitems = set()
-        for match in self.bibtex_parser_regex.finditer(text):
-            bibitems = bibitems | {match.group(2).strip()}
-        return {'last_parse_time': time.time(), 'labels': {'bibitems': bibitems}}
+    def parse_bibtex_file(self, text):
+        bibentries = set(entry for (entry, line, offset) in parse_entries(text))
+        return (set(), set(entry[0] for entry in bibentries), bibentries)
 
     def generate_dynamic_word_beginnings(self):
         self.dynamic_word_beginnings = dict()
@@ -337,51 +428,34 @@ class AutocompleteProvider(object):
                 for i in range(2, len(command) + 1):
                     self.dynamic_word_beginnings[ref_types_type].append(command[:i])
 
-    def generate_static_begin_end_proposals(self):
-        commands = self.begin_end_commands
-        self.static_begin_end_proposals = dict()
-        for command in commands.values():
-            for i in range(1, len(command['command']) + 1):
-                try:
-                    if len(self.static_begin_end_proposals[command['command'][0:i].lower()]) < 20:
-                        self.static_begin_end_proposals[command['command'][0:i].lower()].append(command)
-                except KeyError:
-                    self.static_begin_end_proposals[command['command'][0:i].lower()] = [command]
+    def get_static_proposals(self):
+        if self.static_proposals == None:
+            self.load_static_proposals()
+        return self.static_proposals
 
-    #@timer.timer
-    def generate_static_proposals(self):
-        commands = self.get_commands()
-        self.static_proposals = dict()
-        for command in commands.values():
-            if not command['lowpriority']:
-                for i in range(2, len(command['command']) + 1):
-                    try:
-                        if len(self.static_proposals[command['command'][0:i].lower()]) < 20:
-                            self.static_proposals[command['command'][0:i].lower()].append(command)
-                    except KeyError:
-                        self.static_proposals[command['command'][0:i].lower()] = [command]
-        for command in commands.values():
-            if command['lowpriority']:
-                for i in range(2, len(command['command']) + 1):
-                    try:
-                        if len(self.static_proposals[command['command'][0:i].lower()]) < 20:
-                            self.static_proposals[command['command'][0:i].lower()].append(command)
-                    except KeyError:
-                        self.static_proposals[command['command'][0:i].lower()] = [command]
+    def get_static_begin_end_proposals(self):
+        if self.static_begin_end_proposals == None:
+            self.load_static_proposals()
+        return self.static_begin_end_proposals
+
+    def get_packages_index(self):
+        if self.packages_index == None:
+            self.generate_packages_index()
+        return self.packages_index
 
     #@timer.timer
-    def get_commands(self):
-        commands = dict()
-        for filename in ['additional.xml', 'latex-document.xml', 'tex.xml', 'textcomp.xml', 'graphicx.xml', 'latex-dev.xml', 'amsmath.xml', 'amsopn.xml', 'amsbsy.xml', 'amsfonts.xml', 'amssymb.xml', 'amsthm.xml', 'color.xml', 'url.xml', 'geometry.xml', 'glossaries.xml']:
-            tree = ET.parse(os.path.join(self.resources_path, 'latexdb', 'commands', filename))
-            root = tree.getroot()
-            for child in root:
-                attrib = child.attrib
-                commands[attrib['name']] = {'command': attrib['text'], 'description': attrib['description'], 'lowpriority': True if attrib['lowpriority'] == "True" else False, 'dotlabels': attrib['dotlabels']}
-                match = re.match(r'\\begin\{([^\}]+)\}', attrib['name'])
-                if match:
-                    name = match.group(1)
-                    self.begin_end_commands[name] = {'command': name, 'description': '', 'lowpriority': False, 'dotlabels': ''}
-        return commands
+    def load_static_proposals(self):
+        data = CommandsCache(self.resources_path, self.cache_folder).get_data()
+        self.static_proposals = data['static_proposals']
+        self.static_begin_end_proposals = data['static_begin_end_proposals']
+
+    def generate_packages_index(self):
+        items = list()
+        for package in self.get_packages_dict().values():
+            items.append((package['command'], (len(items), package)))
+        self.packages_index = PrefixIndex(items)
+
+    def get_rank(self, item):
+        return item[0]
 
 
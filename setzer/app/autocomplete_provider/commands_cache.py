@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import os
+import os.path
+import pickle
+import re
+import xml.etree.ElementTree as ET
+
+from setzer.helpers.prefix_index import PrefixIndex
+
+
+class CommandsCache(object):
+    ''' The command database in latexdb/commands, compiled into prefix
+        indexes and pickled to the cache folder on first use. Later
+        starts load the pickle and don't touch the XML files, unless
+        one of them changed since (checked by size and mtime). '''
+
+    version = 1
+    filenames = ['additional.xml', 'latex-document.xml', 'tex.xml', 'textcomp.xml', 'graphicx.xml', 'latex-dev.xml', 'amsmath.xml', 'amsopn.xml', 'amsbsy.xml', 'amsfonts.xml', 'amssymb.xml', 'amsthm.xml', 'color.xml', 'url.xml', 'geometry.xml', 'glossaries.xml']
+
+    def __init__(self, resources_path, cache_folder):
+        self.commands_path = os.path.join(resources_path, 'latexdb', 'commands')
+        self.pathname = os.path.join(cache_folder, 'commands_cache.pickle')
+
+    def get_data(self):
+        ''' returns a dict with the prefix indexes 'static_proposals'
+            and 'static_begin_end_proposals'. '''
+
+        fingerprint = self.get_fingerprint()
+        data = self.load(fingerprint)
+        if data == None:
+            data = self.compile()
+            self.save(fingerprint, data)
+        return data
+
+    def get_fingerprint(self):
+        file_stats = list()
+        for filename in self.filenames:
+            stat_result = os.stat(os.path.join(self.commands_path, filename))
+            file_stats.append((filename, stat_result.st_size, stat_result.st_mtime_ns))
+        return (self.version, self.commands_path, file_stats)
+
+    def load(self, fingerprint):
+        try: filehandle = open(self.pathname, 'rb')
+        except IOError: return None
+        with filehandle:
+            try: cache = pickle.load(filehandle)
+            except Exception: return None
+        if not isinstance(cache, dict) or cache.get('fingerprint') != fingerprint: return None
+        return cache['data']
+
+    def save(self, fingerprint, data):
+        folder = os.path.dirname(self.pathname)
+        if not os.path.isdir(folder):
+            try: os.makedirs(folder)
+            except OSError: return
+
+        temp_pathname = self.pathname + '.tmp'
+        try: filehandle = open(temp_pathname, 'wb')
+        except IOError: return
+        with filehandle:
+            pickle.dump({'fingerprint': fingerprint, 'data': data}, filehandle, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_pathname, self.pathname)
+
+    def compile(self):
+        ''' commands are ranked by priority first, then by their order in the database. '''
+
+        commands = dict()
+        begin_end_commands = dict()
+        for filename in self.filenames:
+            tree = ET.parse(os.path.join(self.commands_path, filename))
+            root = tree.getroot()
+            for child in root:
+                attrib = child.attrib
+                commands[attrib['name']] = {'command': attrib['text'], 'description': attrib['description'], 'lowpriority': True if attrib['lowpriority'] == "True" else False, 'dotlabels': attrib['dotlabels']}
+                match = re.match(r'\\begin\{([^\}]+)\}', attrib['name'])
+                if match:
+                    name = match.group(1)
+                    begin_end_commands[name] = {'command': name, 'description': '', 'lowpriority': False, 'dotlabels': ''}
+
+        items = list()
+        for command in commands.values():
+            items.append((command['command'].lower(), ((command['lowpriority'], len(items)), command)))
+        static_proposals = PrefixIndex(items)
+
+        items = list()
+        for command in begin_end_commands.values():
+            items.append((command['command'].lower(), (len(items), command)))
+        static_begin_end_proposals = PrefixIndex(items)
+
+        return {'static_proposals': static_proposals, 'static_begin_end_proposals': static_begin_end_proposals}
+
+
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import hashlib
+import os
+import os.path
+import pickle
+
+
+class IncludedFilesCache(object):
+    ''' Labels, bibitems and BibTeX entries of included files, kept in
+        the cache folder between sessions. An entry is valid as long as size and
+        mtime of its file are unchanged. If they differ but the content hash is
+        the same (touch, checkout), the entry is kept as well. '''
+
+    version = 2
+
+    def __init__(self, pathname):
+        self.pathname = os.path.join(pathname, 'included_files.pickle')
+        self.entries = dict()
+        self.has_changes = False
+
+        self.load()
+
+    def get_symbols(self, pathname, stat_result, parse_function):
+        ''' returns (labels, bibitems, bibentries) of the file at pathname.
+            parse_function(text) is called on a cache miss only. '''
+
+        entry = self.entries.get(pathname)
+        if entry != None and entry['size'] == stat_result.st_size and entry['mtime'] == stat_result.st_mtime_ns:
+            return (entry['labels'], entry['bibitems'], entry['bibentries'])
+
+        with open(pathname, 'rb') as f:
+            data = f.read()
+        content_hash = hashlib.sha1(data).hexdigest()
+
+        if entry == None or entry['hash'] != content_hash:
+            labels, bibitems, bibentries = parse_function(data.decode('utf-8', 'replace'))
+            entry = {'labels': labels, 'bibitems': bibitems, 'bibentries': bibentries, 'hash': content_hash}
+            self.entries[pathname] = entry
+        entry['size'] = stat_result.st_size
+        entry['mtime'] = stat_result.st_mtime_ns
+        self.has_changes = True
+        return (entry['labels'], entry['bibitems'], entry['bibentries'])
+
+    def remove(self, pathname):
+        if pathname in self.entries:
+            del(self.entries[pathname])
+            self.has_changes = True
+
+    def load(self):
+        try: filehandle = open(self.pathname, 'rb')
+        except IOError: return
+        with filehandle:
+            try: data = pickle.load(filehandle)
+            except Exception: return
+        if isinstance(data, dict) and data.get('version') == self.version:
+            self.entries = data['entries']
+
+    def save(self):
+        ''' write to a temporary file first, so an interrupted save
+            doesn't leave a broken cache behind. '''
+
+        if not self.has_changes: return
+
+        folder = os.path.dirname(self.pathname)
+        if not os.path.isdir(folder):
+            try: os.makedirs(folder)
+            except OSError: return
+
+        temp_pathname = self.pathname + '.tmp'
+        try: filehandle = open(temp_pathname, 'wb')
+        except IOError: return
+        with filehandle:
+            pickle.dump({'version': self.version, 'entries': self.entries}, filehandle)
+        os.replace(temp_pathname, self.pathname)
+        self.has_changes = False
+
+
@@ -21,7 +21,7 @@ from gi.repository import GtkSource
 
 import re
 import os, os.path
-from xdg.BaseDirectory import xdg_config_home
+from xdg.BaseDirectory import xdg_config_home, xdg_cache_home
 import xml.etree.ElementTree as ET
 
 import setzer.app.settings as settingscontroller
@@ -29,6 +29,8 @@ import setzer.app.autocomplete_provider.autocomplete_provider as autocomplete_pr
 import setzer.app.color_manager as color_manager
 import setzer.app.font_manager as font_manager
 import setzer.helpers.popover_menu_builder as popover_menu_builder
+import setzer.document.latex.build_system.build_executor as build_executor
+import setzer.document.latex.preview.preview_render_pool as preview_render_pool
 
 
 class ServiceLocator(object):
@@ -47,6 +49,8 @@ class ServiceLocator(object):
     source_style_scheme_manager = None
     color_manager = None
     font_manager = None
+    build_executor = None
+    preview_render_pool = None
 
     def init_main_window(main_window):
         ServiceLocator.main_window = main_window
@@ -113,8 +117,17 @@ class ServiceLocator(object):
     def init_autocomplete_provider(workspace):
         path = ServiceLocator.get_resources_path()
         latex_parser_regex = ServiceLocator.get_regex_object(r'\\(label|include|input|bibliography|addbibresource)\{((?:\s|\w|\:|\.|,)*)\}|\\(usepackage)(?:\[.*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}')
-        bibtex_parser_regex = ServiceLocator.get_regex_object(r'@(\w+)\{(\w+)')
-        ServiceLocator.autocomplete_provider = autocomplete_provider.AutocompleteProvider(path, workspace, latex_parser_regex, bibtex_parser_regex, ServiceLocator.get_packages_dict())
+        ServiceLocator.autocomplete_provider = autocomplete_provider.AutocompleteProvider(path, ServiceLocator.get_cache_folder(), workspace, latex_parser_regex, ServiceLocator.get_packages_dict)
+
+    def get_build_executor():
+        if ServiceLocator.build_executor == None:
+            ServiceLocator.build_executor = build_executor.BuildExecutor(ServiceLocator.get_settings())
+        return ServiceLocator.build_executor
+
+    def get_preview_render_pool():
+        if ServiceLocator.preview_render_pool == None:
+            ServiceLocator.preview_render_pool = preview_render_pool.PreviewRenderPool()
+        return ServiceLocator.preview_render_pool
 
     def get_autocomplete_provider():
         return ServiceLocator.autocomplete_provider
@@ -134,6 +147,9 @@ class ServiceLocator(object):
     def get_config_folder():
         return os.path.join(xdg_config_home, 'setzer')
 
+    def get_cache_folder():
+        return os.path.join(xdg_cache_home, 'setzer')
+
     def init_setzer_version(setzer_version):
         ServiceLocator.setzer_version = setzer_version
 
@@ -70,11 +70,17 @@ class Settings(Observable):
         
         self.defaults['preferences'] = dict()
         self.defaults['preferences']['cleanup_build_files'] = True
+        self.defaults['preferences']['build_in_private_folder'] = False
+        self.defaults['preferences']['build_folder_on_tmpfs'] = False
+        self.defaults['preferences']['draft_mode'] = False
+        self.defaults['preferences']['stop_on_first_error'] = False
         self.defaults['preferences']['autoshow_build_log'] = 'errors_warnings'
         self.defaults['preferences']['latex_interpreter'] = 'xelatex'
         self.defaults['preferences']['use_latexmk'] = False
+        self.defaults['preferences']['max_parallel_builds'] = 0
         self.defaults['preferences']['prefer_dark_mode'] = False
         self.defaults['preferences']['invert_pdf'] = False
+        self.defaults['preferences']['preview_cache_size'] = 256
         self.defaults['preferences']['spaces_instead_of_tabs'] = True
         self.defaults['preferences']['tab_width'] = 4
         self.defaults['preferences']['show_line_numbers'] = True
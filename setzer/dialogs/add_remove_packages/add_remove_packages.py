@@ -36,8 +36,6 @@ class AddRemovePackagesDialog(Dialog):
         self.main_window = main_window
         self.workspace = workspace
 
-        self.packages = ServiceLocator.get_packages_dict()
-
         self.current_values = dict()
 
     def run(self, document):
@@ -48,6 +46,7 @@ class AddRemovePackagesDialog(Dialog):
         del(self.view)
 
     def setup(self):
+        self.packages = ServiceLocator.get_packages_dict()
         self.view = view.AddRemovePackagesDialogView(self.main_window)
 
         self.add_package_selection = None
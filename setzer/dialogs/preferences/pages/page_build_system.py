@@ -34,6 +34,14 @@ class PageBuildSystem(object):
     def init(self):
         self.view.option_cleanup_build_files.set_active(self.settings.get_value('preferences', 'cleanup_build_files'))
         self.view.option_cleanup_build_files.connect('toggled', self.preferences.on_check_button_toggle, 'cleanup_build_files')
+        self.view.option_build_in_private_folder.set_active(self.settings.get_value('preferences', 'build_in_private_folder'))
+        self.view.option_build_in_private_folder.connect('toggled', self.preferences.on_check_button_toggle, 'build_in_private_folder')
+        self.view.option_build_folder_on_tmpfs.set_active(self.settings.get_value('preferences', 'build_folder_on_tmpfs'))
+        self.view.option_build_folder_on_tmpfs.connect('toggled', self.preferences.on_check_button_toggle, 'build_folder_on_tmpfs')
+        self.view.option_draft_mode.set_active(self.settings.get_value('preferences', 'draft_mode'))
+        self.view.option_draft_mode.connect('toggled', self.preferences.on_check_button_toggle, 'draft_mode')
+        self.view.option_stop_on_first_error.set_active(self.settings.get_value('preferences', 'stop_on_first_error'))
+        self.view.option_stop_on_first_error.connect('toggled', self.preferences.on_check_button_toggle, 'stop_on_first_error')
 
         self.view.option_autoshow_build_log_errors.set_active(self.settings.get_value('preferences', 'autoshow_build_log') == 'errors')
         self.view.option_autoshow_build_log_errors_warnings.set_active(self.settings.get_value('preferences', 'autoshow_build_log') == 'errors_warnings')
@@ -146,6 +154,14 @@ class PageBuildSystemView(Gtk.VBox):
         self.pack_start(label, False, False, 0)
         self.option_cleanup_build_files = Gtk.CheckButton(_('Automatically remove helper files (.log, .dvi, ...) after building .pdf.'))
         self.pack_start(self.option_cleanup_build_files, False, False, 0)
+        self.option_build_in_private_folder = Gtk.CheckButton(_('Build in a private folder and keep helper files there for faster rebuilds.'))
+        self.pack_start(self.option_build_in_private_folder, False, False, 0)
+        self.option_build_folder_on_tmpfs = Gtk.CheckButton(_('Keep the private build folder in memory (/dev/shm).'))
+        self.pack_start(self.option_build_folder_on_tmpfs, False, False, 0)
+        self.option_draft_mode = Gtk.CheckButton(_('Draft mode: precompile the preamble and reuse it while it doesn\'t change (PdfLaTeX, XeLaTeX).'))
+        self.pack_start(self.option_draft_mode, False, False, 0)
+        self.option_stop_on_first_error = Gtk.CheckButton(_('Stop building at the first error.'))
+        self.pack_start(self.option_stop_on_first_error, False, False, 0)
         self.option_use_latexmk = Gtk.CheckButton(_('Use Latexmk'))
         self.pack_start(self.option_use_latexmk, False, False, 0)
 
@@ -57,6 +57,9 @@ class DocumentBibTeX(Document):
     def get_bibitems(self):
         return self.content.get_bibitems()
 
+    def get_bibentries(self):
+        return self.content.get_bibentries()
+
     def get_labels(self):
         return set()
 
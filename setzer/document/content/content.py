@@ -31,6 +31,7 @@ import math
 import setzer.document.content.parser.parser_dummy as parser_dummy
 import setzer.document.content.parser.parser_bibtex as parser_bibtex
 import setzer.document.content.parser.parser_latex as parser_latex
+import setzer.document.content.parse_scheduler as parse_scheduler
 from setzer.app.service_locator import ServiceLocator
 from setzer.helpers.observable import Observable
 import setzer.helpers.timer as timer
@@ -55,17 +56,17 @@ class Content(Observable):
         self.update_syntax_scheme()
 
         self.symbols = dict()
-        self.symbols['bibitems'] = set()
-        self.symbols['labels'] = set()
-        self.symbols['included_latex_files'] = set()
-        self.symbols['bibliographies'] = set()
-        self.symbols['packages'] = set()
+        self.symbols['bibitems'] = frozenset()
+        self.symbols['labels'] = frozenset()
+        self.symbols['included_latex_files'] = frozenset()
+        self.symbols['bibliographies'] = frozenset()
+        self.symbols['packages'] = frozenset()
         self.symbols['packages_detailed'] = dict()
-        self.symbols['blocks'] = list()
 
         if language == 'bibtex': self.parser = parser_bibtex.ParserBibTeX(self)
         elif language == 'latex': self.parser = parser_latex.ParserLaTeX(self)
         else: self.parser = parser_dummy.ParserDummy(self)
+        self.parse_scheduler = parse_scheduler.ParseScheduler(self)
 
         self.color_manager = ServiceLocator.get_color_manager()
         self.font_manager = ServiceLocator.get_font_manager()
@@ -111,12 +112,12 @@ class Content(Observable):
             self.update_syntax_scheme()
 
     def on_insert_text(self, buffer, location_iter, text, text_length):
-        self.parser.on_text_inserted(buffer, location_iter, text, text_length)
+        self.parse_scheduler.on_insert_text(buffer, location_iter, text, text_length)
         self.indentation_update = {'line_start': location_iter.get_line(), 'text_length': text_length}
         self.add_change_code('text_inserted', (buffer, location_iter, text, text_length))
 
     def on_delete_range(self, buffer, start_iter, end_iter):
-        self.parser.on_text_deleted(buffer, start_iter, end_iter)
+        self.parse_scheduler.on_delete_range(buffer, start_iter, end_iter)
         self.indentation_update = {'line_start': start_iter.get_line(), 'text_length': 0}
         self.add_change_code('text_deleted', (buffer, start_iter, end_iter))
 
@@ -130,6 +131,7 @@ class Content(Observable):
         self.add_change_code('can_redo_changed', self.undo_manager.can_redo())
 
     def on_buffer_changed(self, buffer):
+        self.parse_scheduler.on_buffer_changed(buffer)
         self.update_indentation_tags()
 
         self.update_placeholder_selection()
@@ -545,6 +547,12 @@ class Content(Observable):
     def get_text_after_offset(self, offset):
         return self.source_buffer.get_text(self.source_buffer.get_iter_at_offset(offset), self.source_buffer.get_end_iter(), True)
 
+    def get_text_in_range(self, offset_start, offset_end):
+        ''' offset_end None for the end of the text. '''
+
+        end_iter = self.source_buffer.get_end_iter() if offset_end == None else self.source_buffer.get_iter_at_offset(offset_end)
+        return self.source_buffer.get_text(self.source_buffer.get_iter_at_offset(offset_start), end_iter, True)
+
     def get_selected_text(self):
         bounds = self.source_buffer.get_selection_bounds()
         if len(bounds) == 2:
@@ -748,9 +756,29 @@ class Content(Observable):
         line_height = self.font_manager.get_line_height()
         return math.floor(self.source_view.get_visible_rect().height / line_height)
 
+    def close(self):
+        self.parser.close()
+
+    def wait_for_symbols(self):
+        ''' symbols are extracted in the background: the getters below
+            return what the parser last published, which may not include
+            the latest edits yet (observers get 'symbols_changed' when
+            it does). Callers needing the exact symbols of the text as
+            it is call this first. '''
+
+        self.parse_scheduler.parse()
+        self.parser.wait_for_symbols()
+
     def get_bibitems(self):
+        ''' may miss the latest edits, see wait_for_symbols(). '''
+
+        self.parse_scheduler.parse()
         return self.symbols['bibitems']
 
+    def get_bibentries(self):
+        self.parse_scheduler.parse()
+        return self.parser.get_entries()
+
     def add_packages(self, packages):
         first_package = True
         text = ''
@@ -793,24 +821,44 @@ class Content(Observable):
                 self.source_buffer.delete(start_iter, end_iter)
 
     def get_packages(self):
+        ''' exact, they are used to edit the text. '''
+
+        self.wait_for_symbols()
         return self.symbols['packages']
 
     def get_package_details(self):
+        self.wait_for_symbols()
         return self.symbols['packages_detailed']
 
+    def set_symbols(self, symbols, symbols_delta):
+        ''' symbols_delta: names added and removed per symbol type. '''
+
+        self.symbols.update(symbols)
+        self.add_change_code('symbols_changed', symbols_delta)
+
     def get_blocks(self):
-        return self.symbols['blocks']
+        self.parse_scheduler.parse()
+        return self.parser.get_blocks()
 
-    def set_blocks(self, blocks):
-        self.symbols['blocks'] = blocks
+    def update_blocks(self, blocks_delta):
+        self.add_change_code('blocks_changed', blocks_delta)
 
     def get_included_latex_files(self):
+        ''' may miss the latest edits, see wait_for_symbols(). '''
+
+        self.parse_scheduler.parse()
         return self.symbols['included_latex_files']
 
     def get_bibliography_files(self):
+        ''' may miss the latest edits, see wait_for_symbols(). '''
+
+        self.parse_scheduler.parse()
         return self.symbols['bibliographies']
 
     def get_labels(self):
+        ''' may miss the latest edits, see wait_for_symbols(). '''
+
+        self.parse_scheduler.parse()
         return self.symbols['labels']
 
 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
+
+class ParseScheduler(object):
+    ''' Collects the edits to the source buffer into one dirty range
+        and has the parser look at it in one go: at the end of a user
+        action (typing, paste, replace all, undo), or when the main loop
+        gets idle for edits made outside of one.
+
+        Blocks are up to date once parse() returns. Symbols (labels,
+        packages, ...) of a LaTeX document are extracted on the parser's
+        thread and arrive later, see Content.wait_for_symbols(). '''
+
+    def __init__(self, content):
+        self.content = content
+        self.source_buffer = content.source_buffer
+
+        # dirty range in current offsets, None if there are no edits
+        self.dirty_start = None
+        self.dirty_end = None
+        self.length_delta = 0
+        self.line_delta = 0
+
+        self.user_action_running = False
+        self.edit_being_applied = False
+        self.idle_source_id = None
+
+        self.source_buffer.connect('begin-user-action', self.on_begin_user_action)
+        self.source_buffer.connect('end-user-action', self.on_end_user_action)
+
+    def on_begin_user_action(self, buffer):
+        self.user_action_running = True
+
+    def on_end_user_action(self, buffer):
+        self.user_action_running = False
+        self.parse()
+
+    def on_insert_text(self, buffer, location_iter, text, text_length):
+        self.add_edit(location_iter.get_offset(), 0, 0, len(text), text.count('\n'))
+
+    def on_delete_range(self, buffer, start_iter, end_iter):
+        deleted_line_count = end_iter.get_line() - start_iter.get_line()
+        self.add_edit(start_iter.get_offset(), end_iter.get_offset() - start_iter.get_offset(), deleted_line_count, 0, 0)
+
+    def on_buffer_changed(self, buffer):
+        self.edit_being_applied = False
+        if not self.user_action_running and self.idle_source_id == None:
+            self.idle_source_id = GLib.idle_add(self.on_idle)
+
+    def on_idle(self):
+        self.idle_source_id = None
+        self.parse()
+        return False
+
+    def add_edit(self, offset, removed_length, removed_line_count, inserted_length, inserted_line_count):
+        ''' called before the edit is applied to the buffer. '''
+
+        def map_offset(old_offset):
+            if old_offset < offset: return old_offset
+            elif old_offset < offset + removed_length: return offset
+            else: return old_offset - removed_length + inserted_length
+
+        if self.dirty_start == None:
+            self.dirty_start = offset
+            self.dirty_end = offset + inserted_length
+        else:
+            self.dirty_start = min(map_offset(self.dirty_start), offset)
+            self.dirty_end = max(map_offset(self.dirty_end), offset + inserted_length)
+        self.length_delta += inserted_length - removed_length
+        self.line_delta += inserted_line_count - removed_line_count
+        self.edit_being_applied = True
+
+    def parse(self):
+        ''' hand the lines touched by all edits since the last call to
+            the parser. Does nothing while an edit is half applied. '''
+
+        if self.dirty_start == None or self.edit_being_applied: return
+
+        start_iter = self.source_buffer.get_iter_at_offset(self.dirty_start)
+        start_iter.set_line_offset(0)
+        end_iter = self.source_buffer.get_iter_at_offset(self.dirty_end)
+        if not end_iter.ends_line():
+            end_iter.forward_to_line_end()
+        text = self.source_buffer.get_text(start_iter, end_iter, True)
+
+        line_start = start_iter.get_line()
+        line_end = end_iter.get_line() - self.line_delta
+        offset_line_start = start_iter.get_offset()
+        offset_line_end = end_iter.get_offset() - self.length_delta
+        length_delta = self.length_delta
+        line_delta = self.line_delta
+
+        self.dirty_start = None
+        self.dirty_end = None
+        self.length_delta = 0
+        self.line_delta = 0
+        self.content.parser.on_text_changed(text, line_start, line_end, offset_line_start, offset_line_end, length_delta, line_delta)
+
+
@@ -15,35 +15,83 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
-from setzer.app.service_locator import ServiceLocator
+from setzer.document.content.parser.symbol_index import SymbolIndex
+from setzer.helpers.bibtex_entry_table import parse_entries
+from setzer.helpers.symbol_set import SymbolSet
 from setzer.helpers.timer import timer
 
 
 class ParserBibTeX(object):
+    ''' An entry reaches from its header (@type{key) to the next header.
+        Headers never span lines, so an edit re-parses the lines it
+        touched, widened to the headers around them: the entry the edit
+        starts in up to the first entry behind it.
+
+        Entries are kept by offset in a SymbolIndex as tuples (key,
+        type, author, title, year), no copy of the text or match objects
+        referencing it are kept. '''
 
     def __init__(self, content):
         self.content = content
-        self.text = ''
+        self.entries = SymbolIndex()
+        self.entry_set = SymbolSet()
+        self.bibitems = SymbolSet()
 
     #@timer
-    def on_text_deleted(self, buffer, start_iter, end_iter):
-        start_offset = start_iter.get_offset()
-        end_offset = end_iter.get_offset()
-        self.text = self.text[:start_offset] + self.text[end_offset:]
-        self.parse_symbols(self.text)
+    def on_text_changed(self, text, line_start, line_end, offset_line_start, offset_line_end, length_delta, line_delta):
+        previous_entry, next_entry = self.entries.get_neighbours(offset_line_start, offset_line_end)
 
-    #@timer
-    def on_text_inserted(self, buffer, location_iter, text, text_length):
-        offset = location_iter.get_offset()
-        self.text = self.text[:offset] + text + self.text[offset:]
-        self.parse_symbols(self.text)
+        # the text of the edited lines, widened to the headers around them
+        offset_text_end = offset_line_start + len(text)
+        if previous_entry != None:
+            text = self.content.get_text_in_range(previous_entry[2], offset_line_start) + text
+            line_start, offset_line_start = previous_entry[1], previous_entry[2]
+        if next_entry != None:
+            offset_line_end = next_entry[2] - 1
+            text += self.content.get_text_in_range(offset_text_end, next_entry[2] + length_delta)
+        else:
+            text += self.content.get_text_in_range(offset_text_end, None)
+
+        additional_entries = parse_entries(text, line_start, offset_line_start)
+        removed_entries = self.entries.replace_range(offset_line_start, offset_line_end, length_delta, line_delta, additional_entries)
+        self.parse_symbols(removed_entries, [entry for (entry, line_number, offset) in additional_entries])
 
     #@timer
-    def parse_symbols(self, text):
-        bibitems = set()
-        for match in ServiceLocator.get_regex_object(r'@(\w+)\{(\w+)').finditer(text):
-            bibitems = bibitems | {match.group(2).strip()}
+    def parse_symbols(self, removed_entries, added_entries):
+        symbols_delta = {'bibitems': {'added': set(), 'removed': set()}, 'bibentries': {'added': set(), 'removed': set()}}
+        for entry in removed_entries:
+            if self.entry_set.remove(entry):
+                symbols_delta['bibentries']['removed'].add(entry)
+            if self.bibitems.remove(entry[0]):
+                symbols_delta['bibitems']['removed'].add(entry[0])
+        for entry in added_entries:
+            if self.entry_set.add(entry):
+                if entry in symbols_delta['bibentries']['removed']:
+                    symbols_delta['bibentries']['removed'].discard(entry)
+                else:
+                    symbols_delta['bibentries']['added'].add(entry)
+            if self.bibitems.add(entry[0]):
+                if entry[0] in symbols_delta['bibitems']['removed']:
+                    symbols_delta['bibitems']['removed'].discard(entry[0])
+                else:
+                    symbols_delta['bibitems']['added'].add(entry[0])
+
+        for name in list(symbols_delta):
+            if len(symbols_delta[name]['added']) == 0 and len(symbols_delta[name]['removed']) == 0:
+                del(symbols_delta[name])
+        symbols = dict()
+        if 'bibitems' in symbols_delta:
+            symbols['bibitems'] = frozenset(self.bibitems)
+        if len(symbols_delta) > 0:
+            self.content.set_symbols(symbols, symbols_delta)
+
+    def close(self):
+        pass
+
+    def wait_for_symbols(self):
+        pass
 
-        self.content.symbols['bibitems'] = bibitems
+    def get_entries(self):
+        return frozenset(self.entry_set)
 
 
@@ -21,10 +21,13 @@ class ParserDummy(object):
     def __init__(self, content):
         self.content = content
 
-    def on_text_deleted(self, buffer, start_iter, end_iter):
+    def on_text_changed(self, text, line_start, line_end, offset_line_start, offset_line_end, length_delta, line_delta):
         pass
 
-    def on_text_inserted(self, buffer, location_iter, text, text_length):
+    def close(self):
+        pass
+
+    def wait_for_symbols(self):
         pass
 
 
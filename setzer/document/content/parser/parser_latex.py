@@ -15,7 +15,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
+import gi
+from gi.repository import GObject
+
+import queue
+import threading
+
 from setzer.app.service_locator import ServiceLocator
+from setzer.document.content.parser.symbol_index import SymbolIndex
+from setzer.helpers.symbol_set import SymbolSet
 from setzer.helpers.timer import timer
 
 
@@ -25,120 +33,109 @@ class ParserLaTeX(object):
         self.content = content
         self.text_length = 0
         self.number_of_lines = 0
-        self.block_symbol_matches = {'begin_or_end': list(), 'others': list()}
-        self.other_symbols = list()
+        self.environment_matches = dict()
+        self.section_matches = SymbolIndex()
 
-    #@timer
-    def on_text_deleted(self, buffer, start_iter, end_iter):
-        offset_start = start_iter.get_offset()
-        offset_end = end_iter.get_offset()
-        line_start = start_iter.get_line()
-        line_end = end_iter.get_line()
-        char_count = buffer.get_char_count()
-        before_iter = buffer.get_iter_at_line(line_start)
-        after_iter = buffer.get_iter_at_line(line_end + 1)
-        if not after_iter.get_offset() == char_count:
-            after_iter.backward_char()
-
-        text_length = offset_end - offset_start
-        text = buffer.get_text(start_iter, end_iter, True)
-        deleted_line_count = text.count('\n')
-        text_before = buffer.get_text(before_iter, start_iter, True)
-        text_after = buffer.get_text(end_iter, after_iter, True)
-        offset_line_start = before_iter.get_offset()
-        self.text_length = char_count - offset_end + offset_start
+        # block keys per environment name, see pair_environment()
+        self.environment_block_keys = dict()
+        self.section_block_keys = set()
+        self.blocks = None
 
-        block_symbol_matches = {'begin_or_end': list(), 'others': list()}
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] < line_start:
-                block_symbol_matches['begin_or_end'].append(match)
-        for match in self.block_symbol_matches['others']:
-            if match[1] < line_start:
-                block_symbol_matches['others'].append(match)
-        other_symbols = list()
-        for match in self.other_symbols:
-            if match[1] < offset_line_start:
-                other_symbols.append((match[0], match[1]))
+        # symbols are extracted on a thread of their own,
+        # the following are only touched from there.
+        self.other_symbols = SymbolIndex()
+        self.symbol_sets = {'labels': SymbolSet(), 'included_latex_files': SymbolSet(), 'bibliographies': SymbolSet(), 'bibitems': SymbolSet(), 'packages': SymbolSet()}
+        self.package_matches = dict()
+        self.symbols_delta = dict()
+
+        # symbol sets handed over by the thread, not yet given to content
+        self.pending_symbols = list()
+        self.pending_symbols_lock = threading.Lock()
 
-        offset_line_end = offset_end + len(text_after)
-        text = text_before + text_after
+        # None on the queue stops the thread
+        self.symbols_queue = queue.Queue()
+        self.is_closed = False
+        self.symbols_thread = threading.Thread(target=self.symbols_loop, name='latex symbols parser', daemon=True)
+        self.symbols_thread.start()
+
+    def close(self):
+        ''' stop the symbols thread, the parser isn't used after this. '''
+
+        if self.is_closed: return
+        self.is_closed = True
+        self.symbols_queue.put(None)
+
+    #@timer
+    def on_text_changed(self, text, line_start, line_end, offset_line_start, offset_line_end, length_delta, line_delta):
+        ''' text: the new content of the edited lines, starting at
+            line_start / offset_line_start. line_end and offset_line_end
+            mark the end of the edited lines before the edit. '''
+
+        self.text_length += length_delta
+        self.number_of_lines += line_delta
 
         additional_matches = self.parse_for_blocks(text, line_start, offset_line_start)
-        block_symbol_matches['begin_or_end'] += additional_matches['begin_or_end']
-        block_symbol_matches['others'] += additional_matches['others']
-        for match in ServiceLocator.get_regex_object(r'\\(label|include|input|bibliography|addbibresource)\{((?:\s|\w|\:|\.|,)*)\}|\\(usepackage)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}').finditer(text):
-            other_symbols.append((match, match.start() + offset_line_start))
+        additional_environment_matches = dict()
+        for entry in additional_matches['begin_or_end']:
+            try: additional_environment_matches[entry[0].group(2)].append(entry)
+            except KeyError: additional_environment_matches[entry[0].group(2)] = [entry]
 
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] > line_end:
-                block_symbol_matches['begin_or_end'].append((match[0], match[1] - deleted_line_count, match[2] - text_length))
-        for match in self.block_symbol_matches['others']:
-            if match[1] > line_end:
-                block_symbol_matches['others'].append((match[0], match[1] - deleted_line_count, match[2] - text_length))
-        for match in self.other_symbols:
-            if match[1] > offset_line_end:
-                other_symbols.append((match[0], match[1] - text_length))
+        removed_block_matches = list()
+        for name, index in list(self.environment_matches.items()):
+            removed_block_matches += index.replace_range(offset_line_start, offset_line_end, length_delta, line_delta, additional_environment_matches.pop(name, list()))
+            if len(index) == 0:
+                del(self.environment_matches[name])
+        for name, entries in additional_environment_matches.items():
+            self.environment_matches[name] = SymbolIndex(self.text_length, self.number_of_lines)
+            self.environment_matches[name].head = entries
+        removed_block_matches += self.section_matches.replace_range(offset_line_start, offset_line_end, length_delta, line_delta, additional_matches['others'])
 
-        self.block_symbol_matches = block_symbol_matches
-        self.number_of_lines = self.number_of_lines - deleted_line_count
-        self.parse_blocks()
+        added_block_matches = [entry[0] for entry in additional_matches['begin_or_end'] + additional_matches['others']]
+        self.parse_blocks(removed_block_matches, added_block_matches, line_end, offset_line_end, length_delta, line_delta)
 
-        self.other_symbols = other_symbols
-        self.parse_symbols()
+        self.symbols_queue.put((text, line_start, offset_line_start, offset_line_end, length_delta, line_delta))
 
-    #@timer
-    def on_text_inserted(self, buffer, location_iter, text, text_length):
-        text_length = len(text)
-        offset = location_iter.get_offset()
-        new_line_count = text.count('\n')
-        line_start = location_iter.get_line()
-        char_count = buffer.get_char_count()
-        before_iter = buffer.get_iter_at_line(line_start)
-        after_iter = buffer.get_iter_at_line(line_start + 1)
-        if not after_iter.get_offset() == char_count:
-            after_iter.backward_char()
-
-        text_before = buffer.get_text(before_iter, location_iter, True)
-        offset_line_start = before_iter.get_offset()
-        text_after = buffer.get_text(location_iter, after_iter, True)
-        offset_line_end = offset + len(text_after)
-        self.text_length = char_count + text_length
-        text_parse = text_before + text + text_after
+    def symbols_loop(self):
+        ''' works through the text snapshots of edited lines, and hands
+            the symbol sets to the main thread whenever it caught up. '''
 
-        block_symbol_matches = {'begin_or_end': list(), 'others': list()}
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] < line_start:
-                block_symbol_matches['begin_or_end'].append(match)
-        for match in self.block_symbol_matches['others']:
-            if match[1] < line_start:
-                block_symbol_matches['others'].append(match)
-        other_symbols = list()
-        for match in self.other_symbols:
-            if match[1] < offset_line_start:
-                other_symbols.append((match[0], match[1]))
-
-        additional_matches = self.parse_for_blocks(text_parse, line_start, offset_line_start)
-        block_symbol_matches['begin_or_end'] += additional_matches['begin_or_end']
-        block_symbol_matches['others'] += additional_matches['others']
-        for match in ServiceLocator.get_regex_object(r'\\(label|include|input|bibliography|addbibresource)\{((?:\s|\w|\:|\.|,)*)\}|\\(usepackage)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}').finditer(text_parse):
-            other_symbols.append((match, match.start() + offset_line_start))
-
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] > line_start:
-                block_symbol_matches['begin_or_end'].append((match[0], match[1] + new_line_count, match[2] + text_length))
-        for match in self.block_symbol_matches['others']:
-            if match[1] > line_start:
-                block_symbol_matches['others'].append((match[0], match[1] + new_line_count, match[2] + text_length))
-        for match in self.other_symbols:
-            if match[1] > offset_line_end:
-                other_symbols.append((match[0], match[1] - text_length))
-
-        self.block_symbol_matches = block_symbol_matches
-        self.number_of_lines = self.number_of_lines + new_line_count
-        self.parse_blocks()
-
-        self.other_symbols = other_symbols
-        self.parse_symbols()
+        while True:
+            task = self.symbols_queue.get()
+            if task == None:
+                self.symbols_queue.task_done()
+                return
+
+            text, line_start, offset_line_start, offset_line_end, length_delta, line_delta = task
+            additional_symbols = self.parse_for_symbols(text, line_start, offset_line_start)
+            removed_symbols = self.other_symbols.replace_range(offset_line_start, offset_line_end, length_delta, line_delta, additional_symbols)
+            self.parse_symbols(removed_symbols, [match for (match, line_number, offset) in additional_symbols])
+
+            if self.symbols_queue.empty() and len(self.symbols_delta) > 0:
+                with self.pending_symbols_lock:
+                    self.pending_symbols.append((self.get_changed_symbols(), self.symbols_delta))
+                GObject.idle_add(self.publish_symbols)
+                self.symbols_delta = dict()
+            self.symbols_queue.task_done()
+
+    def publish_symbols(self):
+        ''' hand the symbol sets the thread came up with to content,
+            in the order they were made. '''
+
+        with self.pending_symbols_lock:
+            pending_symbols = self.pending_symbols
+            self.pending_symbols = list()
+        for symbols, symbols_delta in pending_symbols:
+            self.content.set_symbols(symbols, symbols_delta)
+        return False
+
+    def wait_for_symbols(self):
+        ''' block until the thread has gone through all text handed to
+            it so far and publish its results right away, instead of
+            when the main loop gets to it. '''
+
+        if self.is_closed: return
+        self.symbols_queue.join()
+        self.publish_symbols()
 
     #@timer
     def parse_for_blocks(self, text, line_start, offset_line_start):
@@ -154,91 +151,184 @@ class ParserLaTeX(object):
         return block_symbol_matches
 
     #@timer
-    def parse_blocks(self):
-        blocks = dict()
+    def parse_for_symbols(self, text, line_start, offset_line_start):
+        other_symbols = list()
+        counter = line_start
+        last_offset = 0
+        for match in ServiceLocator.get_regex_object(r'\\(label|include|input|bibliography|addbibresource)\{((?:\s|\w|\:|\.|,)*)\}|\\(usepackage)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}').finditer(text):
+            counter += text.count('\n', last_offset, match.start())
+            last_offset = match.start()
+            other_symbols.append((match, counter, match.start() + offset_line_start))
+        return other_symbols
+
+    #@timer
+    def parse_blocks(self, removed_matches, added_matches, line_end, offset_line_end, length_delta, line_delta):
+        ''' re-pair only the environments whose begin or end matches
+            changed, and the sections if their boundaries did. Observers
+            get the blocks that were added or went away, all other blocks
+            keep their keys and are moved by the deltas. Positions at or
+            after line_end / offset_line_end (before the edit) move. '''
+
+        self.blocks = None
+
+        dirty_names = set()
+        sections_dirty = False
+        for match in removed_matches + added_matches:
+            if match.group(1) != None:
+                dirty_names.add(match.group(2))
+            else:
+                sections_dirty = True
+        if 'document' in dirty_names:
+            sections_dirty = True
+
+        added_blocks = list()
+        removed_keys = list()
+        for name in dirty_names:
+            blocks = self.pair_environment(name)
+            old_keys = self.environment_block_keys.pop(name, set())
+            removed_keys += [key for key in old_keys if key not in blocks]
+            added_blocks += [block for key, block in blocks.items() if key not in old_keys]
+            if len(blocks) > 0:
+                self.environment_block_keys[name] = set(blocks)
+        if sections_dirty:
+            blocks = self.pair_sections()
+            removed_keys += [key for key in self.section_block_keys if key not in blocks]
+            added_blocks += [block for key, block in blocks.items() if key not in self.section_block_keys]
+            self.section_block_keys = set(blocks)
+
+        self.content.update_blocks({'added': added_blocks, 'removed': removed_keys, 'line_end': line_end, 'offset_end': offset_line_end, 'line_delta': line_delta, 'length_delta': length_delta})
 
-        end_document_offset = None
-        end_document_line = None
-        blocks_list = list()
-        for (match, line_number, offset) in self.block_symbol_matches['begin_or_end']:
+    def pair_environment(self, name):
+        ''' returns the blocks of one environment by key, where the key
+            is the pair of begin and end matches. '''
+
+        blocks = dict()
+        begins = list()
+        for (match, line_number, offset) in self.environment_matches.get(name, list()):
             if match.group(1) == 'begin':
-                try: blocks[match.group(2)].append([offset, None, line_number, None])
-                except KeyError: blocks[match.group(2)] = [[offset, None, line_number, None]]
+                begins.append((match, line_number, offset))
             else:
-                if match.group(2).strip() == 'document':
-                    end_document_offset = offset
-                    end_document_line = line_number
-                try: blocks_begin = blocks[match.group(2)]
-                except KeyError: pass
+                try: begin_match, begin_line_number, begin_offset = begins.pop()
+                except IndexError: pass
                 else:
-                    try: block_begin = blocks_begin.pop()
-                    except IndexError: pass
-                    else:
-                        block_begin[1] = offset
-                        block_begin[3] = line_number
-                        blocks_list.append(block_begin)
+                    key = (begin_match, match)
+                    blocks[key] = [begin_offset, offset, begin_line_number, line_number, key]
+        return blocks
 
+    def pair_sections(self):
+        ''' returns the sectioning blocks by key, where the key is the
+            pair of the heading match and the match ending its block. '''
+
+        end_document = None
+        for (match, line_number, offset) in reversed(self.environment_matches.get('document', list())):
+            if match.group(1) == 'end':
+                end_document = (match, line_number, offset)
+                break
+
+        blocks = dict()
         relevant_following_blocks = [list(), list(), list(), list(), list()]
         levels = {'part': 0, 'chapter': 1, 'section': 2, 'subsection': 3, 'subsubsection': 4}
-        for (match, line_number, offset) in reversed(self.block_symbol_matches['others']):
+        for (match, line_number, offset) in reversed(self.section_matches):
             level = levels[match.group(3)]
-            block = [offset, None, line_number, None]
 
             if len(relevant_following_blocks[level]) >= 1:
+                following_match, following_line_number, following_offset = relevant_following_blocks[level][-1]
+                key = (match, following_match)
                 # - 1 to go one line up
-                block[1] = relevant_following_blocks[level][-1][0] - 1
-                block[3] = relevant_following_blocks[level][-1][2] - 1
+                block = [offset, following_offset - 1, line_number, following_line_number - 1, key]
             else:
-                if end_document_offset != None and block[0] < end_document_offset:
+                if end_document != None and offset < end_document[2]:
+                    key = (match, end_document[0])
                     # - 1 to go one line up
-                    block[1] = end_document_offset - 1
-                    block[3] = end_document_line - 1
+                    block = [offset, end_document[2] - 1, line_number, end_document[1] - 1, key]
                 else:
-                    block[1] = self.text_length
-                    block[3] = self.number_of_lines
+                    key = (match, None)
+                    block = [offset, self.text_length, line_number, self.number_of_lines, key]
 
-            blocks_list.append(block)
+            blocks[key] = block
             for i in range(level, 5):
-                relevant_following_blocks[i].append(block)
+                relevant_following_blocks[i].append((match, line_number, offset))
+        return blocks
 
-        self.content.set_blocks(sorted(blocks_list, key=lambda block: block[0]))
+    def get_blocks(self):
+        if self.blocks == None:
+            blocks = self.pair_sections()
+            for name in self.environment_matches:
+                blocks.update(self.pair_environment(name))
+            self.blocks = sorted(blocks.values(), key=lambda block: block[0])
+        return self.blocks
 
     #@timer
-    def parse_symbols(self):
-        labels = set()
-        included_latex_files = set()
-        bibliographies = set()
-        bibitems = set()
-        packages = set()
-        packages_detailed = dict()
-        for match in self.other_symbols:
-            match = match[0]
-            if match.group(1) == 'label':
-                labels = labels | {match.group(2).strip()}
-            elif match.group(1) == 'include' or match.group(1) == 'input':
-                filename = match.group(2).strip()
-                if not filename.endswith('.tex'):
-                    filename += '.tex'
-                included_latex_files = included_latex_files | {filename}
-            elif match.group(1) == 'bibliography':
-                bibfiles = match.group(2).strip().split(',')
-                for entry in bibfiles:
-                    bibliographies = bibliographies | {entry.strip() + '.bib'}
-            elif match.group(1) == 'addbibresource':
-                bibfiles = match.group(2).strip().split(',')
-                for entry in bibfiles:
-                    bibliographies = bibliographies | {entry.strip()}
-            elif match.group(3) == 'usepackage':
-                packages = packages | {match.group(4).strip()}
-                packages_detailed[match.group(4).strip()] = match
-            elif match.group(5) == 'bibitem':
-                bibitems = bibitems | {match.group(6).strip()}
-
-        self.content.symbols['labels'] = labels
-        self.content.symbols['included_latex_files'] = included_latex_files
-        self.content.symbols['bibliographies'] = bibliographies
-        self.content.symbols['bibitems'] = bibitems
-        self.content.symbols['packages'] = packages
-        self.content.symbols['packages_detailed'] = packages_detailed
+    def parse_symbols(self, removed_matches, added_matches):
+        ''' update the symbol sets with the matches that went away and
+            the ones that came in, leaving everything else untouched. '''
+
+        for match in removed_matches:
+            for (symbol_type, name) in self.get_symbols_from_match(match):
+                if self.symbol_sets[symbol_type].remove(name):
+                    symbols_delta = self.get_symbols_delta(symbol_type)
+                    if name in symbols_delta['added']:
+                        symbols_delta['added'].discard(name)
+                    else:
+                        symbols_delta['removed'].add(name)
+                if symbol_type == 'packages':
+                    self.package_matches[name].remove(match)
+                    if len(self.package_matches[name]) == 0:
+                        del(self.package_matches[name])
+                    self.get_symbols_delta(symbol_type)
+
+        for match in added_matches:
+            for (symbol_type, name) in self.get_symbols_from_match(match):
+                if self.symbol_sets[symbol_type].add(name):
+                    symbols_delta = self.get_symbols_delta(symbol_type)
+                    if name in symbols_delta['removed']:
+                        symbols_delta['removed'].discard(name)
+                    else:
+                        symbols_delta['added'].add(name)
+                if symbol_type == 'packages':
+                    try: self.package_matches[name].append(match)
+                    except KeyError: self.package_matches[name] = [match]
+                    self.get_symbols_delta(symbol_type)
+
+    def get_symbols_delta(self, symbol_type):
+        ''' names that came in and went away since symbols were last published. '''
+
+        try: return self.symbols_delta[symbol_type]
+        except KeyError:
+            self.symbols_delta[symbol_type] = {'added': set(), 'removed': set()}
+            return self.symbols_delta[symbol_type]
+
+    def get_changed_symbols(self):
+        ''' immutable copies of the symbol types that changed since symbols were last published. '''
+
+        symbols = dict()
+        for symbol_type in self.symbols_delta:
+            symbols[symbol_type] = frozenset(self.symbol_sets[symbol_type])
+            if symbol_type == 'packages':
+                symbols['packages_detailed'] = dict([(name, matches[-1]) for name, matches in self.package_matches.items()])
+        return symbols
+
+    def get_symbols_from_match(self, match):
+        symbols = list()
+        if match.group(1) == 'label':
+            symbols.append(('labels', match.group(2).strip()))
+        elif match.group(1) == 'include' or match.group(1) == 'input':
+            filename = match.group(2).strip()
+            if not filename.endswith('.tex'):
+                filename += '.tex'
+            symbols.append(('included_latex_files', filename))
+        elif match.group(1) == 'bibliography':
+            bibfiles = match.group(2).strip().split(',')
+            for entry in bibfiles:
+                symbols.append(('bibliographies', entry.strip() + '.bib'))
+        elif match.group(1) == 'addbibresource':
+            bibfiles = match.group(2).strip().split(',')
+            for entry in bibfiles:
+                symbols.append(('bibliographies', entry.strip()))
+        elif match.group(3) == 'usepackage':
+            symbols.append(('packages', match.group(4).strip()))
+        elif match.group(5) == 'bibitem':
+            symbols.append(('bibitems', match.group(6).strip()))
+        return symbols
 
 
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+
+class SymbolIndex(object):
+    ''' Gap buffer of parser matches, ordered by offset.
+
+        Matches in front of the gap are stored with their absolute
+        line number and offset. Matches behind the gap are stored
+        with their distance to the end of the text, so they move
+        along with insertions and deletions without being touched.
+        An edit only has to move the gap to its position and replace
+        the matches of the lines it affected. '''
+
+    def __init__(self, text_length=0, number_of_lines=0):
+        self.text_length = text_length
+        self.number_of_lines = number_of_lines
+
+        # (match, line, offset), ascending
+        self.head = list()
+
+        # (match, lines_to_end, chars_to_end), nearest entry last
+        self.tail = list()
+
+    def __iter__(self):
+        yield from self.head
+        for (match, lines_to_end, chars_to_end) in reversed(self.tail):
+            yield (match, self.number_of_lines - lines_to_end, self.text_length - chars_to_end)
+
+    def __reversed__(self):
+        for (match, lines_to_end, chars_to_end) in self.tail:
+            yield (match, self.number_of_lines - lines_to_end, self.text_length - chars_to_end)
+        yield from reversed(self.head)
+
+    def __len__(self):
+        return len(self.head) + len(self.tail)
+
+    def move_gap(self, offset):
+        ''' afterwards all matches in front of the gap start before offset. '''
+
+        head = self.head
+        tail = self.tail
+        while len(head) > 0 and head[-1][2] >= offset:
+            match, line, match_offset = head.pop()
+            tail.append((match, self.number_of_lines - line, self.text_length - match_offset))
+        while len(tail) > 0 and self.text_length - tail[-1][2] < offset:
+            match, lines_to_end, chars_to_end = tail.pop()
+            head.append((match, self.number_of_lines - lines_to_end, self.text_length - chars_to_end))
+
+    def get_neighbours(self, offset_start, offset_end):
+        ''' returns the last match starting before offset_start and the
+            first one starting behind offset_end (coordinates before the
+            edit), as (match, line, offset) or None. '''
+
+        self.move_gap(offset_start)
+
+        previous_match = self.head[-1] if len(self.head) > 0 else None
+        next_match = None
+        for (match, lines_to_end, chars_to_end) in reversed(self.tail):
+            if self.text_length - chars_to_end > offset_end:
+                next_match = (match, self.number_of_lines - lines_to_end, self.text_length - chars_to_end)
+                break
+        return (previous_match, next_match)
+
+    def replace_range(self, offset_start, offset_end, length_delta, line_delta, new_matches):
+        ''' replace all matches starting in [offset_start, offset_end]
+            (coordinates before the edit) with new_matches (coordinates
+            after the edit) and shift everything behind the range.
+            Returns the list of removed matches. '''
+
+        self.move_gap(offset_start)
+
+        removed_matches = list()
+        tail = self.tail
+        while len(tail) > 0 and self.text_length - tail[-1][2] <= offset_end:
+            removed_matches.append(tail.pop()[0])
+
+        self.text_length += length_delta
+        self.number_of_lines += line_delta
+        self.head += new_matches
+        return removed_matches
+
+
@@ -61,6 +61,11 @@ class Document(Observable):
 
         self.line_numbers = line_numbers.LineNumbers(self, self.view)
 
+    def close(self):
+        ''' called when the document is removed from the workspace. '''
+
+        self.content.close()
+
     def update_syntax_scheme(self):
         self.content.update_syntax_scheme()
 
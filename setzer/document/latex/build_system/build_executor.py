@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gi
+from gi.repository import GObject
+
+import _thread as thread
+import os
+import threading
+
+from setzer.helpers.observable import Observable
+
+
+class BuildExecutor(Observable):
+    ''' Workspace wide scheduler for the queries of all build systems.
+
+        Queries run on worker threads, which are started on demand and
+        kept for the lifetime of the application. Queries of different
+        root files run in parallel, up to the 'max_parallel_builds'
+        preference (0: one per CPU). Queries of the same build system
+        or root file never run at the same time, they wait in order of
+        submission. '''
+
+    def __init__(self, settings):
+        Observable.__init__(self)
+        self.settings = settings
+        self.max_running = self.get_max_running()
+        self.number_of_workers = 0
+        self.idle_workers = 0
+
+        # (build_system, query) in order of submission
+        self.pending = list()
+        self.running = list()
+        self.condition = threading.Condition()
+
+        self.settings.connect('settings_changed', self.on_settings_changed)
+
+    def on_settings_changed(self, settings, parameter):
+        section, item, value = parameter
+        if (section, item) == ('preferences', 'max_parallel_builds'):
+            with self.condition:
+                self.max_running = self.get_max_running()
+                self.start_worker_if_needed()
+                self.condition.notify_all()
+
+    def get_max_running(self):
+        max_running = self.settings.get_value('preferences', 'max_parallel_builds')
+        if not isinstance(max_running, int) or max_running <= 0:
+            max_running = os.cpu_count() or 1
+        return max_running
+
+    def submit(self, build_system, query):
+        ''' build_system.on_query_started(query) and on_query_done(query)
+            are called on the main loop, execute_query(query) on a worker. '''
+
+        with self.condition:
+            self.pending.append((build_system, query))
+            self.start_worker_if_needed()
+            self.condition.notify_all()
+        self.queue_state_changed()
+
+    def remove(self, query):
+        ''' returns True if the query was still waiting and won't run. '''
+
+        with self.condition:
+            for item in self.pending:
+                if item[1] == query:
+                    self.pending.remove(item)
+                    break
+            else:
+                return False
+        self.queue_state_changed()
+        return True
+
+    def is_waiting(self, query):
+        with self.condition:
+            return any(item[1] == query for item in self.pending)
+
+    def get_queue_state(self):
+        ''' filenames of running and waiting queries, in order. '''
+
+        with self.condition:
+            return {'running': [item[1].tex_filename for item in self.running],
+                    'waiting': [item[1].tex_filename for item in self.pending]}
+
+    def queue_state_changed(self):
+        GObject.idle_add(self.notify_queue_state)
+
+    def notify_queue_state(self):
+        self.add_change_code('queue_state_changed', self.get_queue_state())
+        return False
+
+    def start_worker_if_needed(self):
+        if self.idle_workers < len(self.pending) and self.number_of_workers < self.max_running:
+            self.number_of_workers += 1
+            thread.start_new_thread(self.worker_loop, ())
+
+    def worker_loop(self):
+        while True:
+            item = self.get_next_job()
+            build_system, query = item
+            GObject.idle_add(build_system.on_query_started, query)
+            self.queue_state_changed()
+            try:
+                build_system.execute_query(query)
+            finally:
+                # scheduled before the build system is released, so its
+                # next query can't be reported as started before this one is done.
+                GObject.idle_add(build_system.on_query_done, query)
+                with self.condition:
+                    self.running.remove(item)
+                    self.condition.notify_all()
+                self.queue_state_changed()
+
+    def get_next_job(self):
+        with self.condition:
+            while True:
+                if len(self.running) < self.max_running:
+                    item = self.get_runnable_item()
+                    if item != None:
+                        self.pending.remove(item)
+                        self.running.append(item)
+                        return item
+                self.idle_workers += 1
+                self.condition.wait()
+                self.idle_workers -= 1
+
+    def get_runnable_item(self):
+        busy_build_systems = {item[0] for item in self.running}
+        busy_filenames = {item[1].tex_filename for item in self.running}
+        for item in self.pending:
+            if item[0] not in busy_build_systems and item[1].tex_filename not in busy_filenames:
+                return item
+        return None
+
+
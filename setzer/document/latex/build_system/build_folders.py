@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import base64
+import os
+import os.path
+import shutil
+
+from setzer.app.service_locator import ServiceLocator
+
+
+# private build folders: one per document, in the cache folder or in
+# /dev/shm. Helper files stay there between builds, so reruns start from
+# the last .aux, .toc, ... state.
+def get_build_folder(tex_filename, private, on_tmpfs):
+    if not private:
+        return os.path.dirname(tex_filename)
+    return os.path.join(get_base_folder(on_tmpfs), base64.urlsafe_b64encode(str.encode(tex_filename)).decode())
+
+
+def get_base_folder(on_tmpfs):
+    if on_tmpfs and os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return os.path.join('/dev/shm', 'setzer-' + str(os.getuid()))
+    return os.path.join(ServiceLocator.get_cache_folder(), 'build')
+
+
+# TeX writes the .aux of \include{folder/name} to folder/name.aux in
+# the output directory, but doesn't create folder. Targets outside the
+# build folder (../name) are left alone.
+def create_include_folders(build_folder, text):
+    for match in ServiceLocator.get_regex_object(r'\\include\{([^\{\}]*)\}').finditer(text):
+        folder = os.path.dirname(match.group(1).strip())
+        if folder == '': continue
+
+        path = os.path.normpath(os.path.join(build_folder, folder))
+        if path.startswith(os.path.join(build_folder, '')) and not os.path.isdir(path):
+            os.makedirs(path)
+
+
+def has_private_build_folder(tex_filename):
+    for on_tmpfs in [False, True]:
+        if os.path.isdir(get_build_folder(tex_filename, True, on_tmpfs)): return True
+    return False
+
+
+def remove_private_build_folders(tex_filename):
+    for on_tmpfs in [False, True]:
+        shutil.rmtree(get_build_folder(tex_filename, True, on_tmpfs), ignore_errors=True)
+
+
+# the .synctex.gz of the last successful build, kept in the cache folder.
+def get_synctex_filename(tex_filename):
+    folder = os.path.join(ServiceLocator.get_cache_folder(), 'synctex', base64.urlsafe_b64encode(str.encode(tex_filename)).decode())
+    return os.path.join(folder, os.path.splitext(os.path.basename(tex_filename))[0] + '.synctex.gz')
+
+
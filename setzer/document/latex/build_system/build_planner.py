@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import hashlib
+import os.path
+
+
+class BuildPlanner(object):
+    ''' Decides which jobs follow a LaTeX pass, from hashes of the files
+        the tools exchange. BibTeX, Biber, makeindex and makeglossaries
+        run when their input changed since they last ran on it, LaTeX
+        reruns when a pass changed what it reads itself, or when a
+        tool changed its output.
+
+        Hashes of tool inputs are kept between builds, so a build of an
+        unchanged document with its helper files still in place takes
+        a single pass. '''
+
+    # files written by LaTeX and read back by the next pass
+    latex_endings = ['.aux', '.toc', '.lof', '.lot', '.out', '.nav', '.snm']
+    # files written by the tools and read by LaTeX
+    tool_output_endings = ['.bbl', '.ind', '.gls', '.acr']
+    max_latex_passes = 5
+
+    def __init__(self):
+        # (job, input filename): hash of the input when the job was scheduled
+        self.tool_input_hashes = dict()
+
+    def start_pass(self, query, build_folder):
+        query.build_data['latex_passes'] = query.build_data.get('latex_passes', 0) + 1
+        query.build_data['pass_input_hashes'] = self.get_latex_input_hashes(query, build_folder)
+
+    def needs_pass(self, query, build_folder):
+        ''' a pass after the tools is only needed if they changed what LaTeX reads. '''
+
+        hashes = query.build_data.get('pass_output_hashes')
+        if hashes == None: return True
+        return self.get_latex_input_hashes(query, build_folder) != hashes
+
+    def get_additional_jobs(self, query, build_folder):
+        ''' call after a pass, returns the jobs to run next. '''
+
+        if query.build_data['use_latexmk']: return []
+
+        basename = os.path.join(build_folder, os.path.splitext(os.path.basename(query.tex_filename))[0])
+        jobs = list()
+
+        if os.path.isfile(basename + '.bcf'):
+            if self.has_changed_since_last_run('build_biber', basename + '.bcf', self.get_file_hash(basename + '.bcf'), basename + '.bbl'):
+                jobs.append('build_biber')
+        else:
+            bibtex_hash = self.get_bibtex_input_hash(query, build_folder)
+            if bibtex_hash != None and self.has_changed_since_last_run('build_bibtex', basename + '.aux', bibtex_hash, basename + '.bbl'):
+                jobs.append('build_bibtex')
+
+        index_hash = self.get_file_hash(basename + '.idx')
+        if index_hash != None and self.has_changed_since_last_run('build_makeindex', basename + '.idx', index_hash, basename + '.ind'):
+            jobs.append('build_makeindex')
+
+        glossaries_hash = self.get_files_hash([basename + '.glo', basename + '.acn'])
+        if glossaries_hash != None and self.has_changed_since_last_run('build_glossaries', basename + '.glo', glossaries_hash, basename + '.gls'):
+            jobs.append('build_glossaries')
+
+        hashes = self.get_latex_input_hashes(query, build_folder)
+        rerun_latex = hashes != query.build_data['pass_input_hashes'] and query.build_data['latex_passes'] < self.max_latex_passes
+        query.build_data['pass_output_hashes'] = None if rerun_latex else hashes
+
+        if len(jobs) > 0 or rerun_latex:
+            jobs.append('build_latex')
+        return jobs
+
+    def has_changed_since_last_run(self, job, input_filename, input_hash, output_filename):
+        ''' remembers input_hash as the one job runs on next. '''
+
+        if self.tool_input_hashes.get((job, input_filename)) == input_hash and os.path.isfile(output_filename): return False
+        self.tool_input_hashes[(job, input_filename)] = input_hash
+        return True
+
+    def get_latex_input_hashes(self, query, build_folder):
+        basename = os.path.join(build_folder, os.path.splitext(os.path.basename(query.tex_filename))[0])
+        filenames = [basename + ending for ending in self.latex_endings + self.tool_output_endings]
+        filenames += self.get_included_aux_files(basename + '.aux', build_folder)
+        return [self.get_file_hash(filename) for filename in filenames]
+
+    def get_bibtex_input_hash(self, query, build_folder):
+        ''' hash of the lines bibtex reads from the .aux files, None without \\bibdata. '''
+
+        aux_filename = os.path.join(build_folder, os.path.splitext(os.path.basename(query.tex_filename))[0] + '.aux')
+        lines = list()
+        for filename in [aux_filename] + self.get_included_aux_files(aux_filename, build_folder):
+            for line in self.get_lines(filename):
+                if line.startswith(('\\citation', '\\bibdata', '\\bibstyle')):
+                    lines.append(line)
+        if not any(line.startswith('\\bibdata') for line in lines): return None
+        return hashlib.sha1('\n'.join(lines).encode('utf-8')).hexdigest()
+
+    def get_included_aux_files(self, aux_filename, build_folder):
+        ''' .aux files of \\include'd files, which the main .aux loads with \\@input. '''
+
+        filenames = list()
+        for line in self.get_lines(aux_filename):
+            if line.startswith('\\@input{') and line.endswith('}'):
+                filenames.append(os.path.join(build_folder, line[8:-1]))
+        return filenames
+
+    def get_lines(self, filename):
+        try:
+            with open(filename, 'rb') as f:
+                return f.read().decode('utf-8', errors='ignore').splitlines()
+        except FileNotFoundError:
+            return []
+
+    def get_file_hash(self, filename):
+        try:
+            with open(filename, 'rb') as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def get_files_hash(self, filenames):
+        hashes = [self.get_file_hash(filename) for filename in filenames]
+        if hashes.count(None) == len(hashes): return None
+        return hashlib.sha1(str(hashes).encode('utf-8')).hexdigest()
+
+
@@ -18,7 +18,7 @@
 import gi
 from gi.repository import GObject
 
-import _thread as thread, queue
+import time
 
 import setzer.document.latex.build_system.build_system_controller as build_system_controller
 import setzer.document.latex.build_system.build_system_presenter as build_system_presenter
@@ -30,13 +30,20 @@ import setzer.document.latex.build_system.builder.builder_build_makeindex as bui
 import setzer.document.latex.build_system.builder.builder_build_glossaries as builder_build_glossaries
 import setzer.document.latex.build_system.builder.builder_forward_sync as builder_forward_sync
 import setzer.document.latex.build_system.builder.builder_backward_sync as builder_backward_sync
+import setzer.document.latex.build_system.synctex_reader as synctex_reader
+from setzer.app.service_locator import ServiceLocator
 
 
 class BuildSystem(object):
+    ''' Runs build and sync queries of one document on the shared
+        build executor. Queries run one after another. A new query
+        replaces a waiting query of the same kind, so repeated build
+        requests during a build end up as a single follow-up build. '''
 
     def __init__(self, document):
         self.observers = set()
-        self.active_query = None
+        # submitted, not yet done, in order of submission
+        self.queries = list()
 
         self.builders = dict()
         self.builders['build_latex'] = builder_build_latex.BuilderBuildLaTeX()
@@ -44,25 +51,14 @@ class BuildSystem(object):
         self.builders['build_biber'] = builder_build_biber.BuilderBuildBiber()
         self.builders['build_makeindex'] = builder_build_makeindex.BuilderBuildMakeindex()
         self.builders['build_glossaries'] = builder_build_glossaries.BuilderBuildGlossaries()
-        self.builders['forward_sync'] = builder_forward_sync.BuilderForwardSync()
-        self.builders['backward_sync'] = builder_backward_sync.BuilderBackwardSync()
+        # shared by both sync builders, sync queries run one at a time
+        self.synctex_reader = synctex_reader.SyncTeXReader()
+        self.builders['forward_sync'] = builder_forward_sync.BuilderForwardSync(self.synctex_reader)
+        self.builders['backward_sync'] = builder_backward_sync.BuilderBackwardSync(self.synctex_reader)
 
         self.controller = build_system_controller.BuildSystemController(document, self)
         self.presenter = build_system_presenter.BuildSystemPresenter(document, self)
 
-        self.change_code_queue = queue.Queue() # change code for observers are put on here
-        GObject.timeout_add(50, self.results_loop)
-        GObject.timeout_add(50, self.change_code_loop)
-
-    def change_code_loop(self):
-        ''' notify observers '''
-
-        if not self.change_code_queue.empty():
-            change_code = self.change_code_queue.get(block=False)
-            for observer in self.observers:
-                observer.change_notification(change_code['change_code'], self, change_code['parameter'])
-        return True
-    
     def register_observer(self, observer):
         ''' Observer call this method to register themselves with observable
             objects. They have themselves to implement a method
@@ -72,38 +68,72 @@ class BuildSystem(object):
         self.observers.add(observer)
 
     def add_change_code(self, change_code, parameter=None):
-        self.change_code_queue.put({'change_code': change_code, 'parameter': parameter})
-
-    def results_loop(self):
-        if self.active_query != None:
-            if self.active_query.is_done():
-                build_result = self.active_query.get_build_result()
-                forward_sync_result = self.active_query.get_forward_sync_result()
-                backward_sync_result = self.active_query.get_backward_sync_result()
-                if forward_sync_result != None or backward_sync_result != None or build_result != None:
-                    self.add_change_code('building_finished', {'build': build_result, 'forward_sync': forward_sync_result, 'backward_sync': backward_sync_result})
-                self.active_query = None
-        return True
-    
+        ''' observers are notified from the main loop. '''
+
+        GObject.idle_add(self.notify_observers, change_code, parameter)
+
+    def notify_observers(self, change_code, parameter):
+        for observer in self.observers:
+            observer.change_notification(change_code, self, parameter)
+        return False
+
     def add_query(self, query):
-        self.stop_building(notify=False)
-        self.active_query = query
-        thread.start_new_thread(self.execute_query, (query,))
-        self.add_change_code('reset_timer')
-        self.add_change_code('building_started')
+        executor = ServiceLocator.get_build_executor()
+        for waiting_query in list(self.queries):
+            if waiting_query.jobs == query.jobs and executor.remove(waiting_query):
+                self.queries.remove(waiting_query)
+        query.live_log_callback = self.on_live_log_items
+        self.queries.append(query)
+        executor.submit(self, query)
+
+    def on_query_started(self, query):
+        if query in self.queries:
+            self.add_change_code('reset_timer')
+            self.add_change_code('building_started')
+        return False
 
     def execute_query(self, query):
-        while len(query.jobs) > 0:
-            if not query.force_building_to_stop:
-                self.builders[query.jobs.pop(0)].run(query)
+        ''' runs on a worker thread of the build executor. '''
+
+        while len(query.jobs) > 0 and not query.force_building_to_stop:
+            job = query.jobs.pop(0)
+            number_of_times = len(query.job_times)
+            start_time = time.time()
+            self.builders[job].run(query)
+            # steps timed by the builder itself are not counted twice
+            seconds = time.time() - start_time - sum(item[1] for item in query.job_times[number_of_times:])
+            query.job_times.append((job, seconds))
         query.mark_done()
 
+    def on_live_log_items(self, query, log_items):
+        if query in self.queries:
+            self.add_change_code('build_log_items', log_items)
+        return False
+
+    def on_query_done(self, query):
+        if query in self.queries:
+            self.queries.remove(query)
+            build_result = query.get_build_result()
+            forward_sync_result = query.get_forward_sync_result()
+            backward_sync_result = query.get_backward_sync_result()
+            if build_result != None:
+                build_result['job_times'] = query.job_times
+            if forward_sync_result != None or backward_sync_result != None or build_result != None:
+                self.add_change_code('building_finished', {'build': build_result, 'forward_sync': forward_sync_result, 'backward_sync': backward_sync_result})
+        return False
+
     def stop_building(self, notify=True):
-        if self.active_query != None:
-            self.active_query.jobs = []
-            self.active_query = None
-        for builder in self.builders.values():
-            builder.stop_running()
+        if len(self.queries) > 0:
+            executor = ServiceLocator.get_build_executor()
+            is_running = False
+            for query in self.queries:
+                query.cancel()
+                if not executor.remove(query):
+                    is_running = True
+            self.queries = list()
+            if is_running:
+                for builder in self.builders.values():
+                    builder.stop_running()
         if notify:
             self.add_change_code('building_stopped')
 
@@ -16,6 +16,7 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
 import setzer.document.latex.build_system.query.query as query
+import setzer.document.latex.build_system.build_folders as build_folders
 from setzer.app.service_locator import ServiceLocator
 
 
@@ -54,6 +55,12 @@ class BuildSystemController(object):
 
                 text = document.get_text()
                 do_cleanup = self.settings.get_value('preferences', 'cleanup_build_files')
+                in_private_folder = self.settings.get_value('preferences', 'build_in_private_folder')
+                on_tmpfs = self.settings.get_value('preferences', 'build_folder_on_tmpfs')
+                build_folder = build_folders.get_build_folder(query_obj.tex_filename, in_private_folder, on_tmpfs)
+                draft_mode = self.settings.get_value('preferences', 'draft_mode')
+                stop_on_first_error = self.settings.get_value('preferences', 'stop_on_first_error')
+                format_folder = build_folders.get_build_folder(query_obj.tex_filename, True, on_tmpfs)
 
             if mode == 'build':
                 query_obj.jobs = ['build_latex']
@@ -62,6 +69,11 @@ class BuildSystemController(object):
                 query_obj.build_data['use_latexmk'] = use_latexmk
                 query_obj.build_data['additional_arguments'] = additional_arguments
                 query_obj.build_data['do_cleanup'] = do_cleanup
+                query_obj.build_data['in_private_folder'] = in_private_folder
+                query_obj.build_data['build_folder'] = build_folder
+                query_obj.build_data['draft_mode'] = draft_mode
+                query_obj.build_data['stop_on_first_error'] = stop_on_first_error
+                query_obj.build_data['format_folder'] = format_folder
             elif mode == 'forward_sync':
                 query_obj.jobs = ['forward_sync']
                 query_obj.can_sync = True
@@ -83,6 +95,11 @@ class BuildSystemController(object):
                 query_obj.build_data['use_latexmk'] = use_latexmk
                 query_obj.build_data['additional_arguments'] = additional_arguments
                 query_obj.build_data['do_cleanup'] = do_cleanup
+                query_obj.build_data['in_private_folder'] = in_private_folder
+                query_obj.build_data['build_folder'] = build_folder
+                query_obj.build_data['draft_mode'] = draft_mode
+                query_obj.build_data['stop_on_first_error'] = stop_on_first_error
+                query_obj.build_data['format_folder'] = format_folder
                 query_obj.can_sync = False
                 query_obj.forward_sync_data['filename'] = synctex_arguments['filename']
                 query_obj.forward_sync_data['line'] = synctex_arguments['line']
@@ -41,6 +41,10 @@ class BuildSystemPresenter(object):
             self.document.build_widget.view.reset_timer()
             self.document.build_widget.view.label.set_text('0:00')
 
+        if change_code == 'build_log_items':
+            self.document.set_build_log_items(parameter)
+            self.document.invalidate_build_log()
+
         if change_code == 'building_stopped':
             self.document.show_build_state('')
             self.document.change_build_state('idle')
@@ -78,6 +82,7 @@ class BuildSystemPresenter(object):
                     build_blob['log_messages']['BibTeX'] = build_blob['bibtex_log_messages']
                     self.document.set_build_log_items(build_blob['log_messages'])
                     self.document.build_time = time.time() - self.document.last_build_start_time
+                    self.document.build_job_times = build_blob['job_times']
 
                     error_count = self.document.get_error_count()
                     if error_count > 0:
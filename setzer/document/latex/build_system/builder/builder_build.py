@@ -31,7 +31,9 @@ class BuilderBuild(object):
                                  'error_arg': error_arg}
 
     def cleanup_files(self, query):
-        if query.build_data['do_cleanup']:
+        ''' helper files in a private build folder are kept for the next build. '''
+
+        if query.build_data['do_cleanup'] and not query.build_data['in_private_folder']:
             self.cleanup_build_files(query)
             self.cleanup_glossaries_files(query)
 
@@ -40,13 +42,39 @@ class BuilderBuild(object):
                         '.ind', '.log', '.nav', '.out', '.snm', '.synctex.gz', '.toc',
                         '.ist', '.glo', '.glg', '.acn', '.alg',
                         '.bcf', '.run.xml', '.out.ps']
-        for ending in file_endings:
-            try: os.remove(os.path.splitext(query.tex_filename)[0] + ending)
-            except FileNotFoundError: pass
+        self.remove_files_with_endings(query.tex_filename, file_endings)
 
     def cleanup_glossaries_files(self, query):
-        for ending in ['.gls', '.acr']:
-            try: os.remove(os.path.splitext(query.tex_filename)[0] + ending)
-            except FileNotFoundError: pass
+        self.remove_files_with_endings(query.tex_filename, ['.gls', '.acr'])
+
+    def remove_files_with_endings(self, tex_filename, file_endings):
+        ''' lists the folder once, instead of trying to remove every file. '''
+
+        basename = os.path.splitext(os.path.basename(tex_filename))[0]
+        filenames = {basename + ending for ending in file_endings}
+        try:
+            with os.scandir(os.path.dirname(tex_filename)) as entries:
+                for entry in entries:
+                    if entry.name in filenames:
+                        try: os.remove(entry.path)
+                        except FileNotFoundError: pass
+        except FileNotFoundError: pass
+
+    def get_build_folder(self, query):
+        return query.build_data['build_folder']
+
+    def get_build_filename(self, query, ending):
+        ''' name of the helper file with ending, in the build folder. '''
+
+        return os.path.join(self.get_build_folder(query), os.path.splitext(os.path.basename(query.tex_filename))[0] + ending)
+
+    def get_build_env(self, query):
+        ''' tools running in a private build folder find the document's files via kpathsea. '''
+
+        custom_env = os.environ.copy()
+        if query.build_data['in_private_folder']:
+            for variable in ['TEXINPUTS', 'BIBINPUTS', 'BSTINPUTS', 'INDEXSTYLE']:
+                custom_env[variable] = os.path.dirname(query.tex_filename) + ':' + custom_env.get(variable, '')
+        return custom_env
 
 
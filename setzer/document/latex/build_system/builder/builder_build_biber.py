@@ -38,19 +38,17 @@ class BuilderBuildBiber(builder_build.BuilderBuild):
 
         query.biber_data['ran_on_files'].append(filename)
 
-        custom_env = os.environ.copy()
+        custom_env = self.get_build_env(query)
         custom_env['BIBINPUTS'] = os.path.dirname(query.tex_filename) + ':' + os.path.dirname(tex_filename)
         try:
-            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename), env=custom_env)
+            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=self.get_build_folder(query), env=custom_env)
         except FileNotFoundError:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_not_working', 'biber missing')
             return
         self.process.wait()
 
-        self.parse_biber_log(query, tex_filename[:-3] + 'blg')
-
-        query.jobs.insert(0, 'build_latex')
+        self.parse_biber_log(query, self.get_build_filename(query, '.blg'))
 
     def stop_running(self):
         if self.process != None:
@@ -35,7 +35,7 @@ class BuilderBuildGlossaries(builder_build.BuilderBuild):
         arguments = ['makeglossaries']
         arguments.append(basename)
         try:
-            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename))
+            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=self.get_build_folder(query), env=self.get_build_env(query))
         except FileNotFoundError:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_not_working', 'makeglossaries missing')
@@ -47,8 +47,6 @@ class BuilderBuildGlossaries(builder_build.BuilderBuild):
             try: shutil.move(move_from, move_to)
             except FileNotFoundError: pass
 
-        query.jobs.insert(0, 'build_latex')
-
     def stop_running(self):
         if self.process != None:
             self.process.kill()
@@ -15,17 +15,25 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
+import gi
+from gi.repository import GObject
+
 import os
 import os.path
 import sys
-import base64
+import hashlib
+import json
 import shutil
+import subprocess
+import time
 import pexpect
 from operator import itemgetter
 
 import setzer.document.latex.build_system.builder.builder_build as builder_build
 import setzer.document.latex.build_system.latex_log_parser.latex_log_parser as latex_log_parser
-from setzer.app.service_locator import ServiceLocator
+import setzer.document.latex.build_system.latex_log_parser.latex_log_stream_parser as latex_log_stream_parser
+import setzer.document.latex.build_system.build_planner as build_planner
+import setzer.document.latex.build_system.build_folders as build_folders
 
 
 class BuilderBuildLaTeX(builder_build.BuilderBuild):
@@ -33,10 +41,19 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
     def __init__(self):
         builder_build.BuilderBuild.__init__(self)
 
-        self.config_folder = ServiceLocator.get_config_folder()
         self.latex_log_parser = latex_log_parser.LaTeXLogParser()
+        self.build_planner = build_planner.BuildPlanner()
+        self.format_process = None
 
     def run(self, query):
+        # a tool failed
+        if query.get_build_result() != None: return
+
+        build_folder = self.get_build_folder(query)
+        if not self.build_planner.needs_pass(query, build_folder):
+            self.finish_build(query)
+            return
+
         build_command_defaults = dict()
         build_command_defaults['pdflatex'] = 'pdflatex -synctex=1 -interaction=nonstopmode'
         build_command_defaults['xelatex'] = 'xelatex -synctex=1 -interaction=nonstopmode'
@@ -50,29 +67,54 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
         else:
             build_command = build_command_defaults[query.build_data['latex_interpreter']] + query.build_data['additional_arguments']
 
+        if not os.path.isdir(build_folder):
+            os.makedirs(build_folder)
+        if query.build_data['in_private_folder']:
+            build_folders.create_include_folders(build_folder, query.build_data['text'])
+
+        custom_env = self.get_build_env(query)
+        if query.build_data['draft_mode'] and not query.build_data['use_latexmk'] and query.build_data['latex_interpreter'] in ['pdflatex', 'xelatex']:
+            format_name = self.get_preamble_format(query)
+            if format_name != None:
+                build_command += ' -fmt=' + format_name
+                custom_env['TEXFORMATS'] = query.build_data['format_folder'] + ':' + custom_env.get('TEXFORMATS', '')
+
+        self.build_planner.start_pass(query, build_folder)
+
         arguments = build_command.split()
-        arguments.append('-output-directory=' + os.path.dirname(query.tex_filename))
+        arguments.append('-output-directory=' + build_folder)
         arguments.append(query.tex_filename)
         try:
-            self.process = pexpect.spawn(build_command + ' -output-directory="' + os.path.dirname(query.tex_filename) + '" "' + query.tex_filename + '"', cwd=os.path.dirname(query.tex_filename))
+            self.process = pexpect.spawn(build_command + ' -output-directory="' + build_folder + '" "' + query.tex_filename + '"', cwd=os.path.dirname(query.tex_filename), env=custom_env)
         except FileNotFoundError:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_missing', arguments[0])
             return
 
+        stream_parser = latex_log_stream_parser.LaTeXLogStreamParser(query.tex_filename)
+        live_log_items = dict()
+        query.build_data['stopped_at_error'] = False
         while True:
             try:
-                out = self.process.expect(['\r\n\r\n', pexpect.TIMEOUT, pexpect.EOF], timeout=20)
+                out = self.process.expect_exact(['\r\n', pexpect.TIMEOUT, pexpect.EOF], timeout=20)
+                before = self.process.before.decode('utf-8', errors='ignore')
             except AttributeError:
                 break
             if out == 0:
-                pass
+                stream_parser.feed_line(before)
             elif out == 1:
-                for line in self.process.before.split(b'\n'):
-                    if line.startswith(b'!'):
-                        self.process.sendcontrol('c')
-                        self.process.sendline('x')
+                for line in before.split('\n'):
+                    if line.startswith('!'):
+                        self.stop_process()
             else:
+                stream_parser.feed(before)
+                stream_parser.finish()
+
+            self.publish_live_log_items(query, stream_parser.pop_new_items(), live_log_items)
+            if query.build_data['stop_on_first_error'] and stream_parser.error_count > 0 and not query.build_data['stopped_at_error']:
+                query.build_data['stopped_at_error'] = True
+                self.stop_process()
+            if out == 2:
                 break
 
         # parse results
@@ -84,6 +126,12 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
             self.throw_build_error(query, 'interpreter_not_working', 'log file missing')
             return
 
+        self.finish_build(query)
+
+    def finish_build(self, query):
+        ''' after the last pass, publishes the result of the build. '''
+
+        self.sort_log_messages(query)
         query.can_sync = self.copy_synctex_file(query)
         self.cleanup_files(query)
 
@@ -92,6 +140,8 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
             if os.path.isfile(pdf_filename):
                 os.remove(pdf_filename)
             pdf_filename = None
+        elif query.build_data['in_private_folder']:
+            self.move_pdf_into_place(query, pdf_filename)
 
         with query.build_result_lock:
             query.build_result = {'pdf_filename': pdf_filename, 
@@ -101,7 +151,118 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
                                   'error': None,
                                   'error_arg': None}
 
+    def get_preamble_format(self, query):
+        ''' returns the name of a format with the document's preamble
+            precompiled (mylatexformat), dumping it first if the preamble
+            changed since the last build. None if that's not possible.
+
+            The .hash file next to the format holds the hash of the
+            preamble, the files the dump read (from its -recorder .fls)
+            and whether it failed. A local .sty or \\input file that
+            changed makes the hash differ, a failed dump isn't tried
+            again until it does. '''
+
+        text = query.build_data['text']
+        end_of_preamble = text.find('\\begin{document}')
+        if end_of_preamble < 0: return None
+
+        interpreter = query.build_data['latex_interpreter']
+        preamble_hash = hashlib.sha1((interpreter + query.build_data['additional_arguments'] + text[:end_of_preamble]).encode('utf-8')).hexdigest()
+        format_folder = query.build_data['format_folder']
+        format_name = os.path.splitext(os.path.basename(query.tex_filename))[0] + '-preamble'
+        format_filename = os.path.join(format_folder, format_name + '.fmt')
+        hash_filename = os.path.join(format_folder, format_name + '.hash')
+
+        try:
+            with open(hash_filename, 'r') as f:
+                format_data = json.load(f)
+        except (FileNotFoundError, ValueError): pass
+        else:
+            if format_data.get('hash') == self.get_format_hash(preamble_hash, format_data.get('files', list())):
+                if format_data.get('failed', False): return None
+                if os.path.isfile(format_filename): return format_name
+
+        if not os.path.isdir(format_folder):
+            os.makedirs(format_folder)
+        try: os.remove(hash_filename)
+        except FileNotFoundError: pass
+
+        arguments = [interpreter, '-ini', '-interaction=nonstopmode', '-recorder', '-jobname=' + format_name, '-output-directory=' + format_folder]
+        arguments += query.build_data['additional_arguments'].split()
+        arguments += ['&' + interpreter, 'mylatexformat.ltx', query.tex_filename]
+        start_time = time.time()
+        try:
+            self.format_process = subprocess.Popen(arguments, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=os.path.dirname(query.tex_filename), env=self.get_build_env(query))
+        except FileNotFoundError:
+            return None
+        self.format_process.wait()
+        returncode = self.format_process.returncode
+        self.format_process = None
+        query.job_times.append(('build_format', time.time() - start_time))
+        if query.force_building_to_stop: return None
+
+        failed = returncode != 0 or not os.path.isfile(format_filename)
+        files = self.get_format_input_files(os.path.join(format_folder, format_name + '.fls'), query.tex_filename, format_folder)
+        with open(hash_filename, 'w') as f:
+            json.dump({'hash': self.get_format_hash(preamble_hash, files), 'files': files, 'failed': failed}, f)
+        return None if failed else format_name
+
+    def get_format_hash(self, preamble_hash, files):
+        ''' preamble_hash together with size and modification time of files. '''
+
+        stats = list()
+        for filename in files:
+            try: stat = os.stat(filename)
+            except OSError: stats.append(filename + ':-')
+            else: stats.append(filename + ':' + str(stat.st_size) + ':' + str(stat.st_mtime_ns))
+        return hashlib.sha1((preamble_hash + '\n' + '\n'.join(stats)).encode('utf-8')).hexdigest()
+
+    def get_format_input_files(self, fls_filename, tex_filename, format_folder):
+        ''' the files a format dump read, from its .fls file. The .tex
+            file is left out, its preamble is hashed as text. '''
+
+        files = set()
+        working_folder = os.path.dirname(tex_filename)
+        try: file = open(fls_filename, 'r', errors='ignore')
+        except FileNotFoundError: return list()
+        with file:
+            for line in file:
+                if line.startswith('PWD '):
+                    working_folder = line[4:].rstrip('\n')
+                elif line.startswith('INPUT '):
+                    filename = os.path.normpath(os.path.join(working_folder, line[6:].rstrip('\n')))
+                    if filename != os.path.normpath(tex_filename) and not filename.startswith(os.path.join(format_folder, '')):
+                        files.add(filename)
+        return sorted(files)
+
+    def publish_live_log_items(self, query, new_items, live_log_items):
+        ''' errors are shown while LaTeX is still running. Warnings wait
+            for the end of the build, many are gone after a rerun. '''
+
+        has_new_errors = False
+        for filename, item_type, item in new_items:
+            if item_type == 'error' and not item[2].startswith('No file '):
+                try: items = live_log_items[filename]
+                except KeyError:
+                    items = {'error': list(), 'warning': list(), 'badbox': list()}
+                    live_log_items[filename] = items
+                items['error'].append(item)
+                has_new_errors = True
+        if has_new_errors and query.live_log_callback != None:
+            log_items = {filename: {'error': list(items['error']), 'warning': list(), 'badbox': list()} for filename, items in live_log_items.items()}
+            GObject.idle_add(query.live_log_callback, query, log_items)
+
+    def stop_process(self):
+        ''' stops LaTeX, output up to here is kept. '''
+
+        if self.process != None and self.process.isalive():
+            self.process.sendcontrol('c')
+            self.process.sendline('x')
+
     def stop_running(self):
+        if self.format_process != None:
+            self.format_process.kill()
+            self.format_process = None
         if self.process != None:
             self.process.sendcontrol('c')
             self.process.sendline('x')
@@ -109,30 +270,38 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
             self.process = None
 
     def parse_build_log(self, query):
-        query.log_messages = list()
-        query.error_count = 0
+        ''' returns True if other jobs have to run before the build is finished. '''
 
-        log_items = self.latex_log_parser.parse_build_log(query.tex_filename)
-        additional_jobs = self.latex_log_parser.get_additional_jobs(log_items, query)
-        file_no = 0
+        query.log_messages = self.latex_log_parser.parse_build_log(query.tex_filename, self.get_build_filename(query, '.log'))
 
-        for job in additional_jobs:
-            query.jobs.insert(0, job)
-            return True
+        if query.build_data['stopped_at_error']:
+            additional_jobs = []
+        else:
+            additional_jobs = self.build_planner.get_additional_jobs(query, self.get_build_folder(query))
+        query.jobs = additional_jobs + query.jobs
+        return len(additional_jobs) > 0
 
-        for filename, items in log_items.items():
+    def sort_log_messages(self, query):
+        query.error_count = 0
+        for filename, items in query.log_messages.items():
             query.error_count += len(items['error'])
             items['error'].sort(key=itemgetter(1))
             items['warning'].sort(key=itemgetter(1))
             items['badbox'].sort(key=itemgetter(1))
-        query.log_messages = log_items
 
-        return False
+    def move_pdf_into_place(self, query, pdf_filename):
+        ''' the .pdf is copied next to the .tex file under a temporary
+            name first, so the preview never opens a half written file. '''
+
+        temp_filename = os.path.join(os.path.dirname(pdf_filename), '.' + os.path.basename(pdf_filename) + '.part')
+        try: shutil.copyfile(self.get_build_filename(query, '.pdf'), temp_filename)
+        except FileNotFoundError: return
+        os.replace(temp_filename, pdf_filename)
 
     def copy_synctex_file(self, query):
-        move_from = os.path.splitext(query.tex_filename)[0] + '.synctex.gz'
-        folder = self.config_folder + '/' + base64.urlsafe_b64encode(str.encode(query.tex_filename)).decode()
-        move_to = folder + '/' + os.path.splitext(os.path.basename(query.tex_filename))[0] + '.synctex.gz'
+        move_from = self.get_build_filename(query, '.synctex.gz')
+        move_to = build_folders.get_synctex_filename(query.tex_filename)
+        folder = os.path.dirname(move_to)
 
         if not os.path.exists(folder):
             os.makedirs(folder)
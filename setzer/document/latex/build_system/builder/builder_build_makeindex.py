@@ -41,15 +41,13 @@ class BuilderBuildMakeindex(builder_build.BuilderBuild):
         query.makeindex_data['ran_on_files'].append(filename)
 
         try:
-            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename))
+            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=self.get_build_folder(query), env=self.get_build_env(query))
         except FileNotFoundError:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_not_working', 'makeindex missing')
             return
         self.process.wait()
 
-        query.jobs.insert(0, 'build_latex')
-
     def stop_running(self):
         if self.process != None:
             self.process.kill()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import os.path
+
+from setzer.app.service_locator import ServiceLocator
+
+
+class LaTeXLogStreamParser(object):
+    ''' Parses LaTeX output line by line, as it is written. Keeps a stack
+        of the files TeX has open, so every item is attached to the
+        .tex file it comes from. Items are complete once their line
+        number is known, at most ten lines after they start.
+
+        Results have the structure of LaTeXLogParser.parse_build_log():
+        {filename: {'error': [...], 'warning': [...], 'badbox': [...]}} '''
+
+    # TeX wraps lines at this length (max_print_line)
+    max_line_length = 79
+    max_item_lines = 10
+    # items that don't need the lines after them
+    single_line_items = ('Overfull \\hbox', 'Underfull \\hbox', 'No file ', 'File ')
+
+    def __init__(self, tex_filename):
+        self.tex_filename = tex_filename
+        self.tex_folder = os.path.dirname(tex_filename)
+
+        self.item_start_regex = ServiceLocator.get_regex_object(r' *(?:Overfull \\hbox|Underfull \\hbox|No file .*\.|File .* does not exist\.|(?:LaTeX|pdfTeX|LuaTeX|Package|Class) .*Warning.*:|LaTeX Font Warning:|! )')
+        # an opening parenthesis with the name of a .tex file, any other one, or a closing one
+        self.paren_regex = ServiceLocator.get_regex_object(r'\((?:([^()]*\.(?:tex|gls)))?|\)')
+        self.badbox_line_number_regex = ServiceLocator.get_regex_object(r'lines ([0-9]+)--([0-9]+)')
+        self.other_line_number_regex = ServiceLocator.get_regex_object(r'(l\.| input line \n| input line )([0-9]+)( |\.)')
+        self.context_line_regex = ServiceLocator.get_regex_object(r'l\.[0-9]+ ')
+
+        self.log_items = dict()
+        self.new_items = list()
+        # TeX errors, lines starting with '!'
+        self.error_count = 0
+
+        # for each open file: the .tex file its items belong to
+        self.file_stack = [tex_filename]
+        self.wrapped_text = ''
+        self.partial_line = ''
+        self.pending_item = None
+        self.pending_file = None
+        self.skip_parens = 0
+
+    def feed(self, text):
+        ''' text: any chunk of output, lines may be split between chunks. '''
+
+        lines = (self.partial_line + text.replace('\r\n', '\n')).split('\n')
+        self.partial_line = lines.pop()
+        self.feed_lines(lines)
+
+    def feed_line(self, line):
+        self.feed_lines([line])
+
+    def feed_lines(self, lines):
+        ''' one pass, most lines are checked with a single regex match. '''
+
+        item_start_match = self.item_start_regex.match
+        line_number_search = self.other_line_number_regex.search
+        context_line_match = self.context_line_regex.match
+        single_line_items = self.single_line_items
+        max_line_length = self.max_line_length
+        max_item_lines = self.max_item_lines
+
+        for line in lines:
+            if item_start_match(line):
+                self.finish_pending_item()
+                first_line = line.lstrip()
+                if first_line.startswith(single_line_items) or line_number_search(line) != None:
+                    self.add_item(self.file_stack[-1], [first_line])
+                else:
+                    self.pending_item = [first_line]
+                    self.pending_file = self.file_stack[-1]
+            elif self.pending_item != None:
+                pending_item = self.pending_item
+                pending_item.append(line)
+                if line_number_search(pending_item[-2] + line) != None or len(pending_item) >= max_item_lines:
+                    self.finish_pending_item()
+
+            # the source line shown with an error isn't log structure
+            if self.skip_parens > 0:
+                self.skip_parens -= 1
+            elif line.startswith('l.') and context_line_match(line):
+                self.skip_parens = 1
+            elif '(' in line or ')' in line or len(line) == max_line_length or self.wrapped_text != '':
+                self.update_file_stack(line)
+
+    def finish(self):
+        ''' call at the end of output, returns all items. '''
+
+        if self.partial_line != '':
+            self.feed_line(self.partial_line.rstrip('\r'))
+            self.partial_line = ''
+        self.finish_pending_item()
+        return self.log_items
+
+    def pop_new_items(self):
+        ''' items completed since the last call, as (filename, item_type, item). '''
+
+        new_items = self.new_items
+        self.new_items = list()
+        return new_items
+
+    def update_file_stack(self, line):
+        ''' file names can be wrapped, so a full length line is held
+            back and scanned together with the next one. '''
+
+        if len(line) == self.max_line_length:
+            self.wrapped_text += line
+            return
+        text = self.wrapped_text + line
+        self.wrapped_text = ''
+
+        file_stack = self.file_stack
+        if '.tex' not in text and '.gls' not in text:
+            opens = text.count('(')
+            closes = text.count(')')
+            if closes == 0:
+                file_stack.extend([file_stack[-1]] * opens)
+                return
+            if opens == 0:
+                del(file_stack[max(len(file_stack) - closes, 1):])
+                return
+            if opens == 1 and closes == 1 and text.find('(') < text.find(')'):
+                return
+
+        for match in self.paren_regex.finditer(text):
+            if match.group(1) != None:
+                file_stack.append(self.get_full_filename(match.group(1)))
+            elif match.group(0) == '(':
+                file_stack.append(file_stack[-1])
+            elif len(file_stack) > 1:
+                file_stack.pop()
+
+    def get_full_filename(self, filename):
+        filename = filename.strip()
+        if not filename.startswith('/'):
+            filename = os.path.normpath(self.tex_folder + '/' + filename)
+        return filename
+
+    def finish_pending_item(self):
+        if self.pending_item == None: return
+
+        lines = self.pending_item
+        filename = self.pending_file
+        self.pending_item = None
+        self.pending_file = None
+        self.add_item(filename, lines)
+
+    def add_item(self, filename, lines):
+        item_type, item = self.get_item(lines)
+        if item_type == None: return
+
+        try: items = self.log_items[filename]
+        except KeyError:
+            items = {'error': list(), 'warning': list(), 'badbox': list()}
+            self.log_items[filename] = items
+        items[item_type].append(item)
+        self.new_items.append((filename, item_type, item))
+        if item_type == 'error' and lines[0].startswith('!'):
+            self.error_count += 1
+
+    def get_item(self, lines):
+        ''' returns (item_type, item) for the lines of a log item,
+            (None, None) for items that aren't shown. '''
+
+        line = lines[0]
+
+        if line.startswith('No file '):
+            return ('error', (None, -1, line.strip()))
+
+        elif line.startswith('Package biblatex Warning: Please (re)run Biber on the file:'):
+            next_line = lines[1] if len(lines) > 1 else ''
+            return ('warning', (None, -1, line[26:].strip(), next_line))
+
+        elif line.startswith('Package biblatex Warning: Please rerun LaTeX.'):
+            return ('warning', (None, -1, line[26:].strip()))
+
+        elif line.startswith('LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right.'):
+            return ('warning', (None, -1, line[15:].strip()))
+
+        elif line.startswith('Package natbib Warning: Citation(s) may have changed.'):
+            return ('warning', (None, -1, line[24:].strip()))
+
+        elif line.startswith('Overfull \\hbox') or line.startswith('Underfull \\hbox'):
+            line_number_match = self.badbox_line_number_regex.search(line)
+            if line_number_match != None:
+                return ('badbox', (None, int(line_number_match.group(1)), line.strip()))
+
+        elif line.startswith('LaTeX Warning: Reference '):
+            return ('warning', ('Undefined Reference', self.get_line_number(lines), line[15:].strip()))
+
+        elif line.startswith('Package '):
+            return ('warning', (None, self.get_line_number(lines), line.split(':')[1].strip()))
+
+        elif line.startswith('LaTeX Warning: '):
+            return ('warning', (None, self.get_line_number(lines), line[15:].strip()))
+
+        elif line.startswith('! Undefined control sequence'):
+            return ('error', ('Undefined control sequence', self.get_line_number(lines), line.strip()))
+
+        elif line.startswith('! LaTeX Error') or line.startswith('!pdfTeX error'):
+            return ('error', (None, self.get_line_number(lines), line[15:].strip()))
+
+        elif line.startswith('! Package'):
+            text = line[2:].strip()
+            if not '.' in text and len(text) > 60 and len(lines) > 1:
+                text += lines[1].strip()
+            return ('error', ('Undefined control sequence', self.get_line_number(lines), text))
+
+        elif line.startswith('File') and line.rstrip().endswith(' does not exist.'):
+            return ('error', (None, -1, line.strip()))
+
+        elif line.startswith('! I can\'t find file.'):
+            return ('error', (None, -1, line.strip()))
+
+        elif line.startswith('! File'):
+            return ('error', (None, self.get_line_number(lines), line[2:].strip()))
+
+        elif line.startswith('! ') and not line.startswith('!  ==> Fatal'):
+            return ('error', (None, self.get_line_number(lines), line[2:].strip()))
+
+        return (None, None)
+
+    def get_line_number(self, lines):
+        line_number_match = self.other_line_number_regex.search(''.join(lines))
+        if line_number_match != None:
+            return int(line_number_match.group(2))
+        return -1
+
+
@@ -32,7 +32,7 @@ class Query(object):
         self.synctex_file = None
         self.synctex_file_lock = thread.allocate_lock()
 
-        self.build_data = {'rerun_latex_reasons': set()}
+        self.build_data = dict()
         self.biber_data = {'ran_on_files': []}
         self.bibtex_data = {'ran_on_files': []}
         self.makeindex_data = {'ran_on_files': []}
@@ -46,6 +46,12 @@ class Query(object):
         self.force_building_to_stop = False
         self.error_count = 0
 
+        # (job, seconds) in order of execution
+        self.job_times = list()
+
+        # called on the main loop with (query, log_items) when LaTeX reports errors
+        self.live_log_callback = None
+
     def get_build_result(self):
         return_value = None
         with self.build_result_lock:
@@ -67,6 +73,12 @@ class Query(object):
                 return_value = self.backward_sync_result
         return return_value
 
+    def cancel(self):
+        ''' called from the main thread, the worker stops after the current job. '''
+
+        self.force_building_to_stop = True
+        self.jobs = []
+
     def mark_done(self):
         with self.done_executing_lock:
             self.done_executing = True
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gzip
+import os
+import os.path
+import zlib
+
+
+class SyncTeXReader(object):
+    ''' Reads .synctex.gz files in process and answers forward and
+        backward sync queries from two indexes: (input, line) to the
+        lines of text (outermost hboxes) showing it, and page to the
+        hboxes on it, bucketed into horizontal bands.
+
+        The file is parsed once, on the first query after it changed
+        (checked by size and mtime). '''
+
+    # height of the bands of the page index, in scaled points (about 18pt)
+    band_height = 1 << 20
+
+    # forward sync looks this many lines up and down if a line left no trace
+    max_line_distance = 10
+
+    def __init__(self):
+        self.pathname = None
+        self.folder = None
+        self.file_stat = None
+
+        self.inputs = dict()
+        self.factor = 1 / 65781.76
+        self.x_offset = 0
+        self.y_offset = 0
+
+        # (page, left, top, right, bottom, tag, line), coordinates in sp
+        self.boxes = list()
+        # child nodes of every box: (h, tag, line)
+        self.box_nodes = list()
+        # (tag, line) -> indexes of the boxes of the text lines showing it
+        self.line_index = dict()
+        # page -> band -> indexes of the boxes reaching into the band
+        self.page_index = dict()
+
+    def load(self, pathname, folder):
+        ''' folder is the one LaTeX ran in, relative input paths start
+            there. Returns False if there is no readable file at pathname. '''
+
+        try: stat_result = os.stat(pathname)
+        except OSError: return False
+        file_stat = (stat_result.st_size, stat_result.st_mtime_ns)
+        if pathname == self.pathname and folder == self.folder and file_stat == self.file_stat: return True
+
+        try:
+            with gzip.open(pathname, 'rb') as filehandle:
+                text = filehandle.read().decode('utf-8', errors='replace')
+        except (OSError, EOFError, zlib.error):
+            self.clear()
+            return False
+
+        self.clear()
+        self.parse(text, folder)
+        self.pathname = pathname
+        self.folder = folder
+        self.file_stat = file_stat
+        return True
+
+    def clear(self):
+        self.pathname = None
+        self.folder = None
+        self.file_stat = None
+        self.inputs = dict()
+        self.factor = 1 / 65781.76
+        self.x_offset = 0
+        self.y_offset = 0
+        self.boxes = list()
+        self.box_nodes = list()
+        self.line_index = dict()
+        self.page_index = dict()
+
+    def parse(self, text, folder):
+        ''' single pass over the records. '''
+
+        boxes = self.boxes
+        box_nodes = self.box_nodes
+        line_index = self.line_index
+
+        unit = 1
+        magnification = 1000
+        page = 0
+        # open boxes: (index of the box or None for vboxes, index of the text line box)
+        stack = list()
+        in_content = False
+
+        for record in text.split('\n'):
+            if record == '': continue
+            first_char = record[0]
+
+            if in_content:
+                if first_char == '[':
+                    stack.append((None, None))
+                elif first_char in '(hvkgx$r':
+                    try:
+                        fields = record[1:].split(':')
+                        tag, line = fields[0].split(',')[:2]
+                        tag, line = int(tag), int(line)
+                        h, v = fields[1].split(',')[:2]
+                        h, v = int(h), int(v)
+                        if first_char in '(h':
+                            width, height, depth = fields[2].split(',')[:3]
+                            width, height, depth = int(width), int(height), int(depth)
+                    except (ValueError, IndexError):
+                        if first_char == '(': stack.append((None, None))
+                        continue
+
+                    parent, text_line = stack[-1] if len(stack) > 0 else (None, None)
+                    if parent != None:
+                        box_nodes[parent].append((h, tag, line))
+
+                    if first_char in '(h':
+                        index = len(boxes)
+                        boxes.append((page, h, v - height, h + abs(width), v + depth, tag, line))
+                        box_nodes.append(list())
+                        if text_line == None:
+                            text_line = index
+                        if first_char == '(':
+                            stack.append((index, text_line))
+
+                    if text_line != None:
+                        key = (tag, line)
+                        try: lines = line_index[key]
+                        except KeyError: line_index[key] = [text_line]
+                        else:
+                            if lines[-1] != text_line:
+                                lines.append(text_line)
+                elif first_char in ')]':
+                    if len(stack) > 0: stack.pop()
+                elif first_char == '{':
+                    try: page = int(record[1:])
+                    except ValueError: pass
+                    stack = list()
+                elif first_char == '}':
+                    stack = list()
+                elif record.startswith('Input:'):
+                    self.add_input(record, folder)
+                elif record.startswith('Postamble:'):
+                    in_content = False
+            elif record.startswith('Input:'):
+                self.add_input(record, folder)
+            elif record.startswith('Content:'):
+                in_content = True
+            else:
+                key, _, value = record.partition(':')
+                try:
+                    if key == 'Unit': unit = float(value)
+                    elif key == 'Magnification': magnification = float(value)
+                    elif key == 'X Offset': self.x_offset = int(float(value))
+                    elif key == 'Y Offset': self.y_offset = int(float(value))
+                except ValueError: pass
+
+        # scaled points to PDF points
+        self.factor = unit * magnification / 1000 / 65781.76
+
+        band_height = self.band_height
+        page_index = self.page_index
+        for index, box in enumerate(boxes):
+            try: bands = page_index[box[0]]
+            except KeyError:
+                bands = dict()
+                page_index[box[0]] = bands
+            for band in range(box[2] // band_height, box[4] // band_height + 1):
+                try: bands[band].append(index)
+                except KeyError: bands[band] = [index]
+
+    def add_input(self, record, folder):
+        try: _, tag, filename = record.split(':', 2)
+        except ValueError: return
+        try: self.inputs[int(tag)] = os.path.normpath(os.path.join(folder, filename))
+        except ValueError: pass
+
+    def forward_sync(self, filename, line):
+        ''' returns the rectangles showing line of filename, in the format
+            of the synctex view command: dicts with page, h, v (bottom
+            edge), width and height, in PDF points. None if there are none. '''
+
+        tags = self.get_tags(filename)
+        if len(tags) == 0: return None
+
+        for distance in range(self.max_line_distance + 1):
+            for candidate in ([line] if distance == 0 else [line + distance, line - distance]):
+                indexes = list()
+                for tag in tags:
+                    indexes += self.line_index.get((tag, candidate), [])
+                if len(indexes) > 0:
+                    return [self.get_rectangle(index) for index in sorted(set(indexes))]
+        return None
+
+    def backward_sync(self, page, x, y):
+        ''' page counts from 1, x and y in PDF points from the top left
+            corner. Returns (filename, line) of the text closest to the
+            point, or None. '''
+
+        try: bands = self.page_index[page]
+        except KeyError: return None
+
+        h = x / self.factor - self.x_offset
+        v = y / self.factor - self.y_offset
+        boxes = self.boxes
+
+        # the innermost box containing the point
+        best_index = None
+        best_area = None
+        for index in bands.get(int(v // self.band_height), []):
+            box = boxes[index]
+            if box[1] <= h <= box[3] and box[2] <= v <= box[4]:
+                area = (box[3] - box[1]) * (box[4] - box[2])
+                if best_area == None or area < best_area:
+                    best_index, best_area = index, area
+
+        # or else the closest box on the page
+        if best_index == None:
+            best_distance = None
+            for index in set(index for indexes in bands.values() for index in indexes):
+                box = boxes[index]
+                distance = max(box[1] - h, 0, h - box[3]) + max(box[2] - v, 0, v - box[4])
+                if best_distance == None or distance < best_distance:
+                    best_index, best_distance = index, distance
+            if best_index == None: return None
+
+        box = boxes[best_index]
+        tag, line = box[5], box[6]
+
+        # within the box, the last node starting left of the point
+        nodes = self.box_nodes[best_index]
+        if len(nodes) > 0:
+            tag, line = nodes[0][1], nodes[0][2]
+            for node in nodes:
+                if node[0] <= h:
+                    tag, line = node[1], node[2]
+
+        try: return (self.inputs[tag], line)
+        except KeyError: return None
+
+    def get_tags(self, filename):
+        ''' tags of the inputs for filename, matched by path first and by
+            name if LaTeX recorded the path differently. '''
+
+        filename = os.path.normpath(filename)
+        tags = [tag for tag, input_filename in self.inputs.items() if input_filename == filename]
+        if len(tags) == 0:
+            basename = os.path.basename(filename)
+            tags = [tag for tag, input_filename in self.inputs.items() if os.path.basename(input_filename) == basename]
+        return tags
+
+    def get_rectangle(self, index):
+        box = self.boxes[index]
+        factor = self.factor
+        rectangle = dict()
+        rectangle['page'] = box[0]
+        rectangle['h'] = (box[1] + self.x_offset) * factor
+        rectangle['v'] = (box[4] + self.y_offset) * factor
+        rectangle['width'] = (box[3] - box[1]) * factor
+        rectangle['height'] = (box[4] - box[2]) * factor
+        return rectangle
+
+
@@ -16,6 +16,7 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
 import setzer.document.latex.build_widget.build_widget_viewgtk as build_widget_view
+import setzer.document.latex.build_system.build_folders as build_folders
 from setzer.helpers.observable import Observable
 from setzer.app.service_locator import ServiceLocator
 from setzer.dialogs.dialog_locator import DialogLocator
@@ -48,6 +49,7 @@ class BuildWidget(Observable):
         self.document.connect('build_state_change', self.on_build_state_change)
         self.document.connect('build_state', self.on_build_state)
         self.settings.connect('settings_changed', self.on_settings_changed)
+        ServiceLocator.get_build_executor().connect('queue_state_changed', self.on_queue_state_changed)
 
     def on_filename_change(self, document, filename):
         self.set_clean_button_state()
@@ -92,9 +94,22 @@ class BuildWidget(Observable):
 
     def on_settings_changed(self, settings, parameter):
         section, item, value = parameter
-        if (section, item) == ('preferences', 'cleanup_build_files'):
+        if (section, item) in [('preferences', 'cleanup_build_files'), ('preferences', 'build_in_private_folder')]:
             self.set_clean_button_state()
 
+    def on_queue_state_changed(self, build_executor, queue_state):
+        ''' builds of other documents can hold this one back, the stop button tells. '''
+
+        filename = self.document.get_filename()
+        number_of_builds = len(queue_state['running']) + len(queue_state['waiting'])
+        if filename in queue_state['waiting'] and filename not in queue_state['running']:
+            tooltip = _('Waiting for other builds to finish')
+        elif number_of_builds > 1:
+            tooltip = ngettext('Stop building ({amount} build in progress)', 'Stop building ({amount} builds in progress)', number_of_builds).format(amount=str(number_of_builds))
+        else:
+            tooltip = _('Stop building')
+        self.view.stop_button.set_tooltip_text(tooltip)
+
     def show_message(self, message=''):
         self.view.stop_timer()
         self.view.show_result(message)
@@ -125,9 +140,10 @@ class BuildWidget(Observable):
                     for ending in file_endings:
                         filename = pathname[0] + '/' + pathname[1].rsplit('.', 1)[0] + ending
                         if os.path.exists(filename): return True
+                    if build_folders.has_private_build_folder(document.get_filename()): return True
             return False
 
-        if self.settings.get_value('preferences', 'cleanup_build_files') == True:
+        if self.settings.get_value('preferences', 'cleanup_build_files') == True and self.settings.get_value('preferences', 'build_in_private_folder') == False:
             self.view.clean_button.hide()
         else:
             self.view.clean_button.show_all()
@@ -34,11 +34,9 @@ class CodeFolding(Observable):
 
         self.is_enabled = False
 
-        self.blocks = list()
-        self.marks_start = dict()
+        # folding regions by starting line and by block key
         self.folding_regions = dict()
-        self.folding_regions_by_region_id = dict()
-        self.maximum_region_id = 0
+        self.folding_regions_by_key = dict()
         self.initial_folded_regions_set = False
         self.initial_folding_done = False
         self.initial_folding_regions_checked_count = 0
@@ -50,54 +48,27 @@ class CodeFolding(Observable):
         self.presenter = code_folding_presenter.CodeFoldingPresenter(self)
         self.controller = code_folding_controller.CodeFoldingController(self)
 
-        self.document.content.connect('text_inserted', self.on_text_inserted)
-        self.document.content.connect('text_deleted', self.on_text_deleted)
-        self.document.content.connect('buffer_changed', self.on_buffer_changed)
-
-    def on_text_inserted(self, content, parameter):
-        buffer, location_iter, text, text_length = parameter
-        length = len(text)
-        offset = location_iter.get_offset() + length
-        marks_start = dict()
-        for index, region_id in self.marks_start.items():
-            if index < offset:
-                marks_start[index] = region_id
-            else:
-                index2 = index + length
-                region = self.folding_regions_by_region_id[region_id]
-                region['offset_start'] = index2
-                marks_start[index2] = region_id
-        self.marks_start = marks_start
-
-    def on_text_deleted(self, content, parameter):
-        buffer, start_iter, end_iter = parameter
-        offset_start = start_iter.get_offset()
-        offset_end = end_iter.get_offset()
-        length = offset_end - offset_start
-        marks_start = dict()
-        for index, region_id in self.marks_start.items():
-            if index <= offset_start:
-                marks_start[index] = region_id
-            elif index >= offset_end:
-                index2 = index - length
-                region = self.folding_regions_by_region_id[region_id]
-                region['offset_start'] = index2
-                marks_start[index2] = region_id
-        self.marks_start = marks_start
-
-    def on_buffer_changed(self, content, parameter):
+        self.document.content.connect('blocks_changed', self.on_blocks_changed)
+
+    def on_blocks_changed(self, content, blocks_delta):
         if self.is_enabled:
-            self.update_folding_regions()
+            self.update_folding_regions(blocks_delta)
 
     def enable_code_folding(self):
         self.is_enabled = True
-        self.update_folding_regions()
+        try:
+            blocks = self.document.get_blocks()
+        except AttributeError:
+            blocks = list()
+        self.update_folding_regions({'added': blocks, 'removed': list(self.folding_regions_by_key), 'line_end': 0, 'offset_end': 0, 'line_delta': 0, 'length_delta': 0})
         self.gutter_object.show()
 
     def disable_code_folding(self):
         self.is_enabled = False
         for region in self.folding_regions.values():
             self.toggle_folding_region(region, show_region_regardless_of_state=True)
+        self.folding_regions = dict()
+        self.folding_regions_by_key = dict()
         self.gutter_object.hide()
 
     def toggle_folding_region(self, region, show_region_regardless_of_state=False, hide_region_regardless_of_state=False):
@@ -114,78 +85,61 @@ class CodeFolding(Observable):
             self.presenter.show_region(region)
         self.add_change_code('folding_state_changed', region)
 
-    def get_folding_region_by_region_id(self, region_id):
-        return self.folding_regions_by_region_id[region_id]
-
     #@timer
-    def update_folding_regions(self):
-        folding_regions = dict()
-        folding_regions_by_region_id = dict()
-        last_line = -1
-        try:
-            blocks = self.document.get_blocks()
-        except AttributeError:
-            return
-        if not self.blocks_changed(blocks): return
-        self.blocks = blocks
-
-        for block in blocks:
-            if block[1] != None:
-                if block[2] != last_line:
-                    region_id = self.get_mark_start_at_offset(block[0])
-                    if region_id != None:
-                        region_dict = self.get_folding_region_by_region_id(region_id)
-                        region_dict['starting_line'] = block[2]
-                        region_dict['ending_line'] = block[3]
-                        region_dict['offset_end'] = block[1]
-                        folding_regions_by_region_id[region_id] = region_dict
-                    else:
-                        self.add_mark_start(self.maximum_region_id, block[0])
-                        region_dict = {'offset_start': block[0], 'offset_end': block[1], 'is_folded': False, 'starting_line': block[2], 'ending_line': block[3], 'id': self.maximum_region_id}
-                        folding_regions_by_region_id[self.maximum_region_id] = region_dict
-                        self.maximum_region_id += 1
-                    folding_regions[block[2]] = region_dict
-                last_line = block[2]
-
-        self.delete_invalid_regions(folding_regions_by_region_id)
+    def update_folding_regions(self, blocks_delta):
+        ''' move the regions behind the edit, then drop the regions of
+            removed blocks and add the ones of new blocks. A new block
+            starting where a removed one did takes over its region, so
+            editing the first line of a folded block keeps it folded. '''
+
+        line_end = blocks_delta['line_end']
+        offset_end = blocks_delta['offset_end']
+        line_delta = blocks_delta['line_delta']
+        length_delta = blocks_delta['length_delta']
+        for region in self.folding_regions_by_key.values():
+            if region['offset_start'] >= offset_end:
+                region['offset_start'] += length_delta
+            if region['offset_end'] >= offset_end:
+                region['offset_end'] += length_delta
+            if region['starting_line'] >= line_end:
+                region['starting_line'] += line_delta
+            if region['ending_line'] >= line_end:
+                region['ending_line'] += line_delta
+
+        removed_regions = dict()
+        for key in blocks_delta['removed']:
+            try: region = self.folding_regions_by_key.pop(key)
+            except KeyError: pass
+            else: removed_regions[region['offset_start']] = region
+
+        for block in blocks_delta['added']:
+            try: region = removed_regions.pop(block[0])
+            except KeyError: region = {'is_folded': False}
+            region['offset_start'] = block[0]
+            region['offset_end'] = block[1]
+            region['starting_line'] = block[2]
+            region['ending_line'] = block[3]
+            self.folding_regions_by_key[block[4]] = region
+
+        for region in removed_regions.values():
+            if region['is_folded']:
+                self.toggle_folding_region(region, show_region_regardless_of_state=True)
 
-        self.folding_regions = folding_regions
-        self.folding_regions_by_region_id = folding_regions_by_region_id
+        if line_delta != 0 or len(blocks_delta['added']) > 0 or len(blocks_delta['removed']) > 0:
+            self.update_folding_regions_by_line()
 
         if not self.initial_folding_done:
             self.initial_folding()
 
-    #@timer
-    def delete_invalid_regions(self, folding_regions_by_region_id):
-        regions_to_delete = [region_id for region_id in self.folding_regions_by_region_id if region_id not in folding_regions_by_region_id]
-        for region_id in regions_to_delete:
-            region = self.folding_regions_by_region_id[region_id]
-            self.toggle_folding_region(region, show_region_regardless_of_state=True)
-            self.delete_mark_start(region['offset_start'])
-
-    def add_mark_start(self, region_id, offset):
-        self.marks_start[offset] = region_id
-
-    def delete_mark_start(self, offset):
-        try:
-            del(self.marks_start[offset])
-        except KeyError:
-            pass
-
-    def get_mark_start_at_offset(self, offset):
-        if offset in self.marks_start:
-            return self.marks_start[offset]
-        return None
+    def update_folding_regions_by_line(self):
+        ''' of several blocks starting on the same line the first one gets the region. '''
 
-    #@timer
-    def blocks_changed(self, blocks):
-        blocks_old = self.blocks
-        if len(blocks) != len(blocks_old):
-            return True
-        for block_old, block_new in zip(blocks_old, blocks):
-            if block_old[0] != block_new[0] or block_old[1] != block_new[1]:
-                return True
-        return False
+        folding_regions = dict()
+        for region in self.folding_regions_by_key.values():
+            line = region['starting_line']
+            if line not in folding_regions or region['offset_start'] < folding_regions[line]['offset_start']:
+                folding_regions[line] = region
+        self.folding_regions = folding_regions
 
     def get_folded_regions(self):
         folded_regions = list()
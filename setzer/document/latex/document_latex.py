@@ -21,6 +21,7 @@ import time
 from setzer.document.document import Document
 import setzer.document.content.content as content
 import setzer.document.latex.build_system.build_system as build_system
+import setzer.document.latex.build_system.build_folders as build_folders
 import setzer.document.latex.build_widget.build_widget as build_widget
 import setzer.document.latex.autocomplete.autocomplete as autocomplete
 import setzer.document.latex.code_folding.code_folding as code_folding
@@ -57,6 +58,7 @@ class DocumentLaTeX(Document):
         self.has_been_built = False
         self.last_build_start_time = None
         self.build_time = None
+        self.build_job_times = list()
         self.build_widget = build_widget.BuildWidget(self)
 
         self.autocomplete = autocomplete.Autocomplete(self, self.view)
@@ -173,7 +175,7 @@ class DocumentLaTeX(Document):
 
         filenames = set()
         for filename in self.content.get_included_latex_files():
-            filenames |= {os.path.normpath(os.path.join(dirname, filename))}
+            filenames.add(os.path.normpath(os.path.join(dirname, filename)))
 
         return filenames
 
@@ -181,14 +183,17 @@ class DocumentLaTeX(Document):
         dirname = self.get_dirname()
 
         filenames = set()
-        for filename in self.content.get_included_latex_files():
-            filenames |= {os.path.normpath(os.path.join(dirname, filename))}
+        for filename in self.content.get_bibliography_files():
+            filenames.add(os.path.normpath(os.path.join(dirname, filename)))
 
         return filenames
 
     def get_bibitems(self):
         return self.content.get_bibitems()
 
+    def get_bibentries(self):
+        return set()
+
     def get_labels(self):
         return self.content.get_labels()
 
@@ -198,6 +203,7 @@ class DocumentLaTeX(Document):
         if self.build_mode in ['build', 'build_and_forward_sync']:
             if state == 'ready_for_building':
                 self.build_time = None
+                self.build_job_times = list()
             elif state == 'building_in_progress':
                 self.last_build_start_time = time.time()
             elif state == 'building_to_stop':
@@ -270,6 +276,7 @@ class DocumentLaTeX(Document):
             filename = os.path.splitext(self.get_filename())[0] + ending
             try: os.remove(filename)
             except FileNotFoundError: pass
+        build_folders.remove_private_build_folders(self.get_filename())
         self.add_change_code('cleaned_up_build_files')
 
     def invalidate_build_log(self):
@@ -21,157 +21,357 @@ from gi.repository import Gdk
 from gi.repository import GObject
 import cairo
 
-import _thread as thread, queue
-import time
+import queue
+import collections
+import threading
 import math
 
+from setzer.app.service_locator import ServiceLocator
 from setzer.helpers.observable import Observable
 
 
 class PreviewPageRenderer(Observable):
+    ''' Renders pages in square tiles in the worker processes of the
+        shared render pool, only the visible ones and those of the
+        neighbouring pages. One dispatcher thread per preview hands
+        queued tiles to the pool, at most one per worker at a time, so
+        the queues keep their order and outdated tiles are skipped. Tiles are kept
+        in a least recently used cache, keyed by (pdf date, page, zoom,
+        column, row), within the 'preview_cache_size' budget (MB).
+
+        Tiles are rendered at zoom buckets, the next step of 2^(1/4)
+        above the exact zoom, and scaled down a little when drawn. So
+        resizing the window or the panes (fit to width) keeps using the
+        same tiles instead of rendering new ones at every step.
+
+        Every visible page is rendered at a low resolution as well.
+        While tiles are missing (zooming, after a build), the presenter
+        draws cached tiles of other zoom levels or pdf revisions, scaled
+        to the current layout, in their place. '''
+
+    # in layout pixels, surfaces are larger by the hidpi factor
+    tile_size = 256
+
+    # page width of the low resolution renderings, in layout pixels
+    thumbnail_width = 256
+
+    # zoom buckets per doubling of the zoom
+    zoom_steps = 4
 
     def __init__(self, preview, layouter):
         Observable.__init__(self)
         self.preview = preview
         self.layouter = layouter
-        self.maximum_rendered_pixels = 20000000
-
-        self.visible_pages_lock = thread.allocate_lock()
-        self.visible_pages = list()
-        self.page_width = None
-        self.pdf_date = None
-        self.rendered_pages = dict()
-        self.is_active_lock = thread.allocate_lock()
+        self.settings = ServiceLocator.get_settings()
+
+        # key -> (surface, tile pixels), least recently used first
+        self.tiles = collections.OrderedDict()
+        self.tiles_size = 0
+        self.maximum_tiles_size = self.get_maximum_tiles_size()
+        # page_number -> keys of its cached tiles
+        self.page_tiles = dict()
+
+        # guards is_active and the render queues, notified when tiles
+        # are queued or the renderer gets active
+        self.render_condition = threading.Condition()
         self.is_active = False
 
         self.preview.connect('position_changed', self.on_layout_or_position_changed)
         self.layouter.connect('layout_changed', self.on_layout_or_position_changed)
+        self.preview.view.connect('size-allocate', self.on_size_allocate)
+        self.settings.connect('settings_changed', self.on_settings_changed)
 
-        self.page_render_count_lock = thread.allocate_lock()
-        self.page_render_count = dict()
+        # queued tiles of older generations are skipped
+        self.render_generation_lock = threading.Lock()
+        self.render_generation = 0
         self.render_queue = queue.Queue()
         self.render_queue_low_priority = queue.Queue()
-        self.rendered_pages_queue = queue.Queue()
-        thread.start_new_thread(self.render_page_loop, ())
-        GObject.timeout_add(50, self.rendered_pages_loop)
+        self.rendered_tiles_queue = queue.Queue()
+        self.rendered_tiles_scheduled = False
+        self.render_pool = ServiceLocator.get_preview_render_pool()
+        self.render_slots = threading.Semaphore(self.render_pool.number_of_workers)
+        self.render_thread = threading.Thread(target=self.render_page_loop, name='preview tile dispatcher', daemon=True)
+        self.render_thread.start()
 
     def on_layout_or_position_changed(self, notifying_object):
         if self.layouter.has_layout:
             self.update_rendered_pages()
         else:
-            self.rendered_pages = dict()
+            self.clear_tiles()
+
+    def on_size_allocate(self, view, allocation):
+        if self.layouter.has_layout:
+            self.update_rendered_pages()
+
+    def on_settings_changed(self, settings, parameter):
+        section, item, value = parameter
+        if (section, item) == ('preferences', 'preview_cache_size'):
+            self.maximum_tiles_size = self.get_maximum_tiles_size()
+            self.remove_least_recently_used_tiles()
+
+    def get_maximum_tiles_size(self):
+        megabytes = self.settings.get_value('preferences', 'preview_cache_size')
+        if not isinstance(megabytes, int) or megabytes < 32:
+            megabytes = 32
+        return megabytes * 1000000
 
     def activate(self):
-        with self.is_active_lock:
+        with self.render_condition:
             self.is_active = True
+            self.render_condition.notify()
         self.update_rendered_pages()
 
     def deactivate(self):
-        with self.is_active_lock:
+        with self.render_condition:
             self.is_active = False
-        self.rendered_pages = dict()
-        with self.visible_pages_lock:
-            self.visible_pages = list()
-        self.page_width = None
-        self.pdf_date = None
+        with self.render_generation_lock:
+            self.render_generation += 1
+        self.clear_tiles()
 
     def render_page_loop(self):
+        ''' waits for a free worker, then for a queued tile while the
+            renderer is active, and has the pool render it. '''
+
         while True:
-            with self.is_active_lock:
-                is_active = self.is_active
-            if is_active:
-                try: todo = self.render_queue.get(block=False)
-                except queue.Empty:
-                    try: todo = self.render_queue_low_priority.get(block=False)
+            self.render_slots.acquire()
+            todo = self.get_next_todo()
+            self.render_pool.submit(lambda todo=todo: self.render_todo(todo))
+
+    def get_next_todo(self):
+        with self.render_condition:
+            while True:
+                if self.is_active:
+                    try: return self.render_queue.get(block=False)
                     except queue.Empty:
-                        todo = None
-                        time.sleep(0.05)
-                if todo != None:
-                    with self.page_render_count_lock:
-                        render_count = self.page_render_count[todo['page_number']]
-                    with self.visible_pages_lock:
-                        is_visible = (todo['page_number'] >= self.visible_pages_additional[0] and todo['page_number'] <= self.visible_pages_additional[1])
-                    if todo['render_count'] == render_count and is_visible:
-                        with self.preview.poppler_document_lock:
-                            surface = cairo.ImageSurface(cairo.Format.ARGB32, todo['page_width'] * todo['hidpi_factor'], todo['page_height'] * 2)
-                            ctx = cairo.Context(surface)
-                            ctx.scale(todo['scale_factor'] * todo['hidpi_factor'], todo['scale_factor'] * todo['hidpi_factor'])
-                            page = self.preview.poppler_document.get_page(todo['page_number'])
-                            page.render(ctx)
-                        self.rendered_pages_queue.put({'page_number': todo['page_number'], 'item': [surface, todo['page_width'], todo['pdf_date']]})
-            else:
-                time.sleep(0.05)
+                        try: return self.render_queue_low_priority.get(block=False)
+                        except queue.Empty: pass
+                self.render_condition.wait()
+
+    def render_todo(self, todo):
+        ''' runs on a render thread of the pool. '''
+
+        try:
+            with self.render_generation_lock:
+                is_current = (todo['generation'] == self.render_generation)
+            if is_current:
+                item = self.render_tile(todo['key'], todo['tile_pixels'])
+                if item != None:
+                    self.rendered_tiles_queue.put((todo['key'], item))
+                    with self.render_condition:
+                        if not self.rendered_tiles_scheduled:
+                            self.rendered_tiles_scheduled = True
+                            GObject.idle_add(self.rendered_tiles_loop)
+        finally:
+            self.render_slots.release()
+
+    def render_tile(self, key, tile_pixels):
+        ''' in a worker process if possible, else in this one. '''
 
-    def rendered_pages_loop(self):
-        with self.is_active_lock:
+        pdf_date, page_number, zoom, column, row = key
+        width = max(min(tile_pixels, math.ceil(self.preview.page_width * zoom) - column * tile_pixels), 1)
+        height = max(min(tile_pixels, math.ceil(self.preview.page_height * zoom) - row * tile_pixels), 1)
+
+        # the pdf changed since the tile was queued
+        if pdf_date != self.preview.pdf_date: return None
+        surface = self.render_pool.render(self.preview.pdf_filename, key, width, height, tile_pixels)
+        if surface != None: return (surface, tile_pixels)
+
+        surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+        ctx = cairo.Context(surface)
+        ctx.translate(- column * tile_pixels, - row * tile_pixels)
+        ctx.scale(zoom, zoom)
+        with self.preview.poppler_document_lock:
+            if pdf_date != self.preview.pdf_date or self.preview.poppler_document == None: return None
+            page = self.preview.poppler_document.get_page(page_number)
+            if page == None: return None
+            page.render(ctx)
+        return (surface, tile_pixels)
+
+    def rendered_tiles_loop(self):
+        ''' adds the tiles the render threads finished, on the main thread. '''
+
+        with self.render_condition:
+            self.rendered_tiles_scheduled = False
             is_active = self.is_active
-        if not is_active: return True
+        if not is_active: return False
 
         changed = False
-        while self.rendered_pages_queue.empty() == False:
-            try: todo = self.rendered_pages_queue.get(block=False)
+        while self.rendered_tiles_queue.empty() == False:
+            try: key, item = self.rendered_tiles_queue.get(block=False)
             except queue.Empty: pass
             else:
-                try:
-                    del(self.rendered_pages[todo['page_number']])
-                except KeyError: pass
-                self.rendered_pages[todo['page_number']] = todo['item']
+                self.add_tile(key, item)
                 changed = True
         if changed:
+            self.remove_least_recently_used_tiles()
             self.add_change_code('rendered_pages_changed')
-        return True
+        return False
+
+    def add_tile(self, key, item):
+        if key in self.tiles:
+            self.remove_tile(key)
+        self.tiles[key] = item
+        self.tiles_size += item[0].get_stride() * item[0].get_height()
+        try: self.page_tiles[key[1]].add(key)
+        except KeyError: self.page_tiles[key[1]] = {key}
+
+    def remove_tile(self, key):
+        item = self.tiles.pop(key)
+        self.tiles_size -= item[0].get_stride() * item[0].get_height()
+        self.page_tiles[key[1]].discard(key)
+        if len(self.page_tiles[key[1]]) == 0:
+            del(self.page_tiles[key[1]])
+
+    def remove_least_recently_used_tiles(self):
+        while self.tiles_size > self.maximum_tiles_size and len(self.tiles) > 0:
+            self.remove_tile(next(iter(self.tiles)))
+
+    def clear_tiles(self):
+        self.tiles = collections.OrderedDict()
+        self.tiles_size = 0
+        self.page_tiles = dict()
+
+    def get_zoom(self):
+        ''' surface pixels per point tiles are rendered at, the zoom
+            bucket at or above the current layout's. '''
+
+        zoom = self.layouter.scale_factor * self.layouter.hidpi_factor
+        step = math.ceil(round(math.log2(zoom) * self.zoom_steps, 4))
+        return 2 ** (step / self.zoom_steps)
+
+    def get_thumbnail_zoom(self):
+        return round(self.thumbnail_width * self.layouter.hidpi_factor / self.preview.page_width, 4)
+
+    def get_tile_pixels(self):
+        return self.tile_size * self.layouter.hidpi_factor
+
+    def get_visible_regions(self):
+        ''' (page_number, (x_start, y_start, x_end, y_end)) for every
+            visible page, in layout pixels relative to the page. '''
+
+        layouter = self.layouter
+        scrolled_window = self.preview.view.scrolled_window
+        x_start = scrolled_window.get_hadjustment().get_value() - layouter.horizontal_margin
+        y_start = scrolled_window.get_vadjustment().get_value() - layouter.vertical_margin
+        x_end = x_start + scrolled_window.get_allocated_width()
+        y_end = y_start + scrolled_window.get_allocated_height()
+        page_step = layouter.page_height + layouter.page_gap
+
+        regions = list()
+        first_page = max(int(y_start // page_step), 0)
+        last_page = min(int(y_end // page_step), self.preview.number_of_pages - 1)
+        for page_number in range(first_page, last_page + 1):
+            page_top = page_number * page_step
+            region = (max(x_start, 0), max(y_start - page_top, 0), min(x_end, layouter.page_width), min(y_end - page_top, layouter.page_height))
+            if region[2] > region[0] and region[3] > region[1]:
+                regions.append((page_number, region))
+        return regions
+
+    def get_tile_keys(self, page_number, region, pdf_date, zoom, tile_pixels):
+        ''' keys of the tiles at zoom covering region (layout pixels). '''
+
+        factor = zoom / self.layouter.scale_factor
+        columns = math.ceil(math.ceil(self.preview.page_width * zoom) / tile_pixels)
+        rows = math.ceil(math.ceil(self.preview.page_height * zoom) / tile_pixels)
+        first_column = max(int(region[0] * factor // tile_pixels), 0)
+        last_column = min(int(region[2] * factor // tile_pixels), columns - 1)
+        first_row = max(int(region[1] * factor // tile_pixels), 0)
+        last_row = min(int(region[3] * factor // tile_pixels), rows - 1)
+
+        keys = list()
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                keys.append((pdf_date, page_number, zoom, column, row))
+        return keys
 
     def update_rendered_pages(self):
-        with self.is_active_lock:
+        ''' queues the missing tiles of the visible pages, then those
+            of the pages right before and after. '''
+
+        with self.render_condition:
             is_active = self.is_active
         if not is_active: return
+        if not self.layouter.has_layout or self.preview.poppler_document == None: return
+
+        with self.render_generation_lock:
+            self.render_generation += 1
+            generation = self.render_generation
+
+        pdf_date = self.preview.pdf_date
+        zoom = self.get_zoom()
+        thumbnail_zoom = self.get_thumbnail_zoom()
+        tile_pixels = self.get_tile_pixels()
+        whole_page = (0, 0, self.layouter.page_width, self.layouter.page_height)
+
+        regions = self.get_visible_regions()
+        if len(regions) == 0: return
+        neighbours = list()
+        for page_number in [regions[0][0] - 1, regions[-1][0] + 1]:
+            if page_number >= 0 and page_number < self.preview.number_of_pages:
+                neighbours.append((page_number, (regions[0][1][0], 0, regions[0][1][2], self.layouter.page_height)))
 
-        hidpi_factor = self.layouter.hidpi_factor
-        page_width = self.layouter.page_width
-        page_height = self.layouter.page_height
+        for page_number, region in regions:
+            for key in self.get_tile_keys(page_number, whole_page, pdf_date, thumbnail_zoom, tile_pixels):
+                self.queue_tile(key, tile_pixels, generation, self.render_queue)
+        for page_number, region in regions:
+            for key in self.get_tile_keys(page_number, region, pdf_date, zoom, tile_pixels):
+                self.queue_tile(key, tile_pixels, generation, self.render_queue)
+        for page_number, region in neighbours:
+            for key in self.get_tile_keys(page_number, whole_page, pdf_date, thumbnail_zoom, tile_pixels):
+                self.queue_tile(key, tile_pixels, generation, self.render_queue_low_priority)
+            for key in self.get_tile_keys(page_number, region, pdf_date, zoom, tile_pixels):
+                self.queue_tile(key, tile_pixels, generation, self.render_queue_low_priority)
 
-        current_page = self.layouter.get_current_page()
-        if current_page == None: return
-        else: current_page -= 1
+    def queue_tile(self, key, tile_pixels, generation, render_queue):
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+        else:
+            with self.render_condition:
+                render_queue.put({'key': key, 'tile_pixels': tile_pixels, 'generation': generation})
+                self.render_condition.notify()
 
-        visible_pages = [current_page, min(current_page + math.floor(self.preview.view.get_allocated_height() / page_height) + 1, self.preview.number_of_pages - 1)]
+    def get_tiles_for_drawing(self, page_number):
+        ''' returns (surface, x, y, factor) for the tiles to draw on the
+            page, in layout pixels, placeholders first. '''
 
-        max_additional_pages = max(math.floor(self.maximum_rendered_pixels / (page_width * page_height * hidpi_factor * hidpi_factor) - visible_pages[1] + visible_pages[0]), 0)
-        visible_pages_additional = [max(int(visible_pages[0] - max_additional_pages / 2), 0), min(int(visible_pages[1] + max_additional_pages / 2), self.preview.number_of_pages - 1)]
+        if page_number not in self.page_tiles: return []
 
         pdf_date = self.preview.pdf_date
-        with self.visible_pages_lock:
-            if pdf_date == self.pdf_date and visible_pages == self.visible_pages and visible_pages_additional == self.visible_pages_additional and page_width == self.page_width:
-                do_return = True
+        zoom = self.get_zoom()
+        tile_pixels = self.get_tile_pixels()
+        region = (0, 0, self.layouter.page_width, self.layouter.page_height)
+        for visible_page_number, visible_region in self.get_visible_regions():
+            if visible_page_number == page_number:
+                region = visible_region
+
+        tiles = list()
+        missing_rectangles = list()
+        for key in self.get_tile_keys(page_number, region, pdf_date, zoom, tile_pixels):
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+                tiles.append(self.get_tile_for_drawing(key))
             else:
-                do_return = False
-        if do_return: return
-        with self.visible_pages_lock:
-            self.visible_pages = visible_pages
-            self.visible_pages_additional = visible_pages_additional
-        self.page_width = page_width
-        self.pdf_date = pdf_date
+                missing_rectangles.append(self.get_tile_rectangle(key, tile_pixels))
+        if len(missing_rectangles) == 0: return tiles
 
-        changed = False
-        for page_number in list(self.rendered_pages):
-            if self.rendered_pages[page_number][2] != pdf_date or page_number < visible_pages_additional[0] or page_number > visible_pages_additional[1]:
-                del(self.rendered_pages[page_number])
-                changed = True
-        if changed:
-            self.add_change_code('rendered_pages_changed')
+        # current revision over older ones, then closest zoom level
+        def rank(key): return (key[0] == pdf_date, - abs(math.log(key[2] / zoom)))
+        placeholders = list()
+        for key in sorted((key for key in self.page_tiles[page_number] if key[2] != zoom or key[0] != pdf_date), key=rank):
+            rectangle = self.get_tile_rectangle(key, self.tiles[key][1])
+            for missing_rectangle in missing_rectangles:
+                if rectangle[0] < missing_rectangle[2] and missing_rectangle[0] < rectangle[2] and rectangle[1] < missing_rectangle[3] and missing_rectangle[1] < rectangle[3]:
+                    placeholders.append(self.get_tile_for_drawing(key))
+                    break
+        return placeholders + tiles
+
+    def get_tile_for_drawing(self, key):
+        surface, tile_pixels = self.tiles[key]
+        factor = self.layouter.scale_factor / key[2]
+        return (surface, key[3] * tile_pixels * factor, key[4] * tile_pixels * factor, factor)
 
-        scale_factor = self.layouter.scale_factor
-
-        for page_number in range(0, self.preview.number_of_pages):
-            if page_number not in self.rendered_pages or self.rendered_pages[page_number][1] != page_width or self.rendered_pages[page_number][2] != pdf_date:
-                with self.page_render_count_lock:
-                    try:
-                        self.page_render_count[page_number] += 1
-                    except KeyError:
-                        self.page_render_count[page_number] = 1
-                    if visible_pages != None and page_number >= visible_pages[0] and page_number <= visible_pages[1]:
-                        self.render_queue.put({'page_number': page_number, 'render_count': self.page_render_count[page_number], 'scale_factor': scale_factor, 'hidpi_factor': hidpi_factor, 'page_width': page_width, 'page_height': page_height, 'pdf_date': pdf_date})
-                    elif page_number >= visible_pages_additional[0] and page_number <= visible_pages_additional[1]:
-                        self.render_queue_low_priority.put({'page_number': page_number, 'render_count': self.page_render_count[page_number], 'scale_factor': scale_factor, 'hidpi_factor': hidpi_factor, 'page_width': page_width, 'page_height': page_height, 'pdf_date': pdf_date})
+    def get_tile_rectangle(self, key, tile_pixels):
+        factor = self.layouter.scale_factor / key[2]
+        return (key[3] * tile_pixels * factor, key[4] * tile_pixels * factor, (key[3] + 1) * tile_pixels * factor, (key[4] + 1) * tile_pixels * factor)
 
 
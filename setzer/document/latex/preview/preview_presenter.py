@@ -154,27 +154,25 @@ class PreviewPresenter(object):
         ctx.fill()
 
     def draw_rendered_page(self, ctx, page_number):
-        if page_number in self.page_renderer.rendered_pages:
-            rendered_page_data = self.page_renderer.rendered_pages[page_number]
-            surface = rendered_page_data[0]
-            page_width = rendered_page_data[1] * self.layouter.hidpi_factor
-            if isinstance(surface, cairo.ImageSurface):
-                if page_width == self.layouter.page_width:
-                    ctx.set_source_surface(surface, 0, 0)
-                    ctx.paint()
-                else:
-                    matrix = ctx.get_matrix()
-                    factor = self.layouter.page_width / page_width
-                    ctx.scale(factor, factor)
-                    ctx.set_source_surface(surface, 0, 0)
-                    ctx.paint()
-                    ctx.set_matrix(matrix)
-                if self.preview.invert_pdf:
-                    ctx.set_operator(cairo.Operator.DIFFERENCE)
-                    ctx.set_source_rgb(1, 1, 1)
-                    ctx.rectangle(0, 0, self.layouter.page_width, self.layouter.page_height)
-                    ctx.fill()
-                    ctx.set_operator(cairo.Operator.OVER)
+        tiles = self.page_renderer.get_tiles_for_drawing(page_number)
+        if len(tiles) == 0: return
+
+        matrix = ctx.get_matrix()
+        for surface, x, y, factor in tiles:
+            ctx.translate(x, y)
+            ctx.scale(factor, factor)
+            ctx.set_source_surface(surface, 0, 0)
+            # no seams between scaled tiles
+            ctx.get_source().set_extend(cairo.Extend.PAD)
+            ctx.rectangle(0, 0, surface.get_width(), surface.get_height())
+            ctx.fill()
+            ctx.set_matrix(matrix)
+        if self.preview.invert_pdf:
+            ctx.set_operator(cairo.Operator.DIFFERENCE)
+            ctx.set_source_rgb(1, 1, 1)
+            ctx.rectangle(0, 0, self.layouter.page_width, self.layouter.page_height)
+            ctx.fill()
+            ctx.set_operator(cairo.Operator.OVER)
 
     def draw_synctex_rectangles(self, ctx, page_number):
         try:
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import cairo
+
+import queue
+import json
+import mmap
+import os
+import os.path
+import subprocess
+import sys
+import tempfile
+import threading
+
+
+class PreviewRenderPool(object):
+    ''' Worker processes rendering preview tiles, shared by all
+        previews. Every worker holds its own Poppler document, so pages
+        are rendered in parallel and without the preview's document
+        lock. Pixels are handed over in an unlinked buffer file in
+        /dev/shm that main process and worker both map.
+
+        render() blocks until a worker is free and done. It's called
+        from the pool's render threads, one per worker, which run the
+        functions the page renderers submit(). '''
+
+    def __init__(self):
+        self.number_of_workers = max(min((os.cpu_count() or 1) - 1, 4), 1)
+
+        # workers not rendering right now, started on first use
+        self.idle_workers = queue.Queue()
+        for number in range(self.number_of_workers):
+            self.idle_workers.put({'process': None, 'has_answered': False, 'buffer': None, 'buffer_size': 0, 'buffer_fd': None})
+
+        # set if a worker failed before its first answer (no Poppler, ...),
+        # the renderers render in process then
+        self.is_broken = False
+
+        self.buffer_folder = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+
+        # functions to run on the render threads, started on first use
+        self.tasks = queue.Queue()
+        self.render_threads = list()
+
+    def submit(self, function):
+        ''' run function on one of the render threads. '''
+
+        if len(self.render_threads) == 0:
+            for number in range(self.number_of_workers):
+                render_thread = threading.Thread(target=self.render_loop, name='preview render ' + str(number), daemon=True)
+                render_thread.start()
+                self.render_threads.append(render_thread)
+        self.tasks.put(function)
+
+    def render_loop(self):
+        while True:
+            function = self.tasks.get()
+            function()
+
+    def render(self, pdf_filename, key, width, height, tile_pixels):
+        ''' returns the tile for key (pdf date, page, zoom, column, row)
+            as a cairo.ImageSurface of width x height, or None if it
+            couldn't be rendered. '''
+
+        if self.is_broken: return None
+
+        pdf_date, page_number, zoom, column, row = key
+        worker = self.idle_workers.get()
+        try:
+            if not self.start_worker_if_needed(worker): return None
+            self.resize_buffer_if_needed(worker, cairo.ImageSurface.format_stride_for_width(cairo.Format.ARGB32, width) * height)
+
+            task = {'filename': pdf_filename, 'pdf_date': pdf_date, 'page_number': page_number, 'zoom': zoom, 'column': column, 'row': row, 'tile_pixels': tile_pixels, 'width': width, 'height': height, 'buffer_size': worker['buffer_size']}
+            try:
+                worker['process'].stdin.write(json.dumps(task) + '\n')
+                worker['process'].stdin.flush()
+                answer = json.loads(worker['process'].stdout.readline())
+            except (OSError, ValueError):
+                if not worker['has_answered']:
+                    self.is_broken = True
+                self.stop_worker(worker)
+                return None
+            worker['has_answered'] = True
+            if answer['error'] != None: return None
+
+            data = bytearray(worker['buffer'][:answer['stride'] * answer['height']])
+            return cairo.ImageSurface.create_for_data(data, cairo.Format.ARGB32, answer['width'], answer['height'], answer['stride'])
+        finally:
+            self.idle_workers.put(worker)
+
+    def start_worker_if_needed(self, worker):
+        if worker['process'] != None and worker['process'].poll() == None: return True
+        self.stop_worker(worker)
+
+        # the file is gone as soon as both processes closed it
+        fd, buffer_filename = tempfile.mkstemp(prefix='setzer-render-', dir=self.buffer_folder)
+        os.remove(buffer_filename)
+        worker['buffer_fd'] = fd
+
+        # the worker imports setzer from where this process did
+        env = os.environ.copy()
+        package_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
+        env['PYTHONPATH'] = package_folder + os.pathsep + env.get('PYTHONPATH', '')
+        arguments = [sys.executable, '-m', 'setzer.document.latex.preview.preview_render_worker', str(fd)]
+        try:
+            worker['process'] = subprocess.Popen(arguments, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, universal_newlines=True, pass_fds=(fd,))
+        except OSError:
+            self.stop_worker(worker)
+            return False
+        return True
+
+    def resize_buffer_if_needed(self, worker, size):
+        if size <= worker['buffer_size']: return
+
+        if worker['buffer'] != None:
+            worker['buffer'].close()
+        os.ftruncate(worker['buffer_fd'], size)
+        worker['buffer'] = mmap.mmap(worker['buffer_fd'], size)
+        worker['buffer_size'] = size
+
+    def stop_worker(self, worker):
+        if worker['process'] != None:
+            worker['process'].kill()
+            worker['process'] = None
+        if worker['buffer'] != None:
+            worker['buffer'].close()
+            worker['buffer'] = None
+        worker['buffer_size'] = 0
+        worker['has_answered'] = False
+        if worker['buffer_fd'] != None:
+            os.close(worker['buffer_fd'])
+            worker['buffer_fd'] = None
+
+
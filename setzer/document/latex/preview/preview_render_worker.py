@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gi
+gi.require_version('Poppler', '0.18')
+from gi.repository import Poppler
+from gi.repository import GLib
+import cairo
+
+import json
+import mmap
+import sys
+
+
+# render worker process of the preview, started by PreviewRenderPool.
+# Reads one task per line from stdin (json), renders the tile into the
+# shared buffer file (descriptor given at startup) and answers with one line on
+# stdout. Keeps its own Poppler document of the last pdf, exits when
+# stdin is closed.
+def main(buffer_fd):
+    buffer = None
+    buffer_size = 0
+    document = None
+    document_id = None
+
+    for line in sys.stdin:
+        task = json.loads(line)
+
+        if task['buffer_size'] != buffer_size:
+            if buffer != None: buffer.close()
+            buffer = mmap.mmap(buffer_fd, task['buffer_size'])
+            buffer_size = task['buffer_size']
+
+        if (task['filename'], task['pdf_date']) != document_id:
+            try: document = Poppler.Document.new_from_file('file:' + task['filename'])
+            except (TypeError, GLib.Error): document = None
+            document_id = (task['filename'], task['pdf_date'])
+
+        page = None
+        if document != None and task['page_number'] < document.get_n_pages():
+            page = document.get_page(task['page_number'])
+        if page == None:
+            answer = {'error': 'page missing'}
+        else:
+            width, height = task['width'], task['height']
+            stride = cairo.ImageSurface.format_stride_for_width(cairo.Format.ARGB32, width)
+            surface = cairo.ImageSurface.create_for_data(buffer, cairo.Format.ARGB32, width, height, stride)
+            ctx = cairo.Context(surface)
+            ctx.set_operator(cairo.Operator.CLEAR)
+            ctx.paint()
+            ctx.set_operator(cairo.Operator.OVER)
+            ctx.translate(- task['column'] * task['tile_pixels'], - task['row'] * task['tile_pixels'])
+            ctx.scale(task['zoom'], task['zoom'])
+            page.render(ctx)
+            surface.finish()
+            del(ctx, surface)
+            answer = {'error': None, 'width': width, 'height': height, 'stride': stride}
+
+        sys.stdout.write(json.dumps(answer) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]))
+
+
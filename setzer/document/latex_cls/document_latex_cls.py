@@ -58,6 +58,9 @@ class DocumentLaTeXCls(Document):
     def get_bibitems(self):
         return set()
 
+    def get_bibentries(self):
+        return set()
+
     def get_labels(self):
         return set()
 
@@ -57,6 +57,9 @@ class DocumentLaTeXSty(Document):
     def get_bibitems(self):
         return set()
 
+    def get_bibentries(self):
+        return set()
+
     def get_labels(self):
         return set()
 
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import re
+
+from setzer.helpers.prefix_index import PrefixIndex
+from setzer.helpers.symbol_set import SymbolSet
+
+
+# an entry starts at its header and ends where the next header starts.
+# Headers never span lines.
+header_regex = re.compile(r'@[ \t]*(\w+)[ \t]*[\{\(][ \t]*([^\s,@\{\}\(\)"#%\'=\\]*)')
+field_regex = re.compile(r'[\s,]*([A-Za-z][\w\-]*)\s*=\s*')
+simple_field_regex = re.compile(r'[\s,]*([A-Za-z][\w\-]*)\s*=\s*(?:\{([^\{\}]*)\}|"([^"\{\}]*)"|([^\s,#\{\}"\)]+))\s*(?=[,\}\)]|$)')
+bare_value_regex = re.compile(r'[^\s,#\{\}"\)]+')
+braces_regex = re.compile(r'[\{\}]')
+braces_quotes_regex = re.compile(r'[\{\}"]')
+markup_regex = re.compile(r'\\[^A-Za-z]|\\[A-Za-z]+\s*|[\{\}~]')
+whitespace_regex = re.compile(r'\s+')
+token_regex = re.compile(r'\w+')
+
+fields_kept = {'author', 'editor', 'title', 'year', 'date'}
+
+
+# returns the entries in text as a list of (entry, line, offset), entry
+# being the tuple (key, type, author, title, year). line and offset
+# are those of the start of text.
+def parse_entries(text, line=0, offset=0):
+    entries = list()
+    headers = list(header_regex.finditer(text))
+    last_offset = 0
+    for number, match in enumerate(headers):
+        line += text.count('\n', last_offset, match.start())
+        last_offset = match.start()
+
+        entry_type = match.group(1).lower()
+        key = match.group(2)
+        if key == '' or entry_type in ['comment', 'preamble', 'string']: continue
+
+        end = headers[number + 1].start() if number + 1 < len(headers) else len(text)
+        fields = parse_fields(text, match.end(), end)
+        author = fields.get('author', fields.get('editor', ''))
+        year = fields.get('year', fields.get('date', '')[:4])
+        entries.append(((key, entry_type, author, fields.get('title', ''), year), line, match.start() + offset))
+    return entries
+
+
+# fields of one entry, text[position:end] following the key.
+# Only the ones in fields_kept are returned, cleaned up for display.
+# Values without nested braces or '#' are matched in one go.
+def parse_fields(text, position, end):
+    fields = dict()
+    while position < end:
+        match = simple_field_regex.match(text, position, end)
+        if match != None:
+            name = match.group(1).lower()
+            value = match.group(match.lastindex)
+            position = match.end()
+        else:
+            match = field_regex.match(text, position, end)
+            if match == None: break
+            name = match.group(1).lower()
+            value, position = parse_value(text, match.end(), end)
+
+        if name in fields_kept:
+            fields[name] = whitespace_regex.sub(' ', value.replace('{', '').replace('}', '')).strip()
+    return fields
+
+
+# a field value: braced, quoted or bare parts, concatenated with '#'.
+# Returns the value and the position behind it.
+def parse_value(text, position, end):
+    parts = list()
+    while position < end:
+        char = text[position]
+        if char == '{':
+            closing = find_closing(text, position + 1, end, braces_regex)
+            parts.append(text[position + 1:closing])
+            position = closing + 1
+        elif char == '"':
+            closing = find_closing(text, position + 1, end, braces_quotes_regex)
+            parts.append(text[position + 1:closing])
+            position = closing + 1
+        else:
+            match = bare_value_regex.match(text, position, end)
+            if match == None: break
+            parts.append(match.group(0))
+            position = match.end()
+
+        while position < end and text[position].isspace():
+            position += 1
+        if position >= end or text[position] != '#': break
+        position += 1
+        while position < end and text[position].isspace():
+            position += 1
+    return (''.join(parts), position)
+
+
+# position of the closing brace (or quote) at depth 0, end if there is none
+def find_closing(text, position, end, regex):
+    depth = 0
+    for match in regex.finditer(text, position, end):
+        char = match.group(0)
+        if char == '{':
+            depth += 1
+        elif depth > 0 and char == '}':
+            depth -= 1
+        elif depth == 0:
+            return match.start()
+    return end
+
+
+# lowercase words of key, author, title and year, without LaTeX markup
+# (keys can't contain any)
+def get_tokens(entry):
+    text = markup_regex.sub('', ' '.join([entry[2], entry[3], entry[4]]))
+    return tuple(set(token_regex.findall(entry[0].lower() + ' ' + text.lower())))
+
+
+class BibTeXEntryTable(object):
+    ''' Entries of bibliographies as tuples (key, type, author, title,
+        year), counted per source (a document, a file) like the symbols
+        of a SymbolSet.
+
+        Every word of key, author, title and year is a token. Tokens are
+        kept in a prefix index, so entries can be found by fragments of
+        any of these fields, with work in the number of entries looked
+        at rather than the size of the table. '''
+
+    def __init__(self):
+        self.entries = SymbolSet()
+        self.entries_by_key = dict()
+
+        # token -> entries, entry -> tokens
+        self.tokens = dict()
+        self.entry_tokens = dict()
+        self.token_index = PrefixIndex()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def update_source(self, source, added_entries, removed_entries):
+        added_entries, removed_entries = self.entries.update_source(source, added_entries, removed_entries)
+
+        added_tokens = list()
+        removed_tokens = list()
+        for entry in removed_entries:
+            entries = self.entries_by_key[entry[0]]
+            entries.remove(entry)
+            if len(entries) == 0:
+                del(self.entries_by_key[entry[0]])
+
+            for token in self.entry_tokens.pop(entry):
+                entries = self.tokens[token]
+                entries.remove(entry)
+                if len(entries) == 0:
+                    del(self.tokens[token])
+                    removed_tokens.append(token)
+
+        for entry in added_entries:
+            try: self.entries_by_key[entry[0]].add(entry)
+            except KeyError: self.entries_by_key[entry[0]] = {entry}
+
+            tokens = get_tokens(entry)
+            self.entry_tokens[entry] = tokens
+            for token in tokens:
+                try: self.tokens[token].add(entry)
+                except KeyError:
+                    self.tokens[token] = {entry}
+                    added_tokens.append(token)
+
+        # tokens that lost their last entry and got a new one stay indexed
+        readded_tokens = set(removed_tokens).intersection(added_tokens)
+        if len(readded_tokens) > 0:
+            removed_tokens = [token for token in removed_tokens if token not in readded_tokens]
+            added_tokens = [token for token in added_tokens if token not in readded_tokens]
+        self.token_index.update(added_tokens, removed_tokens)
+
+    def replace_source(self, source, entries):
+        ''' entries: all entries of source from now on. '''
+
+        old_entries = self.entries.get_symbols_of_source(source)
+        entries = set(entries)
+        self.update_source(source, entries - old_entries, old_entries - entries)
+
+    def remove_source(self, source):
+        self.update_source(source, [], list(self.entries.get_symbols_of_source(source)))
+
+    def get_entries_of_source(self, source):
+        return self.entries.get_symbols_of_source(source)
+
+    def get_entry(self, key):
+        ''' one of the entries with key, None if there is none. '''
+
+        try: return next(iter(self.entries_by_key[key]))
+        except KeyError: return None
+
+    def get_entries_matching(self, fragments):
+        ''' yields the entries having a token that starts with each of
+            the (lowercase) fragments. The tokens of the fragment with
+            the fewest entries are walked in alphabetical order, the
+            other fragments are checked against the tokens of each entry.
+            Callers usually stop after a few matches. '''
+
+        if len(fragments) == 0: return
+
+        best_fragment = None
+        best_count = None
+        for fragment in fragments:
+            count = 0
+            for token in self.token_index.get_values(fragment):
+                count += len(self.tokens[token])
+                if best_count != None and count >= best_count: break
+            if best_count == None or count < best_count:
+                best_fragment, best_count = fragment, count
+        other_fragments = list(fragments)
+        other_fragments.remove(best_fragment)
+
+        entries_done = set()
+        for token in self.token_index.get_values(best_fragment):
+            for entry in self.tokens[token]:
+                if entry in entries_done: continue
+                entries_done.add(entry)
+
+                tokens = self.entry_tokens[entry]
+                if all(any(token.startswith(fragment) for token in tokens) for fragment in other_fragments):
+                    yield entry
+
+
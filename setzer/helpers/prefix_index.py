@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import bisect
+import heapq
+
+
+class PrefixIndex(object):
+    ''' Sorted array of (key, value) pairs. All values whose key starts
+        with a given prefix form one contiguous range, which is found by
+        binary search. Memory is linear in the number of entries.
+
+        Without items, keys are their own values (sets of labels,
+        bibitems) and can be added and removed. '''
+
+    def __init__(self, items=None):
+        if items == None:
+            self.keys = list()
+            self.values = None
+        else:
+            items = sorted(items, key=lambda item: item[0])
+            self.keys = [item[0] for item in items]
+            self.values = [item[1] for item in items]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        index = bisect.bisect_left(self.keys, key)
+        return index < len(self.keys) and self.keys[index] == key
+
+    def get_range(self, prefix):
+        ''' returns (start, end) of the entries whose key starts with prefix. '''
+
+        start = bisect.bisect_left(self.keys, prefix)
+        if prefix == '': return (start, len(self.keys))
+        end = bisect.bisect_left(self.keys, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+        return (start, end)
+
+    def get_values(self, prefix):
+        ''' yields the values for prefix in key order. '''
+
+        start, end = self.get_range(prefix)
+        values = self.keys if self.values == None else self.values
+        for index in range(start, end):
+            yield values[index]
+
+    def get_top(self, prefix, count, rank):
+        ''' the count values for prefix with the smallest rank(value). '''
+
+        start, end = self.get_range(prefix)
+        values = (self.keys if self.values == None else self.values)[start:end]
+        if end - start <= count:
+            return sorted(values, key=rank)
+        return heapq.nsmallest(count, values, key=rank)
+
+    def add(self, key):
+        bisect.insort_right(self.keys, key)
+
+    def remove(self, key):
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del(self.keys[index])
+
+    def update(self, added_keys, removed_keys):
+        ''' large updates rebuild the array instead of shifting it for every key. '''
+
+        if len(added_keys) + len(removed_keys) < 64:
+            for key in removed_keys:
+                self.remove(key)
+            for key in added_keys:
+                self.add(key)
+        else:
+            removed_keys = set(removed_keys)
+            self.keys = sorted([key for key in self.keys if key not in removed_keys] + list(added_keys))
+
+
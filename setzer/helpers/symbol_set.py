@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+from setzer.helpers.prefix_index import PrefixIndex
+
+
+class SymbolSet(object):
+    ''' Set of symbols (labels, bibitems, ...) where every occurrence is
+        counted per source (a file, a document). A symbol stays in the
+        set as long as one occurrence of it is left. All updates cost
+        time in the number of changed occurrences only.
+
+        If indexed, symbols can be looked up by prefix, for the whole
+        set and for each source. '''
+
+    def __init__(self, indexed=False):
+        self.sources = dict()
+        self.counts = dict()
+
+        self.indexed = indexed
+        self.index = PrefixIndex()
+        self.source_indices = dict()
+
+    def __contains__(self, symbol):
+        return symbol in self.counts
+
+    def __iter__(self):
+        return iter(self.counts)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, symbol, source=None):
+        ''' returns True if the symbol is new to the set. '''
+
+        if self.add_occurrence(symbol, source):
+            if self.indexed:
+                self.get_source_index(source).add(symbol)
+            if self.add_to_counts(symbol):
+                if self.indexed:
+                    self.index.add(symbol)
+                return True
+        return False
+
+    def remove(self, symbol, source=None):
+        ''' removes one occurrence, returns True if the symbol left the set. '''
+
+        source_counts = self.sources[source]
+        source_counts[symbol] -= 1
+        if source_counts[symbol] > 0:
+            return False
+        return self.discard(symbol, source)
+
+    def discard(self, symbol, source=None):
+        ''' removes all occurrences in source, returns True if the symbol left the set. '''
+
+        if self.discard_occurrences(symbol, source):
+            if self.indexed:
+                self.source_indices[source].remove(symbol)
+                if source not in self.sources:
+                    del(self.source_indices[source])
+            if self.remove_from_counts(symbol):
+                if self.indexed:
+                    self.index.remove(symbol)
+                return True
+        return False
+
+    def update_source(self, source, added_symbols, removed_symbols):
+        ''' discards removed_symbols from source, adds added_symbols to it.
+            Indexes are updated in bulk. Returns the symbols that entered
+            and left the set, as (added, removed). '''
+
+        source_removed = list()
+        set_removed = list()
+        for symbol in removed_symbols:
+            if self.discard_occurrences(symbol, source):
+                source_removed.append(symbol)
+                if self.remove_from_counts(symbol):
+                    set_removed.append(symbol)
+        source_added = list()
+        set_added = list()
+        for symbol in added_symbols:
+            if self.add_occurrence(symbol, source):
+                source_added.append(symbol)
+                if self.add_to_counts(symbol):
+                    set_added.append(symbol)
+
+        if self.indexed:
+            self.get_source_index(source).update(source_added, source_removed)
+            self.index.update(set_added, set_removed)
+            if source not in self.sources:
+                del(self.source_indices[source])
+        return (set_added, set_removed)
+
+    def add_occurrence(self, symbol, source):
+        ''' returns True if the symbol is new to source. '''
+
+        try: source_counts = self.sources[source]
+        except KeyError:
+            source_counts = dict()
+            self.sources[source] = source_counts
+
+        if symbol in source_counts:
+            source_counts[symbol] += 1
+            return False
+        source_counts[symbol] = 1
+        return True
+
+    def discard_occurrences(self, symbol, source):
+        ''' returns True if the symbol was in source. '''
+
+        try: del(self.sources[source][symbol])
+        except KeyError: return False
+        if len(self.sources[source]) == 0:
+            del(self.sources[source])
+        return True
+
+    def add_to_counts(self, symbol):
+        if symbol in self.counts:
+            self.counts[symbol] += 1
+            return False
+        self.counts[symbol] = 1
+        return True
+
+    def remove_from_counts(self, symbol):
+        self.counts[symbol] -= 1
+        if self.counts[symbol] > 0:
+            return False
+        del(self.counts[symbol])
+        return True
+
+    def get_source_index(self, source):
+        try: return self.source_indices[source]
+        except KeyError:
+            self.source_indices[source] = PrefixIndex()
+            return self.source_indices[source]
+
+    def replace_source(self, source, symbols):
+        ''' symbols: all symbols of source from now on. '''
+
+        old_symbols = self.get_symbols_of_source(source)
+        symbols = set(symbols)
+        self.update_source(source, symbols - old_symbols, old_symbols - symbols)
+
+    def remove_source(self, source):
+        self.update_source(source, [], list(self.get_symbols_of_source(source)))
+
+    def has_source(self, source):
+        return source in self.sources
+
+    def get_symbols_of_source(self, source):
+        return self.sources.get(source, dict()).keys()
+
+    def source_contains(self, source, symbol):
+        try: return symbol in self.sources[source]
+        except KeyError: return False
+
+    def get_symbols_with_prefix(self, prefix, source=None):
+        ''' in alphabetical order, only for indexed sets. With a source,
+            only the symbols of that source are returned. '''
+
+        if source == None:
+            return self.index.get_values(prefix)
+        try: return self.source_indices[source].get_values(prefix)
+        except KeyError: return iter(())
+
+
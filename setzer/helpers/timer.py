@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
+import os
 import time
 
 
@@ -29,3 +30,34 @@ def timer(original_function):
     return  new_function
 
 
+# start up instrumentation, report is printed if SETZER_STARTUP_REPORT is set
+startup_time = time.time()
+startup_phases = list()
+
+
+def add_startup_phase(name):
+    ''' call after phase name of start up is done. '''
+
+    startup_phases.append((name, time.time()))
+
+
+def print_startup_report():
+    if 'SETZER_STARTUP_REPORT' not in os.environ: return False
+
+    last_time = startup_time
+    for name, end_time in startup_phases:
+        print('startup: ' + name + ': ' + '{:.1f}'.format((end_time - last_time) * 1000) + ' ms')
+        last_time = end_time
+    print('startup total: ' + '{:.1f}'.format((last_time - startup_time) * 1000) + ' ms')
+    return False
+
+
+def print_deferred_phase(name, start_time):
+    ''' for parts of start up that run on first use instead (help panel, ...):
+        reports the time they took, started at start_time. '''
+
+    if 'SETZER_STARTUP_REPORT' not in os.environ: return
+
+    print('deferred: ' + name + ': ' + '{:.1f}'.format((time.time() - start_time) * 1000) + ' ms')
+
+
@@ -137,10 +137,18 @@ class BuildLogPresenter(object):
                 upper_bound = new_bound
         return '...' + text[upper_bound:]
 
+    def get_job_name(self, job):
+        job_names = {'build_format': _('preamble'), 'build_latex': 'LaTeX', 'build_bibtex': 'BibTeX', 'build_biber': 'Biber',
+                     'build_makeindex': 'Makeindex', 'build_glossaries': 'Glossaries', 'forward_sync': 'SyncTeX'}
+        return job_names.get(job, job)
+
     def set_header_data(self, errors, warnings, tried_building=False):
         if tried_building:
             if self.build_log.document.build_time != None:
-                time_string = '{:.2f}s, '.format(self.build_log.document.build_time)
+                time_string = '{:.2f}s'.format(self.build_log.document.build_time)
+                if len(self.build_log.document.build_job_times) > 1:
+                    time_string += ' [' + ', '.join(self.get_job_name(job) + ' {:.2f}s'.format(seconds) for job, seconds in self.build_log.document.build_job_times) + ']'
+                time_string += ', '
             else:
                 time_string = ''
 
@@ -23,11 +23,14 @@ from gi.repository import GLib
 
 import os.path
 import pickle
+import time
 
 from setzer.helpers.observable import Observable
 import setzer.workspace.help_panel.help_panel_controller as help_panel_controller
 import setzer.workspace.help_panel.help_panel_presenter as help_panel_presenter
+import setzer.workspace.help_panel.help_search_index as help_search_index
 from setzer.app.service_locator import ServiceLocator
+import setzer.helpers.timer as timer
 
 
 class HelpPanel(Observable):
@@ -42,16 +45,30 @@ class HelpPanel(Observable):
         self.home_uri = self.path + '/latex2e_0.html'
         self.current_uri = self.home_uri
 
-        with open(os.path.join(ServiceLocator.get_resources_path(), 'help', 'search_index.pickle'), 'rb') as filehandle:
-            self.search_index = pickle.load(filehandle)
+        # web view and search index are created when the panel is first shown
+        self.is_active = False
+        self.search_index = None
 
         self.search_results_blank = list()
         self.search_results = self.search_results_blank
         self.query = ''
 
-        GLib.idle_add(self.activate, priority=GLib.PRIORITY_LOW)
+        self.workspace.connect('set_show_preview_or_help', self.on_set_show_preview_or_help)
+        if self.workspace.show_help:
+            GLib.idle_add(self.activate, priority=GLib.PRIORITY_LOW)
+
+    def on_set_show_preview_or_help(self, workspace):
+        if workspace.show_help:
+            self.activate()
 
     def activate(self):
+        if self.is_active: return False
+        self.is_active = True
+        start_time = time.time()
+
+        with open(os.path.join(ServiceLocator.get_resources_path(), 'help', 'search_index.pickle'), 'rb') as filehandle:
+            self.search_index = help_search_index.HelpSearchIndex(pickle.load(filehandle))
+
         self.view.settings = WebKit2.Settings()
         self.view.settings.set_enable_java(False)
         self.view.settings.set_enable_javascript(False)
@@ -65,11 +82,14 @@ class HelpPanel(Observable):
 
         self.view.stack.add_named(self.view.content, 'content')
         self.view.stack.add_named(self.view.search_widget, 'search')
+        self.view.stack.show_all()
 
         self.controller = help_panel_controller.HelpPanelController(self, self.view)
         self.presenter = help_panel_presenter.HelpPanelPresenter(self, self.view)
 
         self.add_change_code('search_query_changed')
+        timer.print_deferred_phase('help panel', start_time)
+        return False
 
     def set_uri(self, uri):
         self.current_uri = uri
@@ -78,6 +98,8 @@ class HelpPanel(Observable):
     def set_uri_by_search_item(self, uri_ending, text, location):
         self.current_uri = self.path + '/' + uri_ending
 
+        # recent results are shown without highlights, text and location are plain text
+        text, location = help_search_index.escape(text), help_search_index.escape(location)
         self.search_results_blank = [item for item in self.search_results_blank if (item[0] != uri_ending or item[1] != text or item[2] != location)]
         self.search_results_blank.append([uri_ending, text, location])
 
@@ -91,27 +113,7 @@ class HelpPanel(Observable):
         if query == '':
             self.search_results = self.search_results_blank
         else:
-            words = query.split()
-            self.search_results = list()
-            for item in self.search_index:
-                if len(self.search_results) == 8: break
-
-                found = True
-                for word in words:
-                    if item[0].find(word.lower()) == -1:
-                        found = False
-                        break
-                if found:
-                    headline = item[2]
-                    headline = headline.replace('&gt;', '>').replace('&lt;', '<').replace('&quot;', '"').replace('&amp;', '&')
-                    location = item[3]
-                    location = location.replace('&gt;', '>').replace('&lt;', '<').replace('&quot;', '"').replace('&amp;', '&')
-                    for word in words:
-                        headline = headline.replace(word, '•' + word + '◆').replace(word.lower(), '•' + word.lower() + '◆').replace(word.title(), '•' + word.title() + '◆')
-                        location = location.replace(word, '•' + word + '◆').replace(word.lower(), '•' + word.lower() + '◆').replace(word.title(), '•' + word.title() + '◆')
-                    headline = headline.replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;').replace('•', '<b>').replace('◆', '</b>')
-                    location = location.replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;').replace('•', '<b>').replace('◆', '</b>')
-                    self.search_results.append([item[1], headline, location])
+            self.search_results = self.search_index.search(query, 8)
         self.add_change_code('search_query_changed')
 
 
@@ -34,17 +34,21 @@ class HelpPanelPresenter(object):
 
     def on_search_query_changed(self, help_panel):
         results_list = self.help_panel.search_results
-        for item in self.view.search_result_items:
-            self.view.search_results.remove(item)
-        self.view.search_result_items = list()
+
+        # rows are created once and then only relabeled, unused ones are hidden
+        for number, item in enumerate(results_list):
+            if number == len(self.view.search_result_items):
+                list_item = help_panel_view.SearchResultView()
+                self.view.search_results.add(list_item)
+                self.view.search_result_items.append(list_item)
+            self.view.search_result_items[number].set_data(item)
+            self.view.search_result_items[number].show()
+        for list_item in self.view.search_result_items[len(results_list):]:
+            list_item.hide()
+
         if results_list:
             self.view.search_entry.get_style_context().remove_class('error')
             self.view.search_entry.set_icon_from_icon_name(Gtk.EntryIconPosition.PRIMARY, 'edit-find-symbolic')
-            for item in reversed(results_list):
-                list_item = help_panel_view.SearchResultView(item)
-                self.view.search_results.prepend(list_item)
-                self.view.search_result_items.append(list_item)
-            self.view.search_results.show_all()
         elif self.help_panel.query != '':
             self.view.search_entry.get_style_context().add_class('error')
             self.view.search_entry.set_icon_from_icon_name(Gtk.EntryIconPosition.PRIMARY, 'face-uncertain-symbolic')
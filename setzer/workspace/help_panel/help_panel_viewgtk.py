@@ -99,18 +99,17 @@ class HelpPanelView(Gtk.VBox):
 
 class SearchResultView(Gtk.ListBoxRow):
 
-    def __init__(self, data):
+    def __init__(self):
         Gtk.ListBoxRow.__init__(self)
         self.set_can_focus(False)
-        self.uri_ending = data[0]
+        self.uri_ending = None
+        self.data = None
         self.box = Gtk.VBox()
         self.box.set_margin_left(3)
         self.box.set_margin_right(3)
         self.text_label = Gtk.Label()
-        self.text_label.set_markup(data[1])
         self.text_label.set_xalign(0)
         self.location_label = Gtk.Label()
-        self.location_label.set_markup('' + data[2] + '')
         self.location_label.set_xalign(0)
         self.location_label.get_style_context().add_class('location-label')
         self.box.pack_start(self.text_label, False, False, 0)
@@ -118,4 +117,12 @@ class SearchResultView(Gtk.ListBoxRow):
         self.add(self.box)
         self.show_all()
 
+    def set_data(self, data):
+        if data == self.data: return
+
+        self.data = data
+        self.uri_ending = data[0]
+        self.text_label.set_markup(data[1])
+        self.location_label.set_markup(data[2])
+
 
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import heapq
+import re
+
+
+class HelpSearchIndex(object):
+    ''' Inverted index over the entries of the manual's index (items of
+        search_index.pickle: search text, uri ending, headline,
+        location). Every substring of up to three characters of a search
+        text points to the entries containing it, so the entries
+        containing a query word are found by intersecting the lists of
+        its trigrams and checking only those.
+
+        Results of the last query are remembered: if a query only
+        extends the words of the previous one (typing), its matches are
+        a subset and only those are checked again. '''
+
+    gram_length = 3
+
+    def __init__(self, items):
+        self.search_texts = list()
+        self.uri_endings = list()
+        self.headlines = list()
+        self.locations = list()
+
+        # gram -> numbers of the entries containing it, ascending
+        self.grams = dict()
+
+        for number, item in enumerate(items):
+            self.search_texts.append(item[0])
+            self.uri_endings.append(item[1])
+            self.headlines.append(unescape(item[2]))
+            self.locations.append(unescape(item[3]))
+
+            grams = set()
+            text = item[0]
+            for length in range(1, self.gram_length + 1):
+                for start in range(len(text) - length + 1):
+                    grams.add(text[start:start + length])
+            for gram in grams:
+                try: self.grams[gram].append(number)
+                except KeyError: self.grams[gram] = [number]
+
+        self.last_words = None
+        self.last_matches = None
+
+    def search(self, query, count):
+        ''' returns the count best entries containing all words of query,
+            as (uri ending, headline markup, location markup). '''
+
+        words = query.lower().split()
+        if len(words) == 0: return list()
+
+        matches = self.get_matches(words)
+        results = heapq.nsmallest(count, matches, key=lambda number: self.get_rank(number, words))
+
+        highlight_regex = re.compile('|'.join(re.escape(word) for word in sorted(set(words), key=len, reverse=True)), re.IGNORECASE)
+        return [[self.uri_endings[number], highlight(self.headlines[number], highlight_regex), highlight(self.locations[number], highlight_regex)] for number in results]
+
+    def get_matches(self, words):
+        ''' numbers of all entries containing all words. '''
+
+        if self.last_words != None and all(any(last_word in word for word in words) for last_word in self.last_words):
+            candidates = self.last_matches
+        else:
+            candidates = None
+            for word in sorted(words, key=len, reverse=True):
+                candidates = self.get_candidates(word, candidates)
+                if len(candidates) == 0: break
+
+        matches = [number for number in candidates if all(word in self.search_texts[number] for word in words)]
+        self.last_words = words
+        self.last_matches = matches
+        return matches
+
+    def get_candidates(self, word, candidates):
+        ''' entries having all grams of word, narrowed down from candidates
+            (a list, or None for all entries). The rarest grams go first. '''
+
+        if len(word) <= self.gram_length:
+            grams = [word]
+        else:
+            grams = [word[start:start + self.gram_length] for start in range(len(word) - self.gram_length + 1)]
+
+        postings = list()
+        for gram in set(grams):
+            try: postings.append(self.grams[gram])
+            except KeyError: return list()
+        postings.sort(key=len)
+
+        result = set(postings[0]) if candidates == None else set(candidates).intersection(postings[0])
+        for posting in postings[1:]:
+            if len(result) == 0: break
+            result.intersection_update(posting)
+        return sorted(result)
+
+    def get_rank(self, number, words):
+        ''' entries whose headline matches the words best come first: an
+            exact match, then headlines starting with a word, then words
+            found at word beginnings in the headline, then in the
+            location. Ties keep the order of the manual's index. '''
+
+        headline = self.headlines[number].lower()
+        if headline == ' '.join(words):
+            return (0, 0, number)
+
+        rank = 4
+        for word in words:
+            if headline.startswith(word):
+                word_rank = 1
+            elif re.search(r'(?:^|\W)' + re.escape(word), headline) != None:
+                word_rank = 2
+            elif word in headline:
+                word_rank = 3
+            else:
+                word_rank = 4
+            rank = min(rank, word_rank)
+        return (rank, len(headline), number)
+
+
+# the index stores headlines and locations as markup
+def unescape(text):
+    return text.replace('&gt;', '>').replace('&lt;', '<').replace('&quot;', '"').replace('&amp;', '&')
+
+
+# text for use in markup
+def escape(text):
+    return text.replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+# markup of text with the matches of regex in bold
+def highlight(text, regex):
+    markup = ''
+    last_end = 0
+    for match in regex.finditer(text):
+        markup += escape(text[last_end:match.start()]) + '<b>' + escape(match.group(0)) + '</b>'
+        last_end = match.end()
+    return markup + escape(text[last_end:])
+
+
@@ -25,8 +25,6 @@ from gi.repository import GLib
 import setzer.workspace.sidebar.sidebar_viewgtk as sidebar_view
 from setzer.app.service_locator import ServiceLocator
 
-import math
-
 
 class Sidebar(object):
     ''' Init and controll sidebar '''
@@ -34,30 +32,26 @@ class Sidebar(object):
     def __init__(self, workspace):
         self.view = ServiceLocator.get_main_window().sidebar
         self.workspace = workspace
+        self.color_manager = ServiceLocator.get_color_manager()
 
-        # detect dark mode
-        dm = 'True' if ServiceLocator.get_is_dark_mode() else 'False'
-
-        # tabbed pages: name, icon name, tooltip, widget
+        # tabbed pages: name, icon name, tooltip, symbol width
         self.pages = list()
-        self.pages.append(['greek_letters', 'own-symbols-greek-letters-symbolic', _('Greek Letters'), 
-                           'sidebar_view.SidebarPageSymbolsList("greek_letters", 25, ' + dm + ')'])
-        self.pages.append(['arrows', 'own-symbols-arrows-symbolic', _('Arrows'), 
-                           'sidebar_view.SidebarPageSymbolsList("arrows", 48, ' + dm + ')'])
-        self.pages.append(['relations', 'own-symbols-relations-symbolic', _('Relations'), 
-                           'sidebar_view.SidebarPageSymbolsList("relations", 39, ' + dm + ')'])
-        self.pages.append(['operators', 'own-symbols-operators-symbolic', _('Operators'), 
-                           'sidebar_view.SidebarPageSymbolsList("operators", 47, ' + dm + ')'])
-        self.pages.append(['misc_math', 'own-symbols-misc-math-symbolic', _('Misc. Math'), 
-                           'sidebar_view.SidebarPageSymbolsList("misc_math", 42, ' + dm + ')'])
-        self.pages.append(['misc_text', 'own-symbols-misc-text-symbolic', _('Misc. Symbols'), 
-                           'sidebar_view.SidebarPageSymbolsList("misc_text", 38, ' + dm + ')'])
-        self.page_views = list()
+        self.pages.append(['greek_letters', 'own-symbols-greek-letters-symbolic', _('Greek Letters'), 25])
+        self.pages.append(['arrows', 'own-symbols-arrows-symbolic', _('Arrows'), 48])
+        self.pages.append(['relations', 'own-symbols-relations-symbolic', _('Relations'), 39])
+        self.pages.append(['operators', 'own-symbols-operators-symbolic', _('Operators'), 47])
+        self.pages.append(['misc_math', 'own-symbols-misc-math-symbolic', _('Misc. Math'), 42])
+        self.pages.append(['misc_text', 'own-symbols-misc-text-symbolic', _('Misc. Symbols'), 38])
+        self.page_views = dict()
+        self.current_page_name = self.pages[0][0]
         self.init_page_stack()
 
         self.view.show_all()
+        self.view.connect('map', self.on_map)
 
     def init_page_stack(self):
+        ''' pages and their symbols are only loaded when they are first shown. '''
+
         self.tab_buttons = list()
         for page in self.pages:
             if len(self.tab_buttons) == 0:
@@ -72,72 +66,179 @@ class Sidebar(object):
 
             self.tab_buttons.append(button)
             self.view.tabs.insert(button, -1)
-            page_view = eval(page[3])
-            self.view.stack.add_named(page_view, page[0])
-            self.init_symbols_page(page_view)
-            self.page_views.append(page_view)
-            page_view.connect('size-allocate', self.on_stack_size_allocate)
             button.connect('clicked', self.on_tab_button_clicked, page[0])
-            page_view.flowbox.connect('button-press-event', self.on_flowbox_clicked, page_view.symbols)
 
-    def init_symbols_page(self, page_view):
-        for symbol in page_view.symbols:
-            image = symbol[5]
-            image.set_size_request(page_view.symbol_width + 11, -1)
+    def show_page(self, page_name):
+        self.current_page_name = page_name
+        if page_name not in self.page_views:
+            self.init_page(page_name)
+        self.view.stack.set_visible_child_name(page_name)
+
+    def init_page(self, page_name):
+        page = [page for page in self.pages if page[0] == page_name][0]
+        page_view = sidebar_view.SidebarPageSymbolsList(page[0], page[3])
+        self.view.stack.add_named(page_view, page[0])
+        self.page_views[page_name] = page_view
+        page_view.connect('size-allocate', self.on_stack_size_allocate)
+        page_view.drawing_area.connect('draw', self.on_symbols_draw, page_view)
+        page_view.drawing_area.connect('button-press-event', self.on_symbols_button_press, page_view)
+        page_view.drawing_area.connect('button-release-event', self.on_symbols_button_release, page_view)
+        page_view.drawing_area.connect('query-tooltip', self.on_symbols_query_tooltip, page_view)
+        page_view.drawing_area.connect('key-press-event', self.on_symbols_key_press, page_view)
+        page_view.drawing_area.connect('focus-in-event', self.on_symbols_focus_change, page_view)
+        page_view.drawing_area.connect('focus-out-event', self.on_symbols_focus_change, page_view)
+        page_view.show_all()
 
     '''
     *** signal handlers for buttons in sidebar
     '''
     
+    def on_map(self, view):
+        self.show_page(self.current_page_name)
+
     def on_tab_button_clicked(self, button, page_name):
-        self.view.stack.set_visible_child_name(page_name)
+        self.show_page(page_name)
 
-    def on_flowbox_clicked(self, flowbox, event, symbols_list):
-        child = flowbox.get_child_at_pos(event.x, event.y)
+    def on_symbols_button_press(self, drawing_area, event, page_view):
+        number = page_view.get_symbol_at(event.x, event.y)
 
-        if child != None and self.workspace.active_document != None:
-            self.workspace.get_active_document().insert_text_at_cursor(symbols_list[child.get_index()][1])
-            self.workspace.get_active_document().content.scroll_cursor_onscreen()
+        if number != None:
+            page_view.focused_symbol = number
+            if self.insert_symbol(page_view, number):
+                page_view.pressed_symbol = number
+            drawing_area.queue_draw()
 
         return True
 
+    def on_symbols_key_press(self, drawing_area, event, page_view):
+        ''' arrow keys, Home and End move the focus between symbols,
+            Return and space insert the focused one. '''
+
+        modifiers = Gtk.accelerator_get_default_mod_mask()
+        if event.state & modifiers != 0: return False
+
+        number = page_view.focused_symbol
+        per_line = page_view.symbols_per_line
+        keyval_name = Gdk.keyval_name(event.keyval)
+        if keyval_name in ['Return', 'KP_Enter', 'space', 'KP_Space']:
+            self.insert_symbol(page_view, number)
+            return True
+        elif keyval_name in ['Left', 'KP_Left']:
+            number -= 1
+        elif keyval_name in ['Right', 'KP_Right']:
+            number += 1
+        elif keyval_name in ['Up', 'KP_Up']:
+            number -= per_line
+        elif keyval_name in ['Down', 'KP_Down']:
+            # the last line can be shorter
+            if number // per_line < (len(page_view.symbols) - 1) // per_line:
+                number = min(number + per_line, len(page_view.symbols) - 1)
+            else:
+                number += per_line
+        elif keyval_name in ['Home', 'KP_Home']:
+            number = 0
+        elif keyval_name in ['End', 'KP_End']:
+            number = len(page_view.symbols) - 1
+        else:
+            return False
+
+        # leaving the grid moves the focus on, like in other widgets
+        if number < 0 or number >= len(page_view.symbols):
+            return False
+
+        page_view.focused_symbol = number
+        page_view.scroll_to_symbol(number)
+        drawing_area.trigger_tooltip_query()
+        drawing_area.queue_draw()
+        return True
+
+    def on_symbols_focus_change(self, drawing_area, event, page_view):
+        drawing_area.queue_draw()
+        return False
+
+    def insert_symbol(self, page_view, number):
+        if self.workspace.active_document == None: return False
+
+        self.workspace.get_active_document().insert_text_at_cursor(page_view.symbols[number][1])
+        self.workspace.get_active_document().content.scroll_cursor_onscreen()
+        return True
+
+    def on_symbols_button_release(self, drawing_area, event, page_view):
+        if page_view.pressed_symbol != None:
+            page_view.pressed_symbol = None
+            drawing_area.queue_draw()
+        return True
+
+    def on_symbols_query_tooltip(self, drawing_area, x, y, keyboard_mode, tooltip, page_view):
+        if keyboard_mode:
+            number = page_view.focused_symbol
+        else:
+            number = page_view.get_symbol_at(x, y)
+        if number == None or number >= len(page_view.cells): return False
+
+        rectangle = Gdk.Rectangle()
+        rectangle.x, rectangle.y, rectangle.width, rectangle.height = page_view.cells[number]
+        tooltip.set_text(page_view.symbols[number][6])
+        tooltip.set_tip_area(rectangle)
+        return True
+
     '''
-    *** manage borders of images
+    *** drawing
     '''
 
     def on_stack_size_allocate(self, symbol_page, allocation, data=None):
         if symbol_page.size != (allocation.width, allocation.height):
             symbol_page.size = (allocation.width, allocation.height)
-            if isinstance(symbol_page, sidebar_view.SidebarPageSymbolsList):
-                width_with_border = symbol_page.symbol_width + 11
-                width_avail = allocation.width
-                symbols_per_line = width_avail // width_with_border
-                number_of_lines = math.ceil(len(symbol_page.symbols) / symbols_per_line)
-
-                height_with_border = symbol_page.symbols[0][5].get_preferred_height()[0]
-                for line_no in range(1, number_of_lines):
-                    # get max for each element
-                    max_height = 0
-                    for el_no in range(0, symbols_per_line):
-                        try:
-                            symbol = symbol_page.symbols[(line_no * symbols_per_line) + 1 + el_no]
-                        except IndexError:
-                            el_height = 0
-                        else:
-                            el_height = symbol[5].get_preferred_height()[0]
-                            if symbol[5].get_style_context().has_class('no_bottom_border'):
-                                el_height += 1
-                        if el_height > max_height: max_height = el_height
-                    height_with_border += max_height
-                height_avail = (allocation.height + 1) # +1px for removed child borders
-                for number, image in enumerate(symbol_page.symbols):
-                    if (number % symbols_per_line) == (symbols_per_line - 1):
-                        image[5].get_style_context().add_class('no_right_border')
-                    else:
-                        image[5].get_style_context().remove_class('no_right_border')
-                    if (number >= (number_of_lines - 1) * symbols_per_line) and (height_avail <= height_with_border):
-                        image[5].get_style_context().add_class('no_bottom_border')
-                    else:
-                        image[5].get_style_context().remove_class('no_bottom_border')
+            symbol_page.drawing_area.queue_draw()
+
+    def on_symbols_draw(self, drawing_area, ctx, page_view):
+        ''' only the cells in the visible part of the page are drawn. A
+            line of cells at the bottom has no bottom border if the
+            page is full, the border of the page is there. '''
+
+        page_view.update_layout(drawing_area.get_allocated_width())
+        atlas = page_view.get_atlas_surface(drawing_area.get_scale_factor(), drawing_area.get_window())
+
+        base_color = self.color_manager.get_theme_color('theme_base_color')
+        border_color = self.color_manager.get_theme_color_mix('borders', 'theme_base_color', 0.68)
+        active_color = self.color_manager.get_theme_color_mix('theme_bg_color', 'theme_base_color', 0.5)
+        fg_color = drawing_area.get_style_context().get_color(drawing_area.get_state_flags())
+
+        Gdk.cairo_set_source_rgba(ctx, base_color)
+        ctx.paint()
+
+        clip_top, clip_bottom = ctx.clip_extents()[1], ctx.clip_extents()[3]
+        has_bottom_line_border = page_view.size == None or page_view.layout_height <= page_view.size[1]
+        last_line_start = (len(page_view.symbols) - 1) // page_view.symbols_per_line * page_view.symbols_per_line
+        for number, symbol in enumerate(page_view.symbols):
+            x, y, width, height = page_view.cells[number]
+            if y + height < clip_top or y > clip_bottom: continue
+
+            if number == page_view.pressed_symbol:
+                Gdk.cairo_set_source_rgba(ctx, active_color)
+                ctx.rectangle(x, y, width, height)
+                ctx.fill()
+
+            Gdk.cairo_set_source_rgba(ctx, border_color)
+            if (number % page_view.symbols_per_line) != (page_view.symbols_per_line - 1):
+                ctx.rectangle(x + width - 1, y, 1, height)
+            if number < last_line_start or has_bottom_line_border:
+                ctx.rectangle(x, y + height - 1, width, 1)
+            ctx.fill()
+
+            if atlas != None:
+                size = symbol[5]
+                symbol_x = x + (width - 1 - size) // 2
+                symbol_y = y + (height - 1 - size) // 2
+                ctx.save()
+                ctx.rectangle(symbol_x, symbol_y, size, size)
+                ctx.clip()
+                Gdk.cairo_set_source_rgba(ctx, fg_color)
+                ctx.mask_surface(atlas, symbol_x - symbol[3], symbol_y - symbol[4])
+                ctx.restore()
+
+            if number == page_view.focused_symbol and drawing_area.has_focus():
+                Gtk.render_focus(drawing_area.get_style_context(), ctx, x + 1, y + 1, width - 3, height - 3)
+        return True
 
 
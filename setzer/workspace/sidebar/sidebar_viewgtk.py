@@ -17,7 +17,10 @@
 
 import gi
 gi.require_version('Gtk', '3.0')
+gi.require_version('GdkPixbuf', '2.0')
 from gi.repository import Gdk
+from gi.repository import GdkPixbuf
+from gi.repository import GLib
 from gi.repository import Gtk
 
 from setzer.app.service_locator import ServiceLocator
@@ -62,48 +65,120 @@ class SidebarPage(Gtk.ScrolledWindow):
 
 
 class SidebarPageSymbolsList(SidebarPage):
+    ''' All symbols of a page are drawn by one drawing area, from the
+        page's sprite atlas (symbols/folder-atlas.svg, made by
+        scripts/generate_symbols.py). The atlas is rasterized once per
+        scale factor and used as a mask, so symbols take the theme's
+        foreground color. '''
 
-    def __init__(self, symbol_folder, symbol_width, is_dark_mode):
+    def __init__(self, symbol_folder, symbol_width):
         SidebarPage.__init__(self)
         self.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
-        
+
         self.symbol_folder = symbol_folder
         self.symbol_width = symbol_width
-        
+
         self.size = None
-        
-        # symbols: icon name, latex code
+
+        # symbols: name, latex code, package, atlas x, atlas y, size, tooltip
         self.symbols = list()
-        
-        self.flowbox = Gtk.FlowBox()
-        self.flowbox.set_homogeneous(False)
-        self.flowbox.set_valign(Gtk.Align.START)
-        self.flowbox.set_max_children_per_line(20)
-        
-        self.parent_folder = 'dark' if is_dark_mode else 'light'
 
         xml_tree = ET.parse(os.path.join(ServiceLocator.get_resources_path(), 'symbols', symbol_folder + '.xml'))
         xml_root = xml_tree.getroot()
         for symbol_tag in xml_root:
-            self.symbols.append([symbol_tag.attrib['file'].rsplit('.')[0], symbol_tag.attrib['command'], symbol_tag.attrib.get('package', None), int(symbol_tag.attrib.get('original_width', 10)), int(symbol_tag.attrib.get('original_height', 10))])
-        
-        self.init_symbols_list()
+            tooltip_text = symbol_tag.attrib['command']
+            if symbol_tag.attrib.get('package', None) != None:
+                tooltip_text += ' (' + _('Package') + ': ' + symbol_tag.attrib['package'] + ')'
+            self.symbols.append([symbol_tag.attrib['file'].rsplit('.')[0], symbol_tag.attrib['command'], symbol_tag.attrib.get('package', None), int(symbol_tag.attrib['atlas_x']), int(symbol_tag.attrib['atlas_y']), int(symbol_tag.attrib['atlas_size']), tooltip_text])
+
+        self.atlas_filename = os.path.join(ServiceLocator.get_resources_path(), 'symbols', symbol_folder + '-atlas.svg')
+        self.atlas_width = int(xml_root.attrib['atlas_width'])
+        self.atlas_height = int(xml_root.attrib['atlas_height'])
+        self.atlas_surface = None
+        self.atlas_scale_factor = None
+
+        # cells of the symbols for the current width: (x, y, width, height)
+        self.layout_width = None
+        self.layout_height = 0
+        self.symbols_per_line = 1
+        self.cells = list()
+
+        self.pressed_symbol = None
+        # the symbol keyboard navigation starts from, shown when focused
+        self.focused_symbol = 0
+
+        self.drawing_area = SymbolsDrawingArea(self)
+        self.drawing_area.set_has_tooltip(True)
+        self.drawing_area.set_can_focus(True)
+        self.drawing_area.add_events(Gdk.EventMask.BUTTON_PRESS_MASK | Gdk.EventMask.BUTTON_RELEASE_MASK | Gdk.EventMask.KEY_PRESS_MASK | Gdk.EventMask.FOCUS_CHANGE_MASK)
+        self.add(self.drawing_area)
+
+    def update_layout(self, width):
+        ''' symbols flow in lines like in a flowbox, extra width is
+            shared by the symbols of a line. A cell has 5px padding
+            around its symbol and a 1px border on the right and bottom. '''
+
+        if width == self.layout_width: return
+
+        self.symbols_per_line = max(width // (self.symbol_width + 11), 1)
+        self.cells = list()
+        y = 0
+        for line_start in range(0, len(self.symbols), self.symbols_per_line):
+            line = self.symbols[line_start:line_start + self.symbols_per_line]
+            height = max(symbol[5] for symbol in line) + 11
+            for number in range(len(line)):
+                x = number * width // self.symbols_per_line
+                next_x = (number + 1) * width // self.symbols_per_line
+                self.cells.append((x, y, next_x - x, height))
+            y += height
+        self.layout_width = width
+        self.layout_height = y
+
+    def get_symbol_at(self, x, y):
+        ''' number of the symbol at (x, y), None if there is none. '''
+
+        for number, cell in enumerate(self.cells):
+            if cell[0] <= x < cell[0] + cell[2] and cell[1] <= y < cell[1] + cell[3]:
+                return number
+        return None
+
+    def scroll_to_symbol(self, number):
+        ''' scroll just enough for the cell of symbol number to be visible. '''
+
+        if number >= len(self.cells): return
+
+        x, y, width, height = self.cells[number]
+        self.get_vadjustment().clamp_page(y, y + height)
+
+    def get_atlas_surface(self, scale_factor, window):
+        ''' the atlas for scale_factor, None if it can't be loaded. '''
+
+        if scale_factor != self.atlas_scale_factor:
+            try: pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(self.atlas_filename, self.atlas_width * scale_factor, self.atlas_height * scale_factor)
+            except GLib.Error: self.atlas_surface = None
+            else: self.atlas_surface = Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale_factor, window)
+            self.atlas_scale_factor = scale_factor
+        return self.atlas_surface
+
+
+class SymbolsDrawingArea(Gtk.DrawingArea):
+    ''' as high as the symbols of its page need at the width it gets. '''
+
+    def __init__(self, page):
+        Gtk.DrawingArea.__init__(self)
+        self.page = page
 
-        self.add(self.flowbox)
-        
-    def init_symbols_list(self):
-        for symbol in self.symbols:
-            size = max(symbol[3], symbol[4])
-
-            image = Gtk.Image.new_from_icon_name('sidebar-' + symbol[0] + '-symbolic', 0)
-            image.set_pixel_size(int(size * 1.5))
-            #button = Gtk.Button()
-            #button.set_image(image)
-            tooltip_text = symbol[1]
-            if symbol[2] != None: 
-                tooltip_text += ' (' + _('Package') + ': ' + symbol[2] + ')'
-            image.set_tooltip_text(tooltip_text)
-            symbol.append(image)
-            self.flowbox.insert(image, -1)
+    def do_get_request_mode(self):
+        return Gtk.SizeRequestMode.HEIGHT_FOR_WIDTH
+
+    def do_get_preferred_width(self):
+        return self.page.symbol_width + 11, self.page.symbol_width + 11
+
+    def do_get_preferred_height_for_width(self, width):
+        self.page.update_layout(width)
+        return self.page.layout_height, self.page.layout_height
+
+    def do_get_preferred_height(self):
+        return self.do_get_preferred_height_for_width(self.page.symbol_width + 11)
 
 
@@ -135,6 +135,7 @@ class Workspace(Observable):
             else:
                 self.set_active_document(candidate)
         self.add_change_code('document_removed', document)
+        document.close()
 
     def create_latex_document(self, activate=False):
         document = DocumentLaTeX()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+# Checks that a private build folder gets the folders \include writes
+# .aux files to. If pdflatex is installed, a document with an \include
+# from a subfolder is built into a private folder, like Setzer does.
+# python3 tests/check_build_folders.py
+
+import sys
+import os
+import os.path
+import shutil
+import subprocess
+import tempfile
+
+sys.dont_write_bytecode = True
+
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, src_path)
+import setzer.document.latex.build_system.build_folders as build_folders
+
+document_text = '''\\documentclass{report}
+\\begin{document}
+\\include{chapters/intro}
+\\include{ chapters/appendix/tables }
+\\include{summary}
+\\include{../outside/notes}
+\\end{document}
+'''
+
+
+def check_folders(build_folder):
+    build_folders.create_include_folders(build_folder, document_text)
+    # a second build finds the folders in place
+    build_folders.create_include_folders(build_folder, document_text)
+
+    result = True
+    for folder in ['chapters', os.path.join('chapters', 'appendix')]:
+        if not os.path.isdir(os.path.join(build_folder, folder)):
+            print('missing folder: ' + folder)
+            result = False
+    if os.path.exists(os.path.join(os.path.dirname(build_folder), 'outside')):
+        print('folder created outside of the build folder')
+        result = False
+    return result
+
+
+def check_build(source_folder, build_folder):
+    os.makedirs(os.path.join(source_folder, 'chapters', 'appendix'))
+    os.makedirs(os.path.join(source_folder, 'outside'))
+    tex_filename = os.path.join(source_folder, 'document.tex')
+    with open(tex_filename, 'w') as f:
+        f.write(document_text.replace('\\include{../outside/notes}\n', ''))
+    for name in [os.path.join('chapters', 'intro'), os.path.join('chapters', 'appendix', 'tables'), 'summary']:
+        with open(os.path.join(source_folder, name + '.tex'), 'w') as f:
+            f.write('Some text.\n')
+
+    arguments = ['pdflatex', '-interaction=nonstopmode', '-output-directory=' + build_folder, tex_filename]
+    process = subprocess.run(arguments, cwd=source_folder, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if process.returncode != 0 or not os.path.isfile(os.path.join(build_folder, 'chapters', 'intro.aux')):
+        print('pdflatex failed to build into the private folder')
+        return False
+    return True
+
+
+with tempfile.TemporaryDirectory() as folder:
+    build_folder = os.path.join(folder, 'build', 'document')
+    source_folder = os.path.join(folder, 'source')
+    os.makedirs(build_folder)
+    results = [check_folders(build_folder)]
+    if shutil.which('pdflatex') != None:
+        results.append(check_build(source_folder, build_folder))
+    else:
+        print('pdflatex not found, build not checked')
+sys.exit(0 if all(results) else 1)
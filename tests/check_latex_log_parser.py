@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+# Parses the logs in latex_log_parser/ and compares the items with the
+# expected ones stored next to each log (name.json: the .tex filename
+# the log was made for and the items of parse_build_log() per file).
+# Prints the parse time of each log, exits with 1 on any difference.
+# python3 tests/check_latex_log_parser.py [--update]
+# --update writes the current items as the expected ones, check them
+# by hand before committing.
+
+import sys
+import os
+import os.path
+import json
+import time
+
+sys.dont_write_bytecode = True
+
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, src_path)
+from setzer.document.latex.build_system.latex_log_parser.latex_log_parser import LaTeXLogParser
+
+logs_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'latex_log_parser')
+
+
+# items as json has them: lists instead of tuples
+def normalize(log_items):
+    return json.loads(json.dumps(log_items))
+
+
+def check(log_filename, update):
+    expected_filename = os.path.splitext(log_filename)[0] + '.json'
+    with open(expected_filename) as f:
+        expected = json.load(f)
+
+    parser = LaTeXLogParser()
+    start_time = time.time()
+    log_items = normalize(parser.parse_build_log(expected['tex_filename'], log_filename))
+    seconds = time.time() - start_time
+    print(os.path.basename(log_filename) + ': ' + '{:.1f}'.format(seconds * 1000) + ' ms')
+
+    if update:
+        expected['items'] = log_items
+        with open(expected_filename, 'w') as f:
+            json.dump(expected, f, indent=2)
+            f.write('\n')
+        return True
+
+    if log_items == expected['items']: return True
+
+    for filename in sorted(set(log_items) | set(expected['items'])):
+        for item_type in ['error', 'warning', 'badbox']:
+            items = log_items.get(filename, dict()).get(item_type)
+            expected_items = expected['items'].get(filename, dict()).get(item_type)
+            if items != expected_items:
+                print('    ' + filename + ', ' + item_type + ':')
+                print('        expected: ' + str(expected_items))
+                print('        got:      ' + str(items))
+    return False
+
+
+update = '--update' in sys.argv[1:]
+log_filenames = sorted(os.path.join(logs_path, name) for name in os.listdir(logs_path) if name.endswith('.log'))
+results = [check(log_filename, update) for log_filename in log_filenames]
+sys.exit(0 if all(results) else 1)
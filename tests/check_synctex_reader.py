@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017, 2018 Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+# Loads the .synctex.gz files in synctex_reader/ and compares forward
+# and backward sync results with the expected ones stored next to each
+# file (name.json: the folder LaTeX ran in, forward queries with the
+# rectangles they give, backward queries with (filename, line)).
+# python3 tests/check_synctex_reader.py
+
+import sys
+import os
+import os.path
+import json
+
+sys.dont_write_bytecode = True
+
+src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, src_path)
+from setzer.document.latex.build_system.synctex_reader import SyncTeXReader
+
+files_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'synctex_reader')
+
+
+# rectangles in PDF points, rounded like the expected ones
+def normalize(result):
+    if result == None: return None
+    if isinstance(result, tuple): return list(result)
+    return [dict((name, round(value, 4)) for name, value in rectangle.items()) for rectangle in result]
+
+
+def check(synctex_filename):
+    with open(os.path.splitext(os.path.splitext(synctex_filename)[0])[0] + '.json') as f:
+        expected = json.load(f)
+
+    reader = SyncTeXReader()
+    if not reader.load(synctex_filename, expected['folder']):
+        print(os.path.basename(synctex_filename) + ': can\'t be read')
+        return False
+
+    result = True
+    for query in expected['forward']:
+        rectangles = normalize(reader.forward_sync(query['filename'], query['line']))
+        if rectangles != query['result']:
+            print(os.path.basename(synctex_filename) + ': forward sync of ' + query['filename'] + ', line ' + str(query['line']))
+            print('    expected: ' + str(query['result']))
+            print('    got:      ' + str(rectangles))
+            result = False
+    for query in expected['backward']:
+        position = normalize(reader.backward_sync(query['page'], query['x'], query['y']))
+        if position != query['result']:
+            print(os.path.basename(synctex_filename) + ': backward sync of page ' + str(query['page']) + ' at ' + str(query['x']) + ', ' + str(query['y']))
+            print('    expected: ' + str(query['result']))
+            print('    got:      ' + str(position))
+            result = False
+    return result
+
+
+synctex_filenames = sorted(os.path.join(files_path, name) for name in os.listdir(files_path) if name.endswith('.synctex.gz'))
+results = [check(synctex_filename) for synctex_filename in synctex_filenames]
+sys.exit(0 if all(results) else 1)